@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
+from django.utils import timezone
+from drf_api.cache import invalidate
 from posts.models import Post
 
 # Create your models here.
@@ -16,6 +20,45 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['created_at', 'id'], name='comment_created_at_id_idx'
+            ),
+            models.Index(
+                fields=['post', '-created_at'],
+                name='comment_post_created_at_idx',
+            ),
+        ]
 
     def __str__(self):
-        return self.content
\ No newline at end of file
+        return self.content
+
+def increment_comments_count(sender, instance, created, **kwargs):
+    """
+    bumps the stored comments_count on the commented post,
+    F() lets the database do the +1 so concurrent comments don't clash
+    """
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1,
+            last_activity_at=timezone.now(),
+        )
+
+
+def decrement_comments_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, comments_count__gt=0).update(
+        comments_count=F('comments_count') - 1,
+        last_activity_at=timezone.now(),
+    )
+
+
+post_save.connect(increment_comments_count, sender=Comment)
+post_delete.connect(decrement_comments_count, sender=Comment)
+
+
+def invalidate_cached_post(sender, instance, **kwargs):
+    invalidate('posts', f'post:{instance.post_id}')
+
+
+post_save.connect(invalidate_cached_post, sender=Comment)
+post_delete.connect(invalidate_cached_post, sender=Comment)
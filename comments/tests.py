@@ -1,3 +1,44 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from rest_framework import status
+from rest_framework.test import APITestCase
+from posts.models import Post
+from .models import Comment
 
-# Create your tests here.
+
+class CommentDetailViewTests(APITestCase):
+    def setUp(self):
+        adam = User.objects.create_user(username='adam', password='pass')
+        post = Post.objects.create(owner=adam, title='a title')
+        Comment.objects.create(owner=adam, post=post, content='first')
+
+    def test_edited_comment_is_not_answered_from_stale_validators(self):
+        etag = self.client.get('/comments/1/')['ETag']
+        response = self.client.get('/comments/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        comment = Comment.objects.get(pk=1)
+        comment.content = 'edited'
+        comment.save()
+        response = self.client.get('/comments/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['content'], 'edited')
+
+    def test_validators_follow_the_naturaltime_text(self):
+        class FiveMinutesLater(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.now(tz) + timedelta(minutes=5)
+
+        response = self.client.get('/comments/1/')
+        self.assertFalse(response.has_header('Last-Modified'))
+        with mock.patch(
+            'django.contrib.humanize.templatetags.humanize.datetime',
+            FiveMinutesLater,
+        ):
+            response = self.client.get(
+                '/comments/1/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated_at'], '5\xa0minutes ago')
@@ -1,13 +1,26 @@
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import generics, permissions, filters
+from drf_api.conditional import ConditionalGetMixin
+from drf_api.eager import EagerLoadingMixin
+from drf_api.fast import FastListMixin
+from drf_api.pagination import CursorOrPageNumberPagination
 from drf_api.permissions import IsOwnerOrReadOnly
+from drf_api.sparse import SparseFieldsMixin
+from drf_api.timing import ServerTimingMixin
 from .models import Comment
 from .serializers import CommentSerializer, CommentDetailSerializer
 
 
-class CommentList(generics.ListCreateAPIView):  # step 3
+class CommentList(
+    ServerTimingMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    FastListMixin,
+    generics.ListCreateAPIView,
+):  # step 3
         serializer_class = CommentSerializer  # step 4
+        pagination_class = CursorOrPageNumberPagination
         permission_classes = [permissions.IsAuthenticatedOrReadOnly]  # step 5
         queryset = Comment.objects.all()  # step 6
         filter_backends = [
@@ -22,8 +35,16 @@ class CommentList(generics.ListCreateAPIView):  # step 3
                 serializer.save(owner=self.request.user)  #step 8
 
 
-class CommentDetail(generics.RetrieveUpdateDestroyAPIView):  # step 13
+class CommentDetail(
+    ServerTimingMixin,
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):  # step 13
     permission_classes = [IsOwnerOrReadOnly]  # step 14
     serializer_class = CommentDetailSerializer  # step 15
     queryset = Comment.objects.all()  # step 16
+    # both are rendered with naturaltime, see CommentDetailSerializer
+    validator_fields = humanized_fields = ['created_at', 'updated_at']
 
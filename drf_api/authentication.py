@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from .metrics import AUTHENTICATIONS, CACHE_REQUESTS, registry
+
+PROFILE_FIELDS = ['id', 'owner_id', 'image']
+USER_CACHE_HIT = (('cache', 'auth_user'), ('result', 'hit'))
+USER_CACHE_MISS = (('cache', 'auth_user'), ('result', 'miss'))
+
+
+class UserCache:
+    """
+    Per-process LRU of the field values of recently authenticated
+    users and their profile's id and image, expiring after ttl seconds.
+    Saves and deletes in this process evict straight away, see the
+    handlers in profiles/models.py, other processes catch up within
+    the ttl.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1:]
+
+    def set(self, user_id, user_values, profile_values):
+        with self.lock:
+            self.entries[user_id] = (
+                time.monotonic() + self.ttl, user_values, profile_values
+            )
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def forget(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache(
+    settings.AUTH_USER_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL
+)
+
+
+def forget_cached_user(sender, instance, **kwargs):
+    """
+    post_save / post_delete handler for User and Profile
+    """
+    user_cache.forget(getattr(instance, 'owner_id', instance.pk))
+
+
+class CachedJWTCookieAuthentication(JWTCookieAuthentication):
+    """
+    JWTCookieAuthentication that skips the User query for users seen
+    in the last AUTH_USER_CACHE_TTL seconds. The token is still
+    verified on every request, only the row lookup is cached.
+    Every request gets its own User instance built from the cached
+    values, with the profile's id and image attached for
+    CurrentUserSerializer. The profile is loaded with its other
+    fields deferred, so saving it only writes those.
+    """
+    def authenticate(self, request):
+        try:
+            result = super().authenticate(request)
+        except AuthenticationFailed:
+            registry.inc(AUTHENTICATIONS, (('outcome', 'failed'),))
+            raise
+        registry.inc(AUTHENTICATIONS, (
+            ('outcome', 'anonymous' if result is None else 'authenticated'),
+        ))
+        return result
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        cached = user_cache.get(user_id) if user_id is not None else None
+        if cached is None:
+            registry.inc(CACHE_REQUESTS, USER_CACHE_MISS)
+            user = super().get_user(validated_token)
+            cached = self.cache_user(user)
+        else:
+            registry.inc(CACHE_REQUESTS, USER_CACHE_HIT)
+        return self.build_user(*cached)
+
+    def cache_user(self, user):
+        # profiles.models imports this module for forget_cached_user
+        from profiles.models import Profile
+
+        attnames = [field.attname for field in user._meta.concrete_fields]
+        user_values = [getattr(user, attname) for attname in attnames]
+        profile_values = Profile.objects.filter(owner=user).values_list(
+            *PROFILE_FIELDS
+        ).first()
+        user_cache.set(user.pk, user_values, profile_values)
+        return user_values, profile_values
+
+    def build_user(self, user_values, profile_values):
+        from profiles.models import Profile
+
+        user_model = get_user_model()
+        attnames = [field.attname for field in user_model._meta.concrete_fields]
+        user = user_model.from_db(None, attnames, user_values)
+        if profile_values is not None:
+            user.profile = Profile.from_db(None, PROFILE_FIELDS, profile_values)
+        return user
@@ -0,0 +1,128 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+from .metrics import CACHE_REQUESTS, registry
+
+# every cached response is stamped with the current generation of the
+# groups it depends on, e.g. 'posts' or 'post:3'. Bumping a generation
+# orphans the old entries, which then age out of the cache on their own.
+GENERATION_KEY = 'anon-cache:gen:{}'
+HITS_KEY = 'anon-cache:hits'
+MISSES_KEY = 'anon-cache:misses'
+ANONYMOUS_HIT = (('cache', 'anonymous'), ('result', 'hit'))
+ANONYMOUS_MISS = (('cache', 'anonymous'), ('result', 'miss'))
+
+
+def generations(groups):
+    keys = [GENERATION_KEY.format(group) for group in groups]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # seeded from the clock so an evicted generation can't
+            # come back as a value that old entries were stamped with
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def invalidate(*groups):
+    """
+    called from the model signal handlers whenever something
+    the cached responses for these groups depend on changes.
+    The generations are bumped once the transaction commits, bumped
+    before it a request still reading the old rows would cache them
+    under the new generation
+    """
+    transaction.on_commit(lambda: bump_generations(groups))
+
+
+def bump_generations(groups):
+    for group in groups:
+        key = GENERATION_KEY.format(group)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def count(key, delta=1):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def cache_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = stats.get(HITS_KEY, 0)
+    misses = stats.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else None,
+    }
+
+
+class AnonymousCacheMixin:
+    """
+    Caches the serialized data of GET responses for logged out users,
+    who all get the same answer. Keyed on host, path and query params,
+    views list the invalidation groups they depend on in cache_groups,
+    formatted with the url kwargs, e.g. ['post:{pk}'].
+    """
+    cache_groups = []
+
+    def get_cache_key(self, request):
+        groups = [group.format(**self.kwargs) for group in self.cache_groups]
+        query = sorted(request.query_params.lists())
+        raw = repr((
+            request.get_host(), request.path, query, generations(groups)
+        ))
+        return 'anon-cache:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            count(HITS_KEY)
+            registry.inc(CACHE_REQUESTS, ANONYMOUS_HIT)
+            data, validators = cached
+            # replay any ETag / Last-Modified the view set
+            response = get_conditional_response(
+                request._request,
+                etag=validators.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    validators.get('Last-Modified', '')
+                ),
+            ) or Response(data)
+            for header, value in validators.items():
+                response[header] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        count(MISSES_KEY)
+        registry.inc(CACHE_REQUESTS, ANONYMOUS_MISS)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            validators = {
+                header: response[header]
+                for header in ('ETag', 'Last-Modified')
+                if response.has_header(header)
+            }
+            cache.set(
+                key,
+                (response.data, validators),
+                settings.ANONYMOUS_CACHE_TIMEOUT,
+            )
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,56 @@
+import hashlib
+from datetime import datetime
+from django.contrib.humanize.templatetags.humanize import naturaltime
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified to detail GETs and answers
+    If-None-Match / If-Modified-Since with a 304 from one query over
+    validator_fields, before the object is fetched or serialized.
+    Every field the response depends on needs to be listed, the ETag
+    also varies with the requesting user for is_owner, like_id etc.
+    Fields the serializer renders with naturaltime ("5 minutes ago")
+    go in humanized_fields too, their text changes with the clock, so
+    it is part of the ETag and no Last-Modified is sent.
+    """
+    validator_fields = ['updated_at']
+    humanized_fields = []
+
+    def get_validators(self):
+        model = self.get_queryset().model
+        values = model.objects.filter(
+            pk=self.kwargs['pk']
+        ).values_list(*self.validator_fields).first()
+        if values is None:
+            return None, None
+        fields = dict(zip(self.validator_fields, values))
+        humanized = [
+            naturaltime(fields[name]) for name in self.humanized_fields
+        ]
+        raw = repr((values, humanized, self.request.user.pk))
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        if humanized:
+            return etag, None
+        last_modified = max(
+            value for value in values if isinstance(value, datetime)
+        )
+        return etag, int(last_modified.timestamp())
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        if etag:
+            not_modified = get_conditional_response(
+                request._request, etag=etag, last_modified=last_modified
+            )
+            if not_modified is not None:
+                return not_modified
+
+        response = super().get(request, *args, **kwargs)
+        if etag and response.status_code == 200:
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,131 @@
+import warnings
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+class LazyRelationWarning(RuntimeWarning):
+    pass
+
+
+_paths = {}
+
+
+def eager_paths(serializer_class, model):
+    """
+    Works out the select_related and prefetch_related lookups a
+    serializer needs from the dotted sources of its fields,
+    e.g. source='owner.username' on a Post needs 'owner'.
+    SerializerMethodFields can't be inspected, the debug warning
+    below catches relations they load lazily.
+    """
+    key = (serializer_class, model)
+    if key not in _paths:
+        select, prefetch = set(), set()
+        walk_fields(
+            serializer_class().fields, model, '', False, select, prefetch
+        )
+        _paths[key] = (sorted(select), sorted(prefetch))
+    return _paths[key]
+
+
+def walk_fields(fields, model, path, many, select, prefetch):
+    for field in fields.values():
+        if field.source == '*':
+            continue
+        attrs = field.source.split('.')
+        if isinstance(field, serializers.BaseSerializer):
+            # nested serializers need the relation itself too
+            related = walk_source(attrs, model, path, many, select, prefetch)
+            if related is not None:
+                child = getattr(field, 'child', field)
+                walk_fields(child.fields, *related, select, prefetch)
+            continue
+        # only the relations crossed on the way to the attribute,
+        # a plain 'post' is rendered from post_id
+        walk_source(attrs[:-1], model, path, many, select, prefetch)
+
+
+def walk_source(attrs, model, path, many, select, prefetch):
+    for attr in attrs:
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.is_relation:
+            return None
+        path = f'{path}__{attr}' if path else attr
+        model = model_field.related_model
+        many = many or model_field.many_to_many or model_field.one_to_many
+        (prefetch if many else select).add(path)
+    return model, path, many
+
+
+def lazy_relations(instance, preloaded, prefix='', seen=()):
+    """
+    yields the relation paths cached on an instance that weren't
+    in the select_related lookups, i.e. that were loaded one by one.
+    select_related caches one-to-ones both ways (profile.owner.profile),
+    those back references to instances already on the path are skipped
+    """
+    seen = (*seen, id(instance))
+    for name, related in instance._state.fields_cache.items():
+        if id(related) in seen:
+            continue
+        path = prefix + name
+        if path not in preloaded:
+            yield path
+        if related is not None:
+            yield from lazy_relations(related, preloaded, path + '__', seen)
+
+
+class EagerLoadingMixin:
+    """
+    Applies the select_related / prefetch_related lookups the view's
+    serializer needs to its queryset.
+    With DEBUG on it also warns about relations the serializer
+    still loaded one query at a time.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select, prefetch = eager_paths(
+            self.get_serializer_class(), queryset.model
+        )
+        self.eager_select = select
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if args and settings.DEBUG:
+            self.serialized_instances = args[0]
+        return super().get_serializer(*args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        instances = getattr(self, 'serialized_instances', None)
+        if instances is not None and settings.DEBUG:
+            self.warn_lazy_relations(instances)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def warn_lazy_relations(self, instances):
+        if hasattr(instances, '_state'):
+            instances = [instances]
+        # what get_queryset applied, nothing if a view overrides it
+        select = getattr(self, 'eager_select', [])
+        preloaded = {
+            '__'.join(path.split('__')[:depth])
+            for path in select
+            for depth in range(1, path.count('__') + 2)
+        }
+        missing = set()
+        for instance in instances:
+            if hasattr(instance, '_state'):
+                missing.update(lazy_relations(instance, preloaded))
+        if missing:
+            warnings.warn(
+                f'{self.__class__.__name__} loaded {sorted(missing)} '
+                'without select_related',
+                LazyRelationWarning,
+            )
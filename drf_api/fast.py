@@ -0,0 +1,197 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+from .sparse import sparse_fields
+from .timing import timed
+
+
+class NotCompilable(Exception):
+    pass
+
+
+# field classes whose to_representation is a no-op on database values
+PASS_THROUGH = (
+    serializers.ReadOnlyField,
+    serializers.RelatedField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+)
+
+
+class RowPlan:
+    """
+    A ModelSerializer's Meta.fields compiled down to the .values() keys
+    it needs and one step per output field, so a page can be rendered
+    from flat rows without model instances or DRF's per-field machinery.
+    SerializerMethodFields need a matching get_<name>_from_row(row)
+    on the serializer, and can list the columns it reads in row_keys.
+    The serializer can also define prepare_rows(rows) to batch any
+    lookups for the page.
+    """
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        model = serializer_class.Meta.model
+        serializer = serializer_class()
+        row_keys = getattr(serializer_class, 'row_keys', {})
+        columns = [field.attname for field in model._meta.concrete_fields]
+        # always read, for cursor pagination and the row methods
+        self.base_keys = [key for key in ('id', 'created_at') if key in columns]
+        self.steps = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                method = f'get_{name}_from_row'
+                if not hasattr(serializer_class, method):
+                    raise NotCompilable(f'{serializer_class.__name__}.{method}')
+                # without row_keys every local column is fetched
+                self.steps.append(
+                    (name, row_keys.get(name, columns), 'method', method)
+                )
+                continue
+            key, model_field = self.resolve(model, field)
+            if key is None:
+                # DRF skips optional fields whose source can't be read
+                if field.required:
+                    raise NotCompilable(field.source)
+                continue
+            self.steps.append((name, [key], self.kind(field), model_field))
+
+    def keys(self, names=None):
+        """
+        the .values() keys for all fields, or just the named ones
+        """
+        keys = list(self.base_keys)
+        for name, step_keys, kind, extra in self.steps:
+            if names is None or name in names:
+                keys += [key for key in step_keys if key not in keys]
+        return keys
+
+    def resolve(self, model, field):
+        attrs = field.source.split('.')
+        path = []
+        for i, attr in enumerate(attrs):
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None, None
+            last = i == len(attrs) - 1
+            forward = model_field.is_relation and model_field.concrete
+            if model_field.is_relation and not forward:
+                raise NotCompilable(field.source)
+            if forward:
+                next_attr = None if last else attrs[i + 1]
+                target = model_field.related_model._meta.pk.name
+                if last or (next_attr == target and i + 1 == len(attrs) - 1):
+                    # 'post' or 'owner.id' are both just the fk column
+                    path.append(model_field.attname)
+                    return '__'.join(path), model_field
+                path.append(attr)
+                model = model_field.related_model
+                continue
+            if not last:
+                return None, None
+            path.append(attr)
+            return '__'.join(path), model_field
+        return None, None
+
+    def kind(self, field):
+        if isinstance(field, serializers.FileField):
+            return 'file'
+        if isinstance(field, (serializers.DateTimeField,
+                              serializers.DateField)):
+            return 'represent'
+        if isinstance(field, PASS_THROUGH):
+            return 'value'
+        raise NotCompilable(type(field).__name__)
+
+    def render(self, rows, context, names=None):
+        serializer = self.serializer_class(context=context)
+        fields = serializer.fields
+        if names is not None:
+            for name in list(fields):
+                if name not in names:
+                    fields.pop(name)
+        request = context.get('request')
+        rows = list(rows)
+        if hasattr(serializer, 'prepare_rows'):
+            serializer.prepare_rows(rows)
+
+        steps = []
+        for name, step_keys, kind, extra in self.steps:
+            if name not in fields:
+                continue
+            if kind == 'method':
+                steps.append((name, None, getattr(serializer, extra)))
+                continue
+            key = step_keys[0]
+            if kind == 'file':
+                steps.append((name, key, file_url(extra.storage, request)))
+            elif kind == 'represent':
+                steps.append((name, key, fields[name].to_representation))
+            else:
+                steps.append((name, key, None))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, key, func in steps:
+                if key is None:
+                    item[name] = func(row)
+                else:
+                    value = row[key]
+                    if func is not None and value is not None:
+                        value = func(value)
+                    item[name] = value
+            data.append(item)
+        return data
+
+
+def file_url(storage, request):
+    def to_url(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+    return to_url
+
+
+_plans = {}
+
+
+def compile_serializer(serializer_class):
+    if serializer_class not in _plans:
+        try:
+            _plans[serializer_class] = RowPlan(serializer_class)
+        except NotCompilable:
+            _plans[serializer_class] = None
+    return _plans[serializer_class]
+
+
+class FastListMixin:
+    """
+    Serves list GETs from .values() rows through a compiled RowPlan,
+    with the same output as the view's serializer.
+    Falls back to the normal path if the serializer can't be compiled.
+    """
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        plan = compile_serializer(serializer_class)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        names = sparse_fields(request, serializer_class)
+        rows = self.filter_queryset(self.get_queryset()).values(
+            *plan.keys(names)
+        )
+        page = self.paginate_queryset(rows)
+        context = self.get_serializer_context()
+        with timed('serialize'):
+            data = plan.render(
+                rows if page is None else page, context, names
+            )
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
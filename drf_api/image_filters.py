@@ -0,0 +1,324 @@
+import hashlib
+import io
+import math
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from PIL import Image, ImageOps
+
+# bump when the filter definitions change, so cached renders are redone
+ENGINE_VERSION = 1
+
+# Post.image_filter choices as the CSS the frontend applies
+# (filter functions, then a flat or radial blended overlay),
+# rendered with Pillow's per-channel lookup tables, colour matrices
+# and composites instead of per-pixel python.
+# ('blend', mode, rgb, alpha) and
+# ('radial', mode, (rgb, alpha) at the centre, (rgb, alpha) at the edge,
+#  start, end) with start / end as fractions of the distance to the edge
+FILTERS = {
+    'normal': [],
+    '_1977': [
+        ('contrast', 1.1), ('brightness', 1.1), ('saturate', 1.3),
+        ('blend', 'screen', (243, 106, 188), 0.3),
+    ],
+    'brannan': [
+        ('sepia', 0.5), ('contrast', 1.4),
+        ('blend', 'lighten', (161, 44, 199), 0.31),
+    ],
+    'earlybird': [
+        ('contrast', 0.9), ('sepia', 0.2),
+        ('radial', 'overlay',
+         ((208, 186, 142), 1), ((29, 2, 16), 1), 0.2, 1.0),
+    ],
+    'hudson': [
+        ('brightness', 1.2), ('contrast', 0.9), ('saturate', 1.1),
+        ('radial', 'multiply',
+         ((166, 177, 255), 0.5), ((52, 33, 52), 0.5), 0.5, 1.0),
+    ],
+    'inkwell': [
+        ('sepia', 0.3), ('contrast', 1.1), ('brightness', 1.1),
+        ('grayscale', 1),
+    ],
+    'lofi': [
+        ('saturate', 1.1), ('contrast', 1.5),
+        ('radial', 'multiply',
+         ((255, 255, 255), 0), ((34, 34, 34), 1), 0.7, 1.5),
+    ],
+    'kelvin': [
+        ('blend', 'color-dodge', (56, 44, 52), 1),
+        ('blend', 'overlay', (183, 125, 33), 1),
+    ],
+    'nashville': [
+        ('sepia', 0.2), ('contrast', 1.2), ('brightness', 1.05),
+        ('saturate', 1.2),
+        ('blend', 'darken', (247, 176, 153), 0.56),
+        ('blend', 'lighten', (0, 70, 150), 0.4),
+    ],
+    'rise': [
+        ('brightness', 1.05), ('sepia', 0.2), ('contrast', 0.9),
+        ('saturate', 0.9),
+        ('radial', 'multiply',
+         ((236, 205, 169), 0.15), ((50, 30, 7), 0.4), 0.55, 1.0),
+        ('radial', 'overlay',
+         ((232, 197, 152), 0.48), ((232, 197, 152), 0), 0, 0.9),
+    ],
+    'toaster': [
+        ('contrast', 1.5), ('brightness', 0.9),
+        ('radial', 'screen',
+         ((128, 78, 15), 1), ((59, 0, 59), 1), 0, 1.0),
+    ],
+    'valencia': [
+        ('contrast', 1.08), ('brightness', 1.08), ('sepia', 0.08),
+        ('blend', 'exclusion', (58, 3, 57), 0.5),
+    ],
+    'walden': [
+        ('brightness', 1.1), ('hue-rotate', -10), ('sepia', 0.3),
+        ('saturate', 1.6),
+        ('blend', 'screen', (0, 68, 204), 0.3),
+    ],
+    'xpro2': [
+        ('sepia', 0.3),
+        ('radial', 'color-burn',
+         ((230, 231, 224), 1), ((43, 42, 161), 0.6), 0.4, 1.1),
+    ],
+}
+
+BLEND_MODES = {
+    'screen': lambda v, c: 1 - (1 - v) * (1 - c),
+    'multiply': lambda v, c: v * c,
+    'lighten': max,
+    'darken': min,
+    'overlay': lambda v, c: (
+        2 * v * c if v < 0.5 else 1 - 2 * (1 - v) * (1 - c)
+    ),
+    'color-dodge': lambda v, c: 1 if c >= 1 else min(1, v / (1 - c)),
+    'color-burn': lambda v, c: 0 if c <= 0 else 1 - min(1, (1 - v) / c),
+    'exclusion': lambda v, c: v + c - 2 * v * c,
+}
+
+
+def clamp(value):
+    return min(255, max(0, int(round(value))))
+
+
+def channel_lut(func):
+    """
+    the same 0-255 mapping for r, g and b, in Image.point's layout
+    """
+    return [clamp(func(i)) for i in range(256)] * 3
+
+
+def blend_lut(mode, rgb, alpha):
+    blend = BLEND_MODES[mode]
+    lut = []
+    for c in rgb:
+        c /= 255
+        for i in range(256):
+            v = i / 255
+            lut.append(clamp((v + (blend(v, c) - v) * alpha) * 255))
+    return lut
+
+
+def step_lut(step):
+    kind = step[0]
+    if kind == 'brightness':
+        return channel_lut(lambda i: i * step[1])
+    if kind == 'contrast':
+        return channel_lut(lambda i: (i - 127.5) * step[1] + 127.5)
+    if kind == 'blend':
+        return blend_lut(*step[1:])
+    return None
+
+
+def compose(first, then):
+    """
+    one lookup table doing first and then then, so a run of
+    per-channel steps is a single pass over the pixels
+    """
+    if first is None:
+        return then
+    return [
+        then[channel * 256 + first[channel * 256 + i]]
+        for channel in range(3) for i in range(256)
+    ]
+
+
+def color_matrix(kind, amount):
+    """
+    the CSS Filter Effects matrices, as Image.convert's 12-tuple
+    """
+    if kind == 'hue-rotate':
+        cos, sin = math.cos(math.radians(amount)), math.sin(math.radians(amount))
+        rows = [
+            (0.213 + cos * 0.787 - sin * 0.213,
+             0.715 - cos * 0.715 - sin * 0.715,
+             0.072 - cos * 0.072 + sin * 0.928),
+            (0.213 - cos * 0.213 + sin * 0.143,
+             0.715 + cos * 0.285 + sin * 0.140,
+             0.072 - cos * 0.072 - sin * 0.283),
+            (0.213 - cos * 0.213 - sin * 0.787,
+             0.715 - cos * 0.715 + sin * 0.715,
+             0.072 + cos * 0.928 + sin * 0.072),
+        ]
+    elif kind == 'saturate':
+        s = amount
+        rows = [
+            (0.213 + 0.787 * s, 0.715 - 0.715 * s, 0.072 - 0.072 * s),
+            (0.213 - 0.213 * s, 0.715 + 0.285 * s, 0.072 - 0.072 * s),
+            (0.213 - 0.213 * s, 0.715 - 0.715 * s, 0.072 + 0.928 * s),
+        ]
+    else:
+        # sepia and grayscale interpolate from the identity
+        full = {
+            'sepia': [
+                (0.393, 0.769, 0.189),
+                (0.349, 0.686, 0.168),
+                (0.272, 0.534, 0.131),
+            ],
+            'grayscale': [
+                (0.2126, 0.7152, 0.0722),
+                (0.2126, 0.7152, 0.0722),
+                (0.2126, 0.7152, 0.0722),
+            ],
+        }[kind]
+        a = min(1, amount)
+        rows = [
+            tuple(
+                a * full[r][c] + (1 - a) * (r == c) for c in range(3)
+            )
+            for r in range(3)
+        ]
+    return tuple(value for row in rows for value in (*row, 0))
+
+
+@lru_cache(maxsize=32)
+def radial_mask(size, start, end):
+    """
+    255 where the centre colour applies, 0 where the edge one does
+    """
+    def weight(g):
+        t = (g / 255 - start) / (end - start) if end > start else 1
+        return 255 - clamp(min(1, max(0, t)) * 255)
+    return Image.radial_gradient('L').resize(size).point(weight)
+
+
+def apply_filter(image, name):
+    image = image.convert('RGB')
+    lut = None
+    for step in FILTERS[name]:
+        kind = step[0]
+        per_channel = step_lut(step)
+        if per_channel is not None:
+            lut = compose(lut, per_channel)
+            continue
+        if lut is not None:
+            image = image.point(lut)
+            lut = None
+        if kind == 'radial':
+            mode, (inner, inner_alpha), (outer, outer_alpha), start, end = step[1:]
+            image = Image.composite(
+                image.point(blend_lut(mode, inner, inner_alpha)),
+                image.point(blend_lut(mode, outer, outer_alpha)),
+                radial_mask(image.size, start, end),
+            )
+        else:
+            image = image.convert('RGB', color_matrix(kind, step[1]))
+    if lut is not None:
+        image = image.point(lut)
+    return image
+
+
+def render_filtered(data, name, max_size, quality):
+    """
+    runs in the process pool, returns the filtered JPEG bytes
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # lets JPEGs decode straight to a reduced size
+        image.draft('RGB', (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_size, max_size))
+        buffer = io.BytesIO()
+        apply_filter(image, name).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def filter_key(image_name, filter_name):
+    """
+    what the render depends on, stored images are never overwritten
+    in place so their name stands in for their content
+    """
+    raw = f'{ENGINE_VERSION}:{filter_name}:{image_name}'
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Files stored under the hash of what they were made from, evicted
+    least recently used first once the directory outgrows max_bytes.
+    Hits bump the file's mtime, so eviction order survives restarts
+    and is shared by every process using the directory.
+    """
+    def __init__(self, root, max_bytes):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self.size = None
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside and renamed, readers never see half a file
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp, path)
+        with self.lock:
+            if self.size is None:
+                self.size = self.total()
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+        return path
+
+    def entries(self):
+        for directory, _, files in os.walk(self.root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def total(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        drops the least recently used files down to 90% of max_bytes,
+        sizes are recounted from disk as other processes write too
+        """
+        entries = sorted(self.entries())
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
@@ -0,0 +1,306 @@
+import io
+import logging
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from rest_framework import serializers
+from .image_filters import DiskLRUCache, filter_key, render_filtered
+
+logger = logging.getLogger(__name__)
+
+# model field the derivative is stored in: (thumbnail or not, format)
+DERIVATIVES = {
+    'image_thumbnail': (True, 'JPEG'),
+    'image_thumbnail_webp': (True, 'WEBP'),
+    'image_webp': (False, 'WEBP'),
+}
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+JPEG_SOF = {
+    0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF,
+}
+JPEG_STANDALONE = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+
+# cache key claiming the render of a filter_key
+RENDERING_KEY = 'image-filter:rendering:{}'
+
+
+def probe_image(file):
+    """
+    reads the format, width and height from the image header,
+    without handing the file to Pillow. Returns None if it isn't
+    a PNG, GIF, WebP or JPEG
+    """
+    file.seek(0)
+    try:
+        head = file.read(32)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR':
+            return ('PNG', *struct.unpack('>II', head[16:24]))
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return ('GIF', *struct.unpack('<HH', head[6:10]))
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return probe_webp(head)
+        if head[:2] == b'\xff\xd8':
+            file.seek(2)
+            return probe_jpeg(file)
+    except struct.error:
+        return None
+    finally:
+        file.seek(0)
+    return None
+
+
+def probe_webp(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+        width, height = struct.unpack('<HH', head[26:30])
+        return 'WEBP', width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and head[20:21] == b'\x2f':
+        bits = struct.unpack('<I', head[21:25])[0]
+        return 'WEBP', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        width = int.from_bytes(head[24:27], 'little') + 1
+        height = int.from_bytes(head[27:30], 'little') + 1
+        return 'WEBP', width, height
+    return None
+
+
+def probe_jpeg(file):
+    """
+    walks the segment headers up to the first start-of-frame,
+    seeking over the segment bodies (EXIF, ICC profiles etc.)
+    """
+    while True:
+        byte = file.read(1)
+        if byte != b'\xff':
+            return None
+        marker = file.read(1)
+        while marker == b'\xff':
+            marker = file.read(1)
+        if not marker:
+            return None
+        marker = marker[0]
+        if marker in JPEG_STANDALONE:
+            continue
+        length = struct.unpack('>H', file.read(2))[0]
+        if marker in JPEG_SOF:
+            _, height, width = struct.unpack('>BHH', file.read(5))
+            return 'JPEG', width, height
+        file.seek(length - 2, 1)
+
+
+class ProbedImageField(serializers.ImageField):
+    """
+    ImageField that validates uploads with probe_image instead of
+    Pillow, so the request thread never decodes the image.
+    The probed size is on the value as image_size.
+    """
+    def to_internal_value(self, data):
+        file = serializers.FileField.to_internal_value(self, data)
+        probed = probe_image(file)
+        if probed is None or not all(probed[1:]):
+            self.fail('invalid_image')
+        file.image_format = probed[0]
+        file.image_size = probed[1:]
+        return file
+
+
+def render_derivatives(data, size, quality):
+    """
+    runs in the process pool, returns {field name: encoded bytes}
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        rendered = {}
+        for field_name, (is_thumbnail, format) in DERIVATIVES.items():
+            source = thumbnail if is_thumbnail else image
+            if format == 'JPEG':
+                source = source.convert('RGB')
+            buffer = io.BytesIO()
+            source.save(buffer, format, quality=quality)
+            rendered[field_name] = buffer.getvalue()
+    return rendered
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pools():
+    """
+    the process pool does the decoding and encoding, the thread pool
+    waits on it and saves the results. One of each per process
+    """
+    with _pools_lock:
+        if _pools.get('pid') != os.getpid():
+            _pools['processes'] = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS
+            )
+            _pools['threads'] = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                thread_name_prefix='derivatives',
+            )
+            _pools['pid'] = os.getpid()
+    return _pools['processes'], _pools['threads']
+
+
+def make_derivatives(model, pk, data):
+    args = (data, settings.IMAGE_THUMBNAIL_SIZE, settings.IMAGE_QUALITY)
+    try:
+        if settings.IMAGE_DERIVATIVE_WORKERS:
+            rendered = pools()[0].submit(render_derivatives, *args).result()
+        else:
+            rendered = render_derivatives(*args)
+    except Exception:
+        logger.exception('rendering derivatives of %s %s failed', model, pk)
+        return
+
+    try:
+        instance = model._default_manager.filter(pk=pk).first()
+        if instance is None:
+            return
+        stem = os.path.splitext(os.path.basename(instance.image.name))[0]
+        # the uploads of the derivatives are queued on commit,
+        # after the row points at them
+        with transaction.atomic():
+            for field_name, content in rendered.items():
+                format = DERIVATIVES[field_name][1]
+                suffix = 'thumbnail' if DERIVATIVES[field_name][0] else 'full'
+                getattr(instance, field_name).save(
+                    f'{stem}_{suffix}.{EXTENSIONS[format]}',
+                    ContentFile(content),
+                    save=False,
+                )
+            instance.save(update_fields=[*rendered, 'updated_at'])
+    finally:
+        if settings.IMAGE_DERIVATIVE_WORKERS:
+            close_old_connections()
+
+
+def mark_new_image(sender, instance, **kwargs):
+    """
+    pre_save handler, an uncommitted image is a new upload. Its bytes
+    are read here, while they are still the upload's and not yet in the
+    spool, whose copy may be uploaded and deleted before post_save.
+    The old derivatives are cleared until the new ones are rendered
+    """
+    instance._new_image = None
+    if instance.image and not instance.image._committed:
+        instance.image.seek(0)
+        instance._new_image = instance.image.read()
+        instance.image.seek(0)
+        for field_name in DERIVATIVES:
+            setattr(instance, field_name, '')
+
+
+def queue_derivatives(sender, instance, **kwargs):
+    """
+    post_save handler, renders the upload read by mark_new_image
+    in the background after commit
+    """
+    data = getattr(instance, '_new_image', None)
+    if data is None:
+        return
+    instance._new_image = None
+    model, pk = type(instance), instance.pk
+    if settings.IMAGE_DERIVATIVE_WORKERS:
+        transaction.on_commit(
+            lambda: pools()[1].submit(make_derivatives, model, pk, data)
+        )
+    else:
+        transaction.on_commit(lambda: make_derivatives(model, pk, data))
+
+
+_filter_cache = {}
+
+
+def filter_cache():
+    root = str(settings.IMAGE_FILTER_CACHE_ROOT)
+    if root not in _filter_cache:
+        _filter_cache[root] = DiskLRUCache(
+            root, settings.IMAGE_FILTER_CACHE_SIZE
+        )
+    return _filter_cache[root]
+
+
+def render_filtered_post(model, pk):
+    """
+    renders the post's image through its image_filter into the cache,
+    unless an earlier render (of this or another post) is already there
+    """
+    try:
+        instance = model._default_manager.filter(pk=pk).only(
+            'image', 'image_filter'
+        ).first()
+        if instance is None or instance.image_filter == 'normal':
+            return
+        key = filter_key(instance.image.name, instance.image_filter)
+        if filter_cache().get(key):
+            return
+        with instance.image.open('rb') as image:
+            data = image.read()
+    except OSError:
+        # e.g. the spooled file went away mid upload, the save
+        # renaming the image queues another render
+        logger.warning('image of %s %s is not readable yet', model, pk)
+        return
+    finally:
+        if settings.IMAGE_DERIVATIVE_WORKERS:
+            close_old_connections()
+
+    args = (
+        data, instance.image_filter,
+        settings.IMAGE_FILTER_MAX_SIZE, settings.IMAGE_QUALITY,
+    )
+    try:
+        if settings.IMAGE_DERIVATIVE_WORKERS:
+            rendered = pools()[0].submit(render_filtered, *args).result()
+        else:
+            rendered = render_filtered(*args)
+    except Exception:
+        logger.exception('filtering the image of %s %s failed', model, pk)
+        return
+    filter_cache().put(key, rendered)
+
+
+def queue_filtered_image(sender, instance, created, update_fields, **kwargs):
+    """
+    post_save handler, renders the filtered image ahead of the first
+    request for it when the image or the filter may have changed
+    """
+    if instance.image_filter == 'normal':
+        return
+    if update_fields and not {'image', 'image_filter'} & set(update_fields):
+        return
+    model, pk = type(instance), instance.pk
+    key = filter_key(instance.image.name, instance.image_filter)
+    transaction.on_commit(lambda: queue_render(model, pk, key))
+
+
+def queue_render(model, pk, key):
+    """
+    queues the render unless one for the same filter_key was queued in
+    the last IMAGE_FILTER_RENDER_TIMEOUT seconds, so every request for
+    an image still rendering doesn't queue it again. The claim is left
+    to expire rather than released, a render that failed is retried
+    once per timeout
+    """
+    if not cache.add(
+        RENDERING_KEY.format(key), True, settings.IMAGE_FILTER_RENDER_TIMEOUT
+    ):
+        return
+    if settings.IMAGE_DERIVATIVE_WORKERS:
+        pools()[1].submit(render_filtered_post, model, pk)
+    else:
+        render_filtered_post(model, pk)
@@ -0,0 +1,344 @@
+import glob
+import hmac
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+# every process adds to its own file of float64 values, the endpoint
+# sums the files of all processes. A file is an 8-byte header holding
+# the bytes in use, then entries of
+#   key length (4 bytes), JSON key padded to 8 bytes, value (8 bytes)
+HEADER = struct.Struct('<Q')
+LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+PAGE = 64 * 1024
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'),
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf'))
+
+REQUEST_DURATION = 'http_request_duration_seconds'
+REQUEST_QUERIES = 'http_request_queries'
+HISTOGRAMS = {
+    REQUEST_DURATION: LATENCY_BUCKETS,
+    REQUEST_QUERIES: QUERY_BUCKETS,
+}
+# labelled cache=anonymous / auth_user, result=hit / miss
+CACHE_REQUESTS = 'cache_requests_total'
+# labelled outcome=authenticated / anonymous / failed
+AUTHENTICATIONS = 'authentications_total'
+
+
+def read_values(path):
+    """
+    {key: value} of one process's file
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    values = {}
+    if len(data) < HEADER.size:
+        return values
+    used = HEADER.unpack_from(data)[0]
+    position = HEADER.size
+    while position < used:
+        length = LENGTH.unpack_from(data, position)[0]
+        start = position + LENGTH.size
+        key = data[start:start + length].decode()
+        position = start + length + (-(LENGTH.size + length) % 8)
+        values[key] = VALUE.unpack_from(data, position)[0]
+        position += VALUE.size
+    return values
+
+
+class ValueFile:
+    """
+    One process's values in a memory mapped file, so updating one is
+    a dict lookup and an 8-byte write, and no lock is shared between
+    processes
+    """
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < PAGE:
+            self.file.truncate(PAGE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = HEADER.unpack_from(self.map)[0] or HEADER.size
+        self.positions = {}
+        for key in read_values(path):
+            self.positions[key] = self.find(key)
+
+    def find(self, key):
+        position = HEADER.size
+        while position < self.used:
+            length = LENGTH.unpack_from(self.map, position)[0]
+            start = position + LENGTH.size
+            position = start + length + (-(LENGTH.size + length) % 8)
+            if self.map[start:start + length].decode() == key:
+                return position
+            position += VALUE.size
+        return None
+
+    def allocate(self, key):
+        encoded = key.encode()
+        padding = -(LENGTH.size + len(encoded)) % 8
+        size = LENGTH.size + len(encoded) + padding + VALUE.size
+        while self.used + size > len(self.map):
+            self.map.close()
+            self.file.truncate(os.fstat(self.file.fileno()).st_size * 2)
+            self.map = mmap.mmap(self.file.fileno(), 0)
+        entry = self.used
+        LENGTH.pack_into(self.map, entry, len(encoded))
+        self.map[entry + LENGTH.size:entry + LENGTH.size + len(encoded)] = (
+            encoded
+        )
+        position = entry + LENGTH.size + len(encoded) + padding
+        VALUE.pack_into(self.map, position, 0.0)
+        self.used += size
+        # readers only look as far as the header says, so the entry
+        # is complete before it is counted
+        HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def add(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            position = self.allocate(key)
+        VALUE.pack_into(
+            self.map, position, VALUE.unpack_from(self.map, position)[0] + amount
+        )
+
+
+class Registry:
+    """
+    Counters and histograms, labelled by name and a tuple of
+    (label, value) pairs, kept in this process's ValueFile under
+    METRICS_DIR. Nothing is recorded with METRICS_DIR unset
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = None
+        self.owner = None
+        self.keys = {}
+
+    def file(self):
+        # reopened after a fork, each gunicorn worker writes its own
+        owner = (os.getpid(), settings.METRICS_DIR)
+        if not settings.METRICS_DIR:
+            self.values = self.owner = None
+        elif self.owner != owner:
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            self.values = ValueFile(
+                os.path.join(settings.METRICS_DIR, f'{os.getpid()}.db')
+            )
+            self.owner = owner
+        return self.values
+
+    def key(self, name, labels, suffix='', le=None):
+        cache_key = (name, labels, suffix, le)
+        key = self.keys.get(cache_key)
+        if key is None:
+            key = self.keys[cache_key] = json.dumps(
+                [name + suffix, dict(labels), le]
+            )
+        return key
+
+    def inc(self, name, labels=(), amount=1):
+        with self.lock:
+            values = self.file()
+            if values is not None:
+                values.add(self.key(name, labels), amount)
+
+    def observe(self, name, buckets, labels, value):
+        le = buckets[bisect_left(buckets, value)]
+        with self.lock:
+            values = self.file()
+            if values is None:
+                return
+            values.add(self.key(name, labels, '_bucket', le), 1)
+            values.add(self.key(name, labels, '_sum'), value)
+            values.add(self.key(name, labels, '_count'), 1)
+
+
+registry = Registry()
+
+
+def collect():
+    """
+    {key: value} summed over every process's file, including those of
+    exited workers, whose counts still belong in the totals
+    """
+    totals = {}
+    if not settings.METRICS_DIR:
+        return totals
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.db')):
+        for key, value in read_values(path).items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for name, value in labels.items()
+    )
+    return '{' + pairs + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def exposition(totals):
+    """
+    the Prometheus text format, histogram buckets made cumulative,
+    plus a hit ratio gauge per cache
+    """
+    families = {}
+    for key, value in totals.items():
+        name, labels, le = json.loads(key)
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in HISTOGRAMS:
+                family = name[:-len(suffix)]
+                break
+        else:
+            family = name
+        families.setdefault(family, []).append((name, labels, le, value))
+
+    lines = []
+    for family in sorted(families):
+        rows = families[family]
+        if family not in HISTOGRAMS:
+            rows = sorted(rows, key=lambda row: sorted(row[1].items()))
+            lines.append(f'# TYPE {family} counter')
+            lines += [
+                f'{name}{format_labels(labels)} {format_value(value)}'
+                for name, labels, _, value in rows
+            ]
+            continue
+        lines.append(f'# TYPE {family} histogram')
+        groups = {}
+        for name, labels, le, value in rows:
+            group = groups.setdefault(
+                tuple(sorted(labels.items())), {'buckets': {}}
+            )
+            if le is None:
+                group[name] = value
+            else:
+                group['buckets'][le] = value
+        for labels, group in sorted(groups.items()):
+            labels = dict(labels)
+            cumulative = 0
+            # every bucket, +Inf included, even those nothing fell in
+            for le in HISTOGRAMS[family]:
+                cumulative += group['buckets'].get(le, 0)
+                lines.append('{}_bucket{} {}'.format(
+                    family, format_labels({**labels, 'le': format_value(le)}),
+                    format_value(cumulative),
+                ))
+            for suffix in ('_sum', '_count'):
+                lines.append(
+                    f'{family}{suffix}{format_labels(labels)} '
+                    f'{format_value(group.get(family + suffix, 0))}'
+                )
+
+    caches = {}
+    for name, labels, _, value in families.get(CACHE_REQUESTS, []):
+        hits, total = caches.get(labels['cache'], (0, 0))
+        caches[labels['cache']] = (
+            hits + (value if labels['result'] == 'hit' else 0), total + value
+        )
+    if caches:
+        lines.append('# TYPE cache_hit_ratio gauge')
+        lines += [
+            f'cache_hit_ratio{format_labels({"cache": cache})} '
+            f'{format_value(hits / total)}'
+            for cache, (hits, total) in sorted(caches.items()) if total
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def view_label(callback):
+    """
+    the view class name for class based views, else the function's
+    """
+    view_class = getattr(callback, 'view_class', None) or getattr(
+        callback, 'cls', None
+    )
+    return view_class.__name__ if view_class else callback.__name__
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Observes every request's latency and query count, labelled by
+    view, method and status. Requests that matched no route are
+    labelled 'unmatched' so unknown paths can't add label values.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        queries = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = view_label(match.func) if match else 'unmatched'
+        registry.observe(REQUEST_DURATION, LATENCY_BUCKETS, (
+            ('view', view), ('method', request.method),
+            ('status', response.status_code),
+        ), elapsed)
+        registry.observe(REQUEST_QUERIES, QUERY_BUCKETS, (
+            ('view', view), ('method', request.method),
+        ), queries.count)
+        return response
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for a bearer METRICS_TOKEN or,
+    with no token configured, staff users
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(),
+            f'Bearer {token}'.encode(),
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        exposition(collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,80 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id).
+    Follows the direction of the view's own created_at ordering
+    so switching pagination mode doesn't flip the list around.
+    """
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get('ordering', '').split(',')[0]
+        if ordering not in ('created_at', '-created_at'):
+            ordering = next(
+                (field for field in (
+                    queryset.query.order_by or queryset.model._meta.ordering
+                ) if field.lstrip('-') == 'created_at'),
+                '-created_at'
+            )
+        if ordering.startswith('-'):
+            return ('-created_at', '-id')
+        return ('created_at', 'id')
+
+    def window(self, request, queryset, view):
+        """
+        (descending, position filter, rows): the page for this request
+        is within the first rows past the cursor's position in that
+        direction, for views that bound their subqueries the same way
+        """
+        ordering = self.get_ordering(request, queryset, view)
+        offset, reverse, position = (
+            self.decode_cursor(request) or (0, False, None)
+        )
+        descending = ordering[0].startswith('-') != reverse
+        bound = {}
+        if position is not None:
+            lookup = 'created_at__lt' if descending else 'created_at__gt'
+            bound[lookup] = position
+        return descending, bound, offset + self.get_page_size(request) + 1
+
+
+class CursorOrPageNumberPagination(PageNumberPagination):
+    """
+    Page number pagination unless the client asks for ?pagination=cursor,
+    then keyset pagination that skips the COUNT(*) and the OFFSET.
+    Orderings other than created_at can't be keyed on,
+    so those requests fall back to page numbers.
+    """
+    mode_query_param = 'pagination'
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        if request.query_params.get(self.mode_query_param) != 'cursor':
+            return False
+        ordering = request.query_params.get('ordering')
+        return not ordering or all(
+            field.strip().lstrip('-') == 'created_at'
+            for field in ordering.split(',')
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = CreatedAtCursorPagination()
+            page = self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+            self.display_page_controls = (
+                self.cursor_paginator.display_page_controls
+            )
+            return page
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator:
+            return self.cursor_paginator.to_html()
+        return super().to_html()
@@ -0,0 +1,88 @@
+from importlib import import_module
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from .metrics import view_label
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Counts the queries of every endpoint in `endpoints`, anonymously
+    and logged in as `username`, after growing the data with grow()
+    to each of `row_counts` rows. An endpoint fails if its count at
+    any size differs from the smallest (a query per row) or is over
+    its budget, and the failure lists the SQL of the worst request.
+
+    endpoints are (view name, method, path, {caller: budget}),
+    the path formatted with the attributes grow() sets.
+    Anonymous responses are timed uncached.
+    Every view routed in `url_modules` has to have an endpoint.
+    Import the module rather than the class into tests.py, or the
+    test loader runs the base class too.
+    """
+    endpoints = []
+    url_modules = []
+    row_counts = [1, 4, 10]
+    username = 'adam'
+    password = 'pass'
+
+    def grow(self, rows):
+        raise NotImplementedError
+
+    def measure(self, method, path, caller):
+        if caller == 'authenticated':
+            self.client.login(username=self.username, password=self.password)
+        else:
+            self.client.logout()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method.lower())(path)
+        self.assertLess(
+            response.status_code, 400, f'{method} {path} as {caller}'
+        )
+        return [query['sql'] for query in queries]
+
+    def test_every_view_has_a_budget(self):
+        routed = {
+            view_label(pattern.callback)
+            for module in self.url_modules
+            for pattern in import_module(module).urlpatterns
+        }
+        budgeted = {name for name, *_ in self.endpoints}
+        self.assertEqual(routed - budgeted, set(), 'views without a budget')
+
+    def test_endpoints_stay_within_query_budget(self):
+        measured = {}
+        for rows in self.row_counts:
+            self.grow(rows)
+            for name, method, path, budgets in self.endpoints:
+                for caller in budgets:
+                    measured.setdefault((method, path, caller), []).append(
+                        (rows, self.measure(
+                            method, path.format(self=self), caller
+                        ))
+                    )
+
+        for name, method, path, budgets in self.endpoints:
+            for caller, budget in budgets.items():
+                runs = measured[(method, path, caller)]
+                shown = path.format(self=self)
+                with self.subTest(view=name, path=path, caller=caller,
+                                  method=method):
+                    counts = {rows: len(sql) for rows, sql in runs}
+                    worst = max(runs, key=lambda run: len(run[1]))[1]
+                    report = '\n'.join(
+                        f'{number}. {sql}'
+                        for number, sql in enumerate(worst, 1)
+                    )
+                    self.assertEqual(
+                        len(set(counts.values())), 1,
+                        f'{method} {shown} as {caller}: queries grow with '
+                        f'rows {counts}\n{report}'
+                    )
+                    self.assertLessEqual(
+                        len(worst), budget,
+                        f'{method} {shown} as {caller}: {len(worst)} queries '
+                        f'over the budget of {budget}\n{report}'
+                    )
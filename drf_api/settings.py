@@ -13,18 +13,48 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 from pathlib import Path
 import os
 import re
+import sys
 import dj_database_url
 if os.path.exists('env.py'):
     import env
 
 CLOUDINARY_STORAGE = {'CLOUDINARY_URL': os.environ.get('CLOUDINARY_URL')}
 MEDIA_URL = '/media/'
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+DEFAULT_FILE_STORAGE = 'drf_api.storage.SpooledStorage'
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+# uploads are written to the spool and pushed to the remote storage
+# by UPLOAD_WORKERS threads per process, 0 uploads inline on commit.
+# UPLOAD_REMOTE_STORAGE can be pointed at FileSystemStorage for testing
+UPLOAD_REMOTE_STORAGE = os.environ.get(
+    'UPLOAD_REMOTE_STORAGE',
+    'cloudinary_storage.storage.MediaCloudinaryStorage'
+)
+UPLOAD_SPOOL_ROOT = os.environ.get('UPLOAD_SPOOL_ROOT', BASE_DIR / 'spool')
+UPLOAD_SPOOL_URL = '/media/pending/'
+UPLOAD_WORKERS = 4
+UPLOAD_RETRIES = 3
+UPLOAD_RETRY_DELAY = 1
+
+# thumbnails and WebP copies of uploaded images are rendered by this
+# many processes per worker, 0 renders inline on commit
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_THUMBNAIL_SIZE = 320
+IMAGE_QUALITY = 80
+
+# posts' image_filter is applied server side too, the renders are kept
+# in an LRU cache on disk shared by the workers on a machine
+IMAGE_FILTER_CACHE_ROOT = os.environ.get(
+    'IMAGE_FILTER_CACHE_ROOT', BASE_DIR / 'filter-cache'
+)
+IMAGE_FILTER_CACHE_SIZE = 512 * 1024 * 1024
+IMAGE_FILTER_MAX_SIZE = 1080
+# a render is queued once per this many seconds per image and filter
+IMAGE_FILTER_RENDER_TIMEOUT = 60
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
@@ -67,6 +97,7 @@ INSTALLED_APPS = [
     'comments',
     'likes',
     'followers',
+    'feed',
 ]
 
 SITE_ID = 1
@@ -75,7 +106,7 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [(
         'rest_framework.authentication.SessionAuthentication'
         if 'DEV' in os.environ
-        else 'dj_rest_auth.jwt_auth.JWTCookieAuthentication'
+        else 'drf_api.authentication.CachedJWTCookieAuthentication'
     )],
     'DEFAULT_PAGINATION_CLASS': 
         'rest_framework.pagination.PageNumberPagination',
@@ -87,6 +118,90 @@ if 'DEV' not in os.environ:
         'rest_framework.renderers.JSONRenderer'
     ]
 
+# posts by accounts with more followers than this are merged into
+# the feed at read time instead of being copied into every timeline
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_SIZE = 100
+# entries kept per timeline by the trim_timelines command,
+# older posts drop out of the feed
+FEED_TIMELINE_SIZE = 800
+
+# every process keeps the follower graph in memory and replays the
+# FollowerChange log to stay current, see followers/graph.py. It is
+# rebuilt from the followers table this often all the same
+FOLLOWER_GRAPH_TTL = 10 * 60
+# rebuilds run in a background thread, except under test where the
+# thread couldn't see the test case's uncommitted rows
+FOLLOWER_GRAPH_BACKGROUND = sys.argv[1:2] != ['test']
+# who to follow: how many suggestions, counted from how many of the
+# user's most recent follows
+FOLLOW_SUGGESTIONS = 20
+FOLLOW_SUGGESTIONS_FANOUT = 500
+# ?mutual_follows_of filters on the ids from the graph up to this many,
+# a join of the followers table past it
+MUTUAL_FOLLOWS_IN_LIMIT = 1000
+
+# a like or comment counts half as much towards a post's trending
+# score for every TRENDING_HALF_LIFE seconds since it was made
+TRENDING_HALF_LIFE = 6 * 60 * 60
+# rows are added to the scores in id order, ids this close behind the
+# newest one added that weren't committed yet are checked again
+TRENDING_LATE_ROWS = 1000
+
+# anonymous GET responses are cached for this many seconds at most,
+# signals invalidate them sooner. With the default local-memory cache
+# each gunicorn worker has its own copy, so set CACHE_BACKEND and
+# CACHE_LOCATION to a shared cache to invalidate across workers.
+ANONYMOUS_CACHE_TIMEOUT = 30
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# share of requests timed by drf_api.timing.ServerTimingMiddleware,
+# reported in a Server-Timing header and a drf_api.timing log line
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get(
+    'REQUEST_TIMING_SAMPLE_RATE', 1 if 'DEV' in os.environ else 0.01
+))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'drf_api.timing': {
+            'handlers': ['console'],
+            # one line per test request is just noise
+            'level': 'WARNING' if sys.argv[1:2] == ['test'] else
+            os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# request latency and query histograms, cache and authentication
+# counters, one file per process in METRICS_DIR, summed by /metrics/.
+# Empty the directory on deploy to start the counters from zero.
+# Scrapers send METRICS_TOKEN as a bearer token, without one
+# only staff users can read the metrics. Nothing is recorded under
+# test, MetricsTests sets a directory of its own
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR',
+    None if sys.argv[1:2] == ['test'] else str(BASE_DIR / 'metrics'),
+)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# JWT authenticated users are cached per process for this many seconds,
+# saves in the same process evict them sooner
+AUTH_USER_CACHE_TTL = 60
+AUTH_USER_CACHE_SIZE = 10000
+
 REST_USE_JWT = True
 JWT_AUTH_SECURE = True
 JWT_AUTH_COOKIE = 'my-app-auth'
@@ -97,6 +212,8 @@ REST_AUTH_SERIALIZERS = {
         }
 
 MIDDLEWARE = [
+    'drf_api.metrics.MetricsMiddleware',
+    'drf_api.timing.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
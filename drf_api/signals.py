@@ -0,0 +1,16 @@
+from contextlib import contextmanager
+
+
+@contextmanager
+def suspended(signal, receiver, sender):
+    """
+    disconnects a receiver for the duration of the block, e.g.
+    create_profile while a loader creates the profiles itself.
+    Signals are process wide, so this is for management commands
+    and scripts, not for request code
+    """
+    signal.disconnect(receiver, sender=sender)
+    try:
+        yield
+    finally:
+        signal.connect(receiver, sender=sender)
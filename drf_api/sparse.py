@@ -0,0 +1,73 @@
+def split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def sparse_fields(request, serializer_class):
+    """
+    The serializer field names to render for ?fields= / ?omit=,
+    in the serializer's order, or None for all of them.
+    Unknown names are ignored.
+    """
+    if request.method != 'GET':
+        return None
+    fields = split(request.query_params.get('fields', ''))
+    omit = split(request.query_params.get('omit', ''))
+    names = list(serializer_class.Meta.fields)
+    if fields & set(names):
+        names = [name for name in names if name in fields]
+    if omit:
+        names = [name for name in names if name not in omit]
+    return names if len(names) < len(serializer_class.Meta.fields) else None
+
+
+class SparseFieldsMixin:
+    """
+    Lets GET requests pick the fields they want with ?fields=id,title
+    or drop some with ?omit=content.
+    Unrequested fields are removed from the serializer, so their
+    methods never run, and model columns only they need are deferred.
+    """
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        names = sparse_fields(self.request, self.get_serializer_class())
+        if names is not None:
+            fields = getattr(serializer, 'child', serializer).fields
+            for name in list(fields):
+                if name not in names:
+                    fields.pop(name)
+        return serializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        names = sparse_fields(self.request, serializer_class)
+        if names is None:
+            return queryset
+        return queryset.defer(*deferrable(serializer_class, names))
+
+
+def deferrable(serializer_class, names):
+    """
+    plain columns rendered only by fields that weren't asked for,
+    row_keys says which columns the method fields read
+    """
+    model = serializer_class.Meta.model
+    row_keys = getattr(serializer_class, 'row_keys', {})
+    serializer = serializer_class()
+    needed = set()
+    for name in names:
+        field = serializer.fields[name]
+        if field.source == '*':
+            if name not in row_keys:
+                # can't tell what the method reads, keep every column
+                return []
+            needed.update(row_keys[name])
+        else:
+            needed.add(field.source.split('.')[0])
+    return [
+        field.name for field in model._meta.concrete_fields
+        if not field.is_relation
+        and not field.primary_key
+        and field.name in serializer_class.Meta.fields
+        and field.name not in needed
+    ]
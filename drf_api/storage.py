@@ -0,0 +1,265 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, Storage
+from django.db import close_old_connections, models, transaction
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+from .cache import count
+
+logger = logging.getLogger(__name__)
+
+QUEUED_KEY = 'uploads:queued'
+UPLOADED_KEY = 'uploads:uploaded'
+FAILED_KEY = 'uploads:failed'
+RETRIES_KEY = 'uploads:retries'
+LATENCY_KEY = 'uploads:latency_ms'
+MAX_LATENCY_KEY = 'uploads:max_latency_ms'
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_spooled = threading.local()
+
+
+def executor():
+    """
+    one pool per process, created lazily so gunicorn workers
+    don't inherit a forked copy of the master's threads
+    """
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.UPLOAD_WORKERS,
+                thread_name_prefix='upload',
+            )
+            _executor_pid = os.getpid()
+    return _executor
+
+
+def unclaimed():
+    """
+    spooled name -> storage of the files this thread spooled, until the
+    post_save of the row they were saved for claims them
+    """
+    if not hasattr(_spooled, 'storages'):
+        _spooled.storages = {}
+    return _spooled.storages
+
+
+def claim_uploads(sender, instance, **kwargs):
+    """
+    post_save handler, queues the upload of the files just spooled for
+    the instance's file fields once the row is committed, tied to its
+    pk so the upload renames only this row. Files spooled for a save
+    that failed stay in the spool for flush_upload_spool
+    """
+    storages = unclaimed()
+    if not storages:
+        return
+    for field in sender._meta.concrete_fields:
+        if isinstance(field, models.FileField):
+            name = getattr(instance, field.attname).name
+            storage = storages.pop(name, None)
+            if storage is not None:
+                storage.queue(name, {
+                    'model': sender, 'pk': instance.pk,
+                    'field': field.name, 'instance': instance,
+                })
+
+
+@deconstructible
+class SpooledStorage(Storage):
+    """
+    Saves uploads to a local spool directory and returns straight away,
+    the file is pushed to the remote storage (UPLOAD_REMOTE_STORAGE,
+    Cloudinary in production) by a thread pool once the row it was
+    saved for is committed, see claim_uploads.
+    Until then url() points at the spooled copy, served by the
+    UPLOAD_SPOOL_URL route in DEBUG. The remote storage may rename the
+    file, the row it was saved for is updated once the upload is done.
+    With UPLOAD_WORKERS = 0 uploads run inline on commit.
+    """
+    def __init__(self, remote=None, spool_root=None, spool_url=None):
+        self.remote = import_string(
+            remote or settings.UPLOAD_REMOTE_STORAGE
+        )()
+        self.spool = FileSystemStorage(
+            location=spool_root or settings.UPLOAD_SPOOL_ROOT,
+            base_url=spool_url or settings.UPLOAD_SPOOL_URL,
+        )
+
+    def _save(self, name, content):
+        name = self.spool.save(name, content)
+        count(QUEUED_KEY)
+        unclaimed()[name] = self
+        return name
+
+    def is_pending(self, name):
+        try:
+            return bool(name) and self.spool.exists(name)
+        except SuspiciousFileOperation:
+            # e.g. the '../samples/...' defaults, never spooled
+            return False
+
+    def _open(self, name, mode='rb'):
+        if self.is_pending(name):
+            return self.spool.open(name, mode)
+        return self.remote.open(name, mode)
+
+    def queue(self, name, owner):
+        transaction.on_commit(lambda: self.enqueue(name, owner))
+
+    def enqueue(self, name, owner=None):
+        if settings.UPLOAD_WORKERS:
+            executor().submit(self.upload, name, owner)
+        else:
+            self.upload(name, owner)
+
+    def upload(self, name, owner=None):
+        started = time.monotonic()
+        try:
+            remote_name = self.push(name)
+            if remote_name is None:
+                count(FAILED_KEY)
+                return
+            if remote_name != name:
+                self.rename(name, remote_name, owner)
+            self.spool.delete(name)
+        finally:
+            if settings.UPLOAD_WORKERS:
+                close_old_connections()
+        elapsed = int((time.monotonic() - started) * 1000)
+        count(UPLOADED_KEY)
+        count(LATENCY_KEY, elapsed)
+        if elapsed > cache.get(MAX_LATENCY_KEY, 0):
+            cache.set(MAX_LATENCY_KEY, elapsed, None)
+
+    def push(self, name):
+        """
+        uploads with exponential backoff, the spooled file is kept
+        if every attempt fails so it can be retried later
+        """
+        for attempt in range(settings.UPLOAD_RETRIES + 1):
+            try:
+                with self.spool.open(name) as content:
+                    return self.remote.save(name, content)
+            except Exception:
+                if attempt == settings.UPLOAD_RETRIES:
+                    logger.exception('upload of %s failed', name)
+                    return None
+                count(RETRIES_KEY)
+                time.sleep(settings.UPLOAD_RETRY_DELAY * 2 ** attempt)
+
+    def rename(self, name, remote_name, owner=None):
+        """
+        points the row the file was saved for from the spooled name to
+        the remote one, saving through the model so the cache
+        invalidation signals run. Files with no owner, e.g. left in the
+        spool by a killed worker, are looked up by name, which the
+        uuid in spooled names keeps to the one row.
+        The instance that was saved is pointed at the remote name too,
+        for the response to the request that saved it
+        """
+        if owner:
+            targets = [(owner['model'], owner['field'], {'pk': owner['pk']})]
+        else:
+            targets = [
+                (model, field.name, {})
+                for model in apps.get_models()
+                for field in model._meta.concrete_fields
+                if isinstance(getattr(field, 'storage', None), SpooledStorage)
+            ]
+        for model, field_name, lookup in targets:
+            auto_now = [
+                field.name for field in model._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            ]
+            for instance in model._default_manager.filter(
+                **{field_name: name}, **lookup
+            ):
+                setattr(instance, field_name, remote_name)
+                instance.save(update_fields=[field_name] + auto_now)
+        if owner and getattr(owner['instance'], owner['field']).name == name:
+            setattr(owner['instance'], owner['field'], remote_name)
+
+    def pending(self):
+        """
+        names still in the spool, queued, in flight or failed
+        """
+        names = []
+        for root, _, files in os.walk(self.spool.location):
+            relative = os.path.relpath(root, self.spool.location)
+            for filename in files:
+                names.append(os.path.normpath(
+                    os.path.join(relative, filename)
+                ).replace(os.sep, '/'))
+        return names
+
+    def delete(self, name):
+        if self.is_pending(name):
+            self.spool.delete(name)
+        self.remote.delete(name)
+
+    def exists(self, name):
+        return self.is_pending(name) or self.remote.exists(name)
+
+    def get_available_name(self, name, max_length=None):
+        """
+        a uuid in every name instead of checking what is taken, the
+        spool only holds the files not uploaded yet and a remote round
+        trip here is what this storage is avoiding
+        """
+        dir_name, file_name = os.path.split(name)
+        file_root, file_ext = os.path.splitext(file_name)
+        suffix = f'_{uuid.uuid4().hex}{file_ext}'
+        if max_length is not None:
+            keep = max_length - len(os.path.join(dir_name, suffix))
+            if keep < 1:
+                raise SuspiciousFileOperation(
+                    'Storage can not find an available filename for "%s". '
+                    'Please make sure that the corresponding file field '
+                    'allows sufficient "max_length".' % name
+                )
+            file_root = file_root[:keep]
+        # the spool still validates the name
+        return self.spool.get_available_name(
+            os.path.join(dir_name, file_root + suffix), max_length
+        )
+
+    def size(self, name):
+        if self.is_pending(name):
+            return self.spool.size(name)
+        return self.remote.size(name)
+
+    def url(self, name):
+        if self.is_pending(name):
+            return self.spool.url(name)
+        return self.remote.url(name)
+
+
+def upload_stats(storage):
+    stats = cache.get_many([
+        QUEUED_KEY, UPLOADED_KEY, FAILED_KEY, RETRIES_KEY,
+        LATENCY_KEY, MAX_LATENCY_KEY,
+    ])
+    uploaded = stats.get(UPLOADED_KEY, 0)
+    return {
+        'queue_depth': len(storage.pending()),
+        'queued': stats.get(QUEUED_KEY, 0),
+        'uploaded': uploaded,
+        'failed': stats.get(FAILED_KEY, 0),
+        'retries': stats.get(RETRIES_KEY, 0),
+        'mean_latency_ms': (
+            stats.get(LATENCY_KEY, 0) / uploaded if uploaded else None
+        ),
+        'max_latency_ms': stats.get(MAX_LATENCY_KEY),
+    }
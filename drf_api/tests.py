@@ -0,0 +1,756 @@
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import warnings
+from unittest import mock
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import (
+    APIRequestFactory, APITestCase, APITransactionTestCase,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.utils.encoders import JSONEncoder
+from comments.models import Comment
+from comments.serializers import CommentDetailSerializer, CommentSerializer
+from comments.views import CommentList
+from followers.graph import follower_graph
+from followers.models import Follower
+from followers.serializers import FollowerSerializer
+from followers.views import FollowerList
+from likes.models import Like
+from likes.serializers import LikeSerializer
+from likes.views import LikeList
+from posts.models import Post
+from posts.serializers import PostSerializer
+from posts.views import PostList
+from profiles.models import Profile
+from .authentication import CachedJWTCookieAuthentication, user_cache
+from .eager import LazyRelationWarning, eager_paths, lazy_relations
+from .fast import compile_serializer
+from .image_filters import (
+    FILTERS, DiskLRUCache, apply_filter, compose, step_lut,
+)
+from .images import probe_image
+from . import metrics, query_budget
+from .serializers import CurrentUserSerializer
+from .storage import upload_stats
+
+
+class AnonymousCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        adam = User.objects.create_user(
+            username='adam', password='pass', is_staff=True
+        )
+        Post.objects.create(owner=adam, title='a title')
+
+    def test_second_anonymous_read_is_a_hit(self):
+        self.assertEqual(self.client.get('/posts/1/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/posts/1/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['title'], 'a title')
+
+    def test_comment_invalidates_cached_post(self):
+        self.client.get('/posts/1/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(owner_id=1, post_id=1, content='hi')
+        response = self.client.get('/posts/1/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['comments_count'], 1)
+
+    def test_logged_in_reads_are_not_cached(self):
+        self.client.login(username='adam', password='pass')
+        response = self.client.get('/profiles/')
+        self.assertFalse(response.has_header('X-Cache'))
+
+    def test_staff_can_read_hit_and_miss_counters(self):
+        self.client.get('/profiles/')
+        self.client.get('/profiles/')
+        self.client.login(username='adam', password='pass')
+        response = self.client.get('/cache-stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['hits'], 1)
+        self.assertEqual(response.data['misses'], 1)
+
+
+class EagerLoadingTests(APITestCase):
+    def test_paths_come_from_serializer_sources(self):
+        self.assertEqual(
+            eager_paths(CommentDetailSerializer, Comment),
+            (['owner', 'post'], [])
+        )
+        self.assertEqual(
+            eager_paths(FollowerSerializer, Follower),
+            (['followed', 'owner'], [])
+        )
+        self.assertEqual(
+            eager_paths(CurrentUserSerializer, User), (['profile'], [])
+        )
+
+    def test_comment_list_query_count_does_not_grow_with_rows(self):
+        adam = User.objects.create_user(username='adam', password='pass')
+        post = Post.objects.create(owner=adam, title='a title')
+        Comment.objects.create(owner=adam, post=post, content='first')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get('/comments/')
+        for i in range(5):
+            anna = User.objects.create_user(username=f'anna{i}')
+            Comment.objects.create(owner=anna, post=post, content='more')
+        with CaptureQueriesContext(connection) as many:
+            self.client.get('/comments/')
+        self.assertEqual(len(few), len(many))
+
+    def test_lazily_loaded_relations_are_reported(self):
+        adam = User.objects.create_user(username='adam', password='pass')
+        post = Post.objects.create(owner=adam, title='a title')
+        Comment.objects.create(owner=adam, post=post, content='first')
+        comment = Comment.objects.select_related('owner').get()
+        comment.owner.username
+        comment.post.owner
+        self.assertEqual(
+            sorted(lazy_relations(comment, {'owner'})),
+            ['post', 'post__owner']
+        )
+
+    def test_one_to_one_back_references_are_not_lazy(self):
+        User.objects.create_user(username='adam', password='pass')
+        profile = Profile.objects.select_related('owner').get()
+        self.assertIs(profile.owner.profile, profile)
+        self.assertEqual(list(lazy_relations(profile, {'owner'})), [])
+
+    @override_settings(DEBUG=True)
+    def test_debug_mode_warns_about_lazy_relations(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        post = Post.objects.create(owner=adam, title='a title')
+        with mock.patch(
+            'drf_api.eager.eager_paths', return_value=([], [])
+        ), self.assertWarns(LazyRelationWarning):
+            self.client.get(f'/posts/{post.id}/')
+
+    @override_settings(DEBUG=True)
+    def test_debug_mode_lists_profiles_and_feed(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        self.client.login(username='adam', password='pass')
+
+        def follow_and_post(username):
+            user = User.objects.create_user(username=username)
+            Follower.objects.create(owner=adam, followed=user)
+            Post.objects.create(owner=user, title='a title')
+
+        follow_and_post('anna')
+        # the first request also loads the session and follower graph
+        self.client.get('/profiles/')
+        for url in ['/profiles/', '/feed/']:
+            with self.subTest(url=url), warnings.catch_warnings():
+                warnings.simplefilter('error', LazyRelationWarning)
+                with CaptureQueriesContext(connection) as few:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                for i in range(4):
+                    follow_and_post(f'{url.strip("/")}{i}')
+                with CaptureQueriesContext(connection) as many:
+                    response = self.client.get(url)
+                self.assertEqual(len(few), len(many))
+
+
+class FastListTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        anna = User.objects.create_user(username='anna', password='pass')
+        post = Post.objects.create(owner=adam, title='a title')
+        Post.objects.create(owner=anna, title='another', content='words')
+        Comment.objects.create(owner=anna, post=post, content='hi')
+        Like.objects.create(owner=adam, post=post)
+        Follower.objects.create(owner=adam, followed=anna)
+
+    def assert_same_as_serializer(self, url, view):
+        response = self.client.get(url)
+        request = Request(response.wsgi_request)
+        request.user = User.objects.get(username='adam')
+        expected = view.serializer_class(
+            view.queryset.all(), many=True, context={'request': request},
+        ).data
+        self.assertEqual(
+            json.loads(json.dumps(response.data['results'], cls=JSONEncoder)),
+            json.loads(json.dumps(expected, cls=JSONEncoder)),
+        )
+
+    def test_fast_lists_match_the_serializers(self):
+        self.client.login(username='adam', password='pass')
+        self.assert_same_as_serializer('/posts/', PostList)
+        self.assert_same_as_serializer('/comments/', CommentList)
+        self.assert_same_as_serializer('/likes/', LikeList)
+        self.assert_same_as_serializer('/followers/', FollowerList)
+
+    def test_serializers_compile(self):
+        for serializer_class in (PostSerializer, CommentSerializer,
+                                 LikeSerializer, FollowerSerializer):
+            self.assertIsNotNone(compile_serializer(serializer_class))
+
+
+class RenamingStorage(FileSystemStorage):
+    """
+    stands in for cloudinary, which picks its own public_id
+    """
+    def _save(self, name, content):
+        return super()._save('remote/' + name.split('/')[-1], content)
+
+
+class FailingStorage(FileSystemStorage):
+    def _save(self, name, content):
+        raise IOError('remote storage is down')
+
+
+def png(size=(4, 4)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size).save(buffer, 'PNG')
+    return SimpleUploadedFile('photo.png', buffer.getvalue(), 'image/png')
+
+
+class SpooledStorageMixin:
+    """
+    uploads go to a temporary spool and a FileSystemStorage
+    standing in for cloudinary, inline on commit
+    """
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(
+            DEFAULT_FILE_STORAGE='drf_api.storage.SpooledStorage',
+            UPLOAD_REMOTE_STORAGE='drf_api.tests.RenamingStorage',
+            UPLOAD_SPOOL_ROOT=f'{self.root}/spool',
+            MEDIA_ROOT=f'{self.root}/remote',
+            UPLOAD_WORKERS=0,
+            UPLOAD_RETRY_DELAY=0,
+            IMAGE_DERIVATIVE_WORKERS=0,
+            IMAGE_FILTER_CACHE_ROOT=f'{self.root}/filter-cache',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        User.objects.create_user(username='adam', password='pass')
+        self.client.login(username='adam', password='pass')
+
+
+class SpooledStorageTestCase(SpooledStorageMixin, APITestCase):
+    pass
+
+
+class SpooledStorageTests(SpooledStorageTestCase):
+    def test_image_is_pending_until_the_row_commits(self):
+        response = self.client.post(
+            '/posts/', {'title': 'a title', 'image': png()}
+        )
+        self.assertIn('/media/pending/images/photo', response.data['image'])
+        self.assertEqual(upload_stats(default_storage)['queue_depth'], 1)
+
+    def test_upload_renames_the_row_and_empties_the_spool(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/posts/', {'title': 'a title', 'image': png()})
+        post = Post.objects.get()
+        self.assertRegex(post.image.name, r'^remote/photo_[0-9a-f]{32}\.png$')
+        self.assertNotIn('pending', post.image.url)
+        self.assertEqual(upload_stats(default_storage)['uploaded'], 1)
+        self.assertFalse([
+            name for name in default_storage.pending()
+            if name.startswith('images/')
+        ])
+
+    def test_uploads_of_the_same_name_keep_their_own_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/posts/', {'title': 'first', 'image': png()})
+            self.client.post(
+                '/posts/', {'title': 'second', 'image': png((8, 8))}
+            )
+        first, second = Post.objects.order_by('id')
+        self.assertNotEqual(first.image.name, second.image.name)
+        with Image.open(first.image) as image:
+            self.assertEqual(image.size, (4, 4))
+        with Image.open(second.image) as image:
+            self.assertEqual(image.size, (8, 8))
+
+    def test_upload_renames_only_the_row_it_was_saved_for(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/posts/', {'title': 'a title', 'image': png()})
+            spooled = Post.objects.get().image.name
+            copy = Post.objects.create(
+                owner_id=1, title='a copy', image=spooled
+            )
+        self.assertNotEqual(Post.objects.get(title='a title').image.name,
+                            spooled)
+        copy.refresh_from_db()
+        self.assertEqual(copy.image.name, spooled)
+
+    def test_failed_upload_stays_in_the_spool(self):
+        # DEFAULT_FILE_STORAGE again so default_storage is rebuilt
+        with self.assertLogs('drf_api.storage', 'ERROR'), self.settings(
+            DEFAULT_FILE_STORAGE='drf_api.storage.SpooledStorage',
+            UPLOAD_REMOTE_STORAGE='drf_api.tests.FailingStorage',
+        ), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/posts/', {'title': 'a title', 'image': png()}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        stats = upload_stats(default_storage)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['retries'], 3)
+        self.assertTrue([
+            name for name in default_storage.pending()
+            if name.startswith('images/photo_')
+        ])
+
+
+class AutocommitUploadTests(SpooledStorageMixin, APITransactionTestCase):
+    """
+    no transaction around the request, on_commit callbacks run as soon
+    as they are registered
+    """
+    def test_upload_waits_for_the_row(self):
+        response = self.client.post(
+            '/posts/', {'title': 'a title', 'image': png()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        post = Post.objects.get()
+        self.assertRegex(post.image.name, r'^remote/photo_[0-9a-f]{32}\.png$')
+        self.assertTrue(response.data['image'].endswith(post.image.url))
+        self.assertFalse([
+            name for name in default_storage.pending()
+            if name.startswith('images/')
+        ])
+
+
+class ImageProbeTests(APITestCase):
+    def encode(self, format, size=(640, 480), **kwargs):
+        buffer = io.BytesIO()
+        Image.new('RGB', size).save(buffer, format, **kwargs)
+        buffer.seek(0)
+        return buffer
+
+    def test_probes_dimensions_from_the_header(self):
+        exif = Image.Exif()
+        exif[0x010E] = 'x' * 5000
+        cases = [
+            ('PNG', {}),
+            ('GIF', {}),
+            ('JPEG', {}),
+            ('JPEG', {'exif': exif.tobytes()}),
+            ('JPEG', {'progressive': True}),
+            ('WEBP', {}),
+            ('WEBP', {'lossless': True}),
+            ('WEBP', {'exif': exif.tobytes()}),
+        ]
+        for format, kwargs in cases:
+            with self.subTest(format=format, **kwargs):
+                self.assertEqual(
+                    probe_image(self.encode(format, **kwargs)),
+                    (format, 640, 480)
+                )
+
+    def test_rejects_files_that_are_not_images(self):
+        self.assertIsNone(probe_image(io.BytesIO(b'not an image at all')))
+        self.assertIsNone(probe_image(io.BytesIO(b'\xff\xd8\xff')))
+
+    def test_oversized_image_is_rejected_from_its_header(self):
+        # a PNG header claiming 5000px wide, with no pixel data behind it
+        header = (
+            b'\x89PNG\r\n\x1a\n' + struct.pack('>I', 13) + b'IHDR'
+            + struct.pack('>IIBBBBB', 5000, 10, 8, 2, 0, 0, 0)
+        )
+        User.objects.create_user(username='adam', password='pass')
+        self.client.login(username='adam', password='pass')
+        response = self.client.post('/posts/', {
+            'title': 'a title',
+            'image': SimpleUploadedFile('big.png', header, 'image/png'),
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('wider', str(response.data['image']))
+
+
+class ImageDerivativeTests(SpooledStorageTestCase):
+    def test_upload_gets_thumbnail_and_webp_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/posts/', {'title': 'a title', 'image': png((800, 600))}
+            )
+        post = Post.objects.get()
+        with Image.open(post.image_thumbnail) as thumbnail:
+            self.assertEqual((thumbnail.format, thumbnail.size),
+                             ('JPEG', (320, 320)))
+        with Image.open(post.image_webp) as webp:
+            self.assertEqual((webp.format, webp.size), ('WEBP', (800, 600)))
+        response = self.client.get('/posts/1/')
+        self.assertRegex(
+            response.data['image_thumbnail_webp'],
+            r'_thumbnail_[0-9a-f]{32}\.webp$'
+        )
+
+    def test_derivatives_are_rendered_from_the_upload(self):
+        # not read back from storage, where the spooled copy may
+        # already have been uploaded and deleted
+        with mock.patch(
+            'drf_api.storage.SpooledStorage._open',
+            side_effect=FileNotFoundError,
+        ), self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/posts/', {'title': 'a title', 'image': png()})
+        self.assertTrue(Post.objects.get().image_thumbnail)
+
+    def test_new_image_clears_the_old_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/posts/', {'title': 'a title', 'image': png()})
+        response = self.client.put(
+            '/posts/1/', {'title': 'a title', 'image': png()}
+        )
+        self.assertIsNone(response.data['image_thumbnail'])
+
+
+class ImageFilterTests(APITestCase):
+    def setUp(self):
+        self.image = Image.radial_gradient('L').convert('RGB').resize((64, 48))
+
+    def test_every_filter_renders(self):
+        for name in FILTERS:
+            with self.subTest(name=name):
+                filtered = apply_filter(self.image, name)
+                self.assertEqual(
+                    (filtered.mode, filtered.size), ('RGB', (64, 48))
+                )
+                same = filtered.tobytes() == self.image.tobytes()
+                self.assertEqual(same, name == 'normal')
+
+    def test_composed_lookup_tables_match_applying_them_in_turn(self):
+        first = step_lut(('contrast', 1.5))
+        then = step_lut(('blend', 'screen', (243, 106, 188), 0.3))
+        self.assertEqual(
+            self.image.point(compose(first, then)).tobytes(),
+            self.image.point(first).point(then).tobytes(),
+        )
+
+    def test_cache_evicts_least_recently_used(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        cache = DiskLRUCache(root, max_bytes=250)
+        for key in ('aa1', 'bb2'):
+            cache.put(key, b'x' * 100)
+            os.utime(cache.path(key), (0, 0))
+        # reading aa1 makes bb2 the least recently used
+        self.assertTrue(cache.get('aa1'))
+        cache.put('cc3', b'x' * 100)
+        self.assertIsNone(cache.get('bb2'))
+        self.assertTrue(cache.get('aa1'))
+        self.assertTrue(cache.get('cc3'))
+
+
+class PostFilteredImageTests(SpooledStorageTestCase):
+    def test_redirects_until_rendered(self):
+        self.client.post('/posts/', {
+            'title': 'a title', 'image': png(), 'image_filter': 'xpro2',
+        })
+        response = self.client.get('/posts/1/image/')
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_render_is_queued_once_while_it_runs(self):
+        with mock.patch('drf_api.images.render_filtered_post') as render:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/posts/', {
+                    'title': 'a title', 'image': png(),
+                    'image_filter': 'xpro2',
+                })
+            self.client.get('/posts/1/image/')
+            queued = render.call_count
+            for _ in range(3):
+                response = self.client.get('/posts/1/image/')
+                self.assertEqual(
+                    response.status_code, status.HTTP_302_FOUND
+                )
+        self.assertEqual(render.call_count, queued)
+
+    def test_serves_the_render_from_the_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/posts/', {
+                'title': 'a title', 'image': png(), 'image_filter': 'xpro2',
+            })
+        url = self.client.get('/posts/1/').data['image_filtered']
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.adam = User.objects.create_user(username='adam', password='pass')
+        token = str(RefreshToken.for_user(self.adam).access_token)
+        self.request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+
+    def authenticate(self):
+        return CachedJWTCookieAuthentication().authenticate(self.request)[0]
+
+    def test_second_request_skips_the_user_query(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            data = CurrentUserSerializer(user).data
+        self.assertEqual(user, self.adam)
+        self.assertEqual(data['profile_id'], self.adam.profile.id)
+
+    def test_each_request_gets_its_own_user(self):
+        self.assertIsNot(self.authenticate(), self.authenticate())
+
+    def test_saving_the_user_evicts_it(self):
+        self.authenticate()
+        self.adam.username = 'adam2'
+        self.adam.save()
+        self.assertEqual(self.authenticate().username, 'adam2')
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.adam.is_active = False
+        self.adam.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class QueryBudgetTests(query_budget.QueryBudgetTestCase):
+    url_modules = [
+        'posts.urls', 'profiles.urls', 'comments.urls', 'likes.urls',
+        'followers.urls',
+    ]
+    # anonymous: count and page, plus one for a filter's lookup row.
+    # logged in: session and user, plus the serializer's like_id
+    # lookup on posts and the follower graph's sync on profiles
+    endpoints = [
+        ('PostList', 'GET', '/posts/', {'anonymous': 2, 'authenticated': 5}),
+        ('PostList', 'GET',
+         '/posts/?owner__followed__owner__profile={self.profile}',
+         {'anonymous': 3, 'authenticated': 6}),
+        ('PostList', 'GET', '/posts/?likes__owner__profile={self.profile}',
+         {'anonymous': 3, 'authenticated': 6}),
+        ('PostList', 'GET', '/posts/?ordering=-likes__created_at',
+         {'anonymous': 2, 'authenticated': 5}),
+        ('PostList', 'GET', '/posts/?ordering=trending',
+         {'anonymous': 2, 'authenticated': 5}),
+        ('PostList', 'GET', '/posts/?search=post',
+         {'anonymous': 2, 'authenticated': 5}),
+        ('PostDetail', 'GET', '/posts/{self.post}/',
+         {'anonymous': 2, 'authenticated': 5}),
+        ('post_filtered_image', 'GET', '/posts/{self.post}/image/',
+         {'anonymous': 1, 'authenticated': 1}),
+        ('PostLike', 'PUT', '/posts/{self.post}/like/', {'authenticated': 7}),
+        ('PostLike', 'DELETE', '/posts/{self.post}/like/',
+         {'authenticated': 6}),
+        ('ProfileList', 'GET', '/profiles/',
+         {'anonymous': 2, 'authenticated': 5}),
+        ('ProfileList', 'GET',
+         '/profiles/?owner__following__followed__profile={self.profile}',
+         {'anonymous': 3, 'authenticated': 6}),
+        ('ProfileList', 'GET', '/profiles/?ordering=-followers_count',
+         {'anonymous': 2, 'authenticated': 5}),
+        # the lookup row, then the follower graph's sync
+        ('ProfileList', 'GET', '/profiles/?mutual_follows_of={self.profile}',
+         {'anonymous': 4, 'authenticated': 7}),
+        ('ProfileDetail', 'GET', '/profiles/{self.profile}/',
+         {'anonymous': 2, 'authenticated': 5}),
+        # each writes a FollowerChange row for the graph too
+        ('ProfileFollow', 'PUT', '/profiles/{self.stranger}/follow/',
+         {'authenticated': 13}),
+        ('ProfileFollow', 'DELETE', '/profiles/{self.stranger}/follow/',
+         {'authenticated': 10}),
+        # the graph's sync for the suggestions, again for following_id
+        ('FollowSuggestions', 'GET', '/profiles/suggestions/',
+         {'authenticated': 5}),
+        ('CommentList', 'GET', '/comments/',
+         {'anonymous': 2, 'authenticated': 4}),
+        ('CommentList', 'GET', '/comments/?post={self.post}',
+         {'anonymous': 3, 'authenticated': 5}),
+        ('CommentDetail', 'GET', '/comments/{self.comment}/',
+         {'anonymous': 2, 'authenticated': 4}),
+        ('LikeList', 'GET', '/likes/', {'anonymous': 2, 'authenticated': 4}),
+        ('LikeDetail', 'GET', '/likes/{self.like}/',
+         {'anonymous': 1, 'authenticated': 3}),
+        ('FollowerList', 'GET', '/followers/',
+         {'anonymous': 2, 'authenticated': 4}),
+        ('FollowerDetail', 'GET', '/followers/{self.follow}/',
+         {'anonymous': 1, 'authenticated': 3}),
+    ]
+
+    def setUp(self):
+        self.adam = User.objects.create_user(username='adam', password='pass')
+        self.profile = self.adam.profile.pk
+        self.post = Post.objects.create(owner=self.adam, title='a post').pk
+        self.eve = User.objects.create_user(username='eve')
+        self.stranger = self.eve.profile.pk
+        self.others = 0
+
+    def grow(self, rows):
+        """
+        up to rows other users, each with a post, a comment and a like
+        on adam's post, liked, commented and followed by adam and
+        following him and eve, whom adam gets suggested
+        """
+        while self.others < rows:
+            self.others += 1
+            user = User.objects.create_user(username=f'user{self.others}')
+            post = Post.objects.create(owner=user, title=f'post {self.others}')
+            Comment.objects.create(owner=user, post_id=self.post, content='hi')
+            self.comment = Comment.objects.create(
+                owner=self.adam, post=post, content='hello'
+            ).pk
+            Like.objects.create(owner=user, post_id=self.post)
+            self.like = Like.objects.create(owner=self.adam, post=post).pk
+            self.follow = Follower.objects.create(
+                owner=self.adam, followed=user
+            ).pk
+            Follower.objects.create(owner=user, followed=self.adam)
+            Follower.objects.create(owner=user, followed=self.eve)
+        # built up front, the requests only replay the new follows
+        follower_graph()
+
+
+class ServerTimingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        Post.objects.create(owner=adam, title='a title')
+
+    def timings(self, response):
+        return {
+            metric.split(';')[0]: metric
+            for metric in response['Server-Timing'].split(', ')
+        }
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_sampled_requests_report_phases(self):
+        self.client.login(username='adam', password='pass')
+        with self.assertLogs('drf_api.timing', 'INFO') as logs, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/posts/')
+        timings = self.timings(response)
+        self.assertEqual(
+            set(timings), {'db', 'auth', 'view', 'serialize', 'total'}
+        )
+        self.assertIn(f'desc="{len(queries)} queries"', timings['db'])
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'PostList')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['queries'], len(queries))
+        self.assertLessEqual(line['view_ms'], line['total_ms'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_model_serializer_time_is_reported(self):
+        response = self.client.get('/posts/1/')
+        self.assertIn('serialize', self.timings(response))
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_requests_have_no_header(self):
+        response = self.client.get('/posts/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class MetricsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(METRICS_DIR=self.root, METRICS_TOKEN=None)
+        override.enable()
+        self.addCleanup(override.disable)
+        adam = User.objects.create_user(
+            username='adam', password='pass', is_staff=True
+        )
+        Post.objects.create(owner=adam, title='a title')
+
+    def scrape(self):
+        self.client.login(username='adam', password='pass')
+        response = self.client.get('/metrics/')
+        self.client.logout()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode().splitlines()
+
+    def test_requests_are_observed_by_view(self):
+        self.client.get('/posts/')
+        self.client.get('/posts/')
+        lines = self.scrape()
+        self.assertIn(
+            'http_request_duration_seconds_bucket{method="GET",'
+            'status="200",view="PostList",le="+Inf"} 2', lines
+        )
+        self.assertIn(
+            'http_request_queries_count{method="GET",view="PostList"} 2',
+            lines
+        )
+        self.assertIn(
+            'cache_requests_total{cache="anonymous",result="hit"} 1', lines
+        )
+        self.assertIn('cache_hit_ratio{cache="anonymous"} 0.5', lines)
+
+    def test_files_of_every_process_are_summed(self):
+        key = metrics.registry.key(metrics.AUTHENTICATIONS, (
+            ('outcome', 'failed'),
+        ))
+        metrics.ValueFile(os.path.join(self.root, '1.db')).add(key, 3)
+        metrics.registry.inc(metrics.AUTHENTICATIONS, (
+            ('outcome', 'failed'),
+        ))
+        self.assertEqual(metrics.collect()[key], 4)
+
+    def test_authentication_outcomes_are_counted(self):
+        token = str(RefreshToken.for_user(User.objects.get()).access_token)
+        factory = APIRequestFactory()
+        authentication = CachedJWTCookieAuthentication()
+        authentication.authenticate(
+            factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        )
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate(
+                factory.get('/', HTTP_AUTHORIZATION='Bearer nonsense')
+            )
+        lines = self.scrape()
+        self.assertIn('authentications_total{outcome="authenticated"} 1', lines)
+        self.assertIn('authentications_total{outcome="failed"} 1', lines)
+
+    def test_nothing_is_recorded_without_a_directory(self):
+        with override_settings(METRICS_DIR=None):
+            self.client.get('/posts/')
+            self.assertEqual(metrics.collect(), {})
+        self.assertEqual(os.listdir(self.root), [])
+
+    def test_scrapes_need_the_token_when_one_is_set(self):
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(
+                self.client.get('/metrics/').status_code,
+                status.HTTP_403_FORBIDDEN
+            )
+            self.assertEqual(
+                self.client.get(
+                    '/metrics/', HTTP_AUTHORIZATION='Bearer s3cre'
+                ).status_code,
+                status.HTTP_403_FORBIDDEN
+            )
+            response = self.client.get(
+                '/metrics/', HTTP_AUTHORIZATION='Bearer s3cret'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            response['Content-Type'].startswith('text/plain; version=0.0.4')
+        )
@@ -0,0 +1,137 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# the Timings of the request being handled, None if it isn't sampled
+current = ContextVar('request_timings', default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.phases = {'db': 0.0}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        connection.execute_wrapper, counts and times every query
+        """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.phases['db'] += time.perf_counter() - start
+
+    def header(self, total):
+        metrics = [f'db;dur={self.phases["db"] * 1000:.1f};'
+                   f'desc="{self.queries} queries"']
+        metrics += [
+            f'{phase};dur={seconds * 1000:.1f}'
+            for phase, seconds in self.phases.items() if phase != 'db'
+        ]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def timed(phase):
+    """
+    adds the time spent in the block to the request's phase,
+    does nothing for requests that aren't sampled
+    """
+    timings = current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def timed_method(phase, method):
+    def wrapper(*args, **kwargs):
+        with timed(phase):
+            return method(*args, **kwargs)
+    return wrapper
+
+
+class ServerTimingMiddleware:
+    """
+    For a REQUEST_TIMING_SAMPLE_RATE share of requests, counts and
+    times the queries and adds the time spent in authentication,
+    the view and serialization (see ServerTimingMixin), then reports
+    them in a Server-Timing header and one JSON log line on the
+    drf_api.timing logger. Phases overlap: db includes the queries
+    made while authenticating or serializing.
+    Unsampled requests only cost the coin toss.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.REQUEST_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timings = Timings()
+        token = current.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        total = time.perf_counter() - timings.started
+
+        response['Server-Timing'] = timings.header(total)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request, 'timing_view', None),
+            'status': response.status_code,
+            'queries': timings.queries,
+            **{
+                f'{phase}_ms': round(seconds * 1000, 2)
+                for phase, seconds in timings.phases.items()
+            },
+            'total_ms': round(total * 1000, 2),
+        }))
+        return response
+
+
+class ServerTimingMixin:
+    """
+    Times the phases of a DRF view for ServerTimingMiddleware:
+    auth (authentication, permissions and throttling), view (the
+    whole dispatch) and serialize (rendering instances to data,
+    including the lazy queries that makes)
+    """
+    def dispatch(self, request, *args, **kwargs):
+        request.timing_view = type(self).__name__
+        with timed('view'):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        with timed('auth'):
+            super().initial(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if current.get() is not None:
+            serializer.to_representation = timed_method(
+                'serialize', serializer.to_representation
+            )
+        return serializer
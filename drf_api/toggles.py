@@ -0,0 +1,76 @@
+from django.db import transaction
+from rest_framework import serializers
+from followers.models import Follower
+from likes.models import Like
+from posts.models import Post
+from profiles.models import Profile
+from .upsert import insert_ignore
+
+MAX_TOGGLES = 100
+
+
+class ToggleSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(
+        choices=['like', 'unlike', 'follow', 'unfollow']
+    )
+    post = serializers.PrimaryKeyRelatedField(
+        queryset=Post.objects.all(), required=False
+    )
+    profile = serializers.PrimaryKeyRelatedField(
+        queryset=Profile.objects.all(), required=False
+    )
+
+    def validate(self, data):
+        target = 'post' if data['op'] in ('like', 'unlike') else 'profile'
+        if target not in data:
+            raise serializers.ValidationError({
+                target: f"required for '{data['op']}'"
+            })
+        return data
+
+
+def like(user, post):
+    return insert_ignore(Like, owner=user, post=post)
+
+
+def unlike(user, post):
+    deleted, _ = Like.objects.filter(owner=user, post=post).delete()
+    return None, bool(deleted)
+
+
+def follow(user, profile):
+    return insert_ignore(Follower, owner=user, followed_id=profile.owner_id)
+
+
+def unfollow(user, profile):
+    deleted, _ = Follower.objects.filter(
+        owner=user, followed_id=profile.owner_id
+    ).delete()
+    return None, bool(deleted)
+
+
+OPERATIONS = {
+    'like': (like, 'post'),
+    'unlike': (unlike, 'post'),
+    'follow': (follow, 'profile'),
+    'unfollow': (unfollow, 'profile'),
+}
+
+
+def apply_toggles(user, toggles):
+    """
+    applies validated ToggleSerializer data in order, all or nothing.
+    'changed' is False where the op was already in effect
+    """
+    results = []
+    with transaction.atomic():
+        for toggle in toggles:
+            func, target = OPERATIONS[toggle['op']]
+            instance, changed = func(user, toggle[target])
+            results.append({
+                'op': toggle['op'],
+                target: toggle[target].pk,
+                'id': instance.pk if instance else None,
+                'changed': changed,
+            })
+    return results
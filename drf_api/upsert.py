@@ -0,0 +1,45 @@
+from django.db import connections, router
+from django.db.models.signals import post_save
+
+
+def insert_ignore(model, **values):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for one row, then reads it back.
+    Returns (instance, created) like get_or_create, but a duplicate
+    costs neither an IntegrityError nor a rollback.
+    post_save is sent for new rows so the counter, cache and feed
+    signals still run, pre_save and model.save() are not.
+    """
+    using = router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    instance = model(**values)
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    params = [
+        # pre_save fills in auto_now_add
+        field.get_db_prep_save(field.pre_save(instance, True), connection)
+        for field in fields
+    ]
+    columns = ', '.join(qn(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    if connection.vendor == 'mysql':
+        sql = 'INSERT IGNORE INTO {} ({}) VALUES ({})'
+    else:
+        sql = 'INSERT INTO {} ({}) VALUES ({}) ON CONFLICT DO NOTHING'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            sql.format(qn(model._meta.db_table), columns, placeholders),
+            params,
+        )
+        created = cursor.rowcount == 1
+
+    instance = model._default_manager.using(using).get(**values)
+    if created:
+        post_save.send(
+            sender=model, instance=instance, created=True,
+            update_fields=None, raw=False, using=using,
+        )
+    return instance, created
@@ -13,14 +13,24 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
+from .metrics import metrics_view
 from .views import root_route
-from .views import root_route, logout_route
+from .views import (
+    root_route, logout_route, cache_stats_route, toggles_route,
+    upload_stats_route,
+)
 
 urlpatterns = [
     path('', root_route),
     path('admin/', admin.site.urls),
+    path('cache-stats/', cache_stats_route),
+    path('upload-stats/', upload_stats_route),
+    path('metrics/', metrics_view),
+    path('toggles/', toggles_route),
     path('api-auth/', include('rest_framework.urls')),
     path('dj-rest-auth/logout/', logout_route),
     path('dj-rest-auth/', include('dj_rest_auth.urls')),
@@ -30,4 +40,12 @@ urlpatterns = [
     path('', include('comments.urls')),
     path('', include('likes.urls')),
     path('', include('followers.urls')),
+    path('', include('feed.urls')),
 ]
+
+# uploads waiting for the background upload to finish. static() only
+# adds the route in DEBUG, in production UPLOAD_SPOOL_ROOT has to be
+# served by the web server in front of the app
+urlpatterns += static(
+    settings.UPLOAD_SPOOL_URL, document_root=settings.UPLOAD_SPOOL_ROOT
+)
@@ -1,5 +1,10 @@
-from rest_framework.decorators import api_view
+from django.core.files.storage import default_storage
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from .cache import cache_stats
+from .storage import upload_stats
+from .toggles import MAX_TOGGLES, ToggleSerializer, apply_toggles
 from .settings import (
         JWT_AUTH_COOKIE,
         JWT_AUTH_REFRESH_COOKIE,
@@ -15,6 +20,36 @@ def root_route(request):
     })
 
 
+@api_view()
+@permission_classes([IsAdminUser])
+def cache_stats_route(request):
+    return Response(cache_stats())
+
+
+@api_view()
+@permission_classes([IsAdminUser])
+def upload_stats_route(request):
+    return Response(upload_stats(default_storage))
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def toggles_route(request):
+    """
+    applies a list of {"op": "like"/"unlike", "post": id} and
+    {"op": "follow"/"unfollow", "profile": id} in one transaction
+    """
+    # before validating, which costs a query per operation
+    if isinstance(request.data, list) and len(request.data) > MAX_TOGGLES:
+        return Response(
+            {'detail': f'at most {MAX_TOGGLES} operations per request'},
+            status=400,
+        )
+    serializer = ToggleSerializer(data=request.data, many=True)
+    serializer.is_valid(raise_exception=True)
+    return Response(apply_toggles(request.user, serializer.validated_data))
+
+
 @api_view(['POST'])
 def logout_route(request):
     response = Response()
@@ -0,0 +1,88 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from followers.models import Follower
+from posts.models import Post
+from profiles.models import Profile
+from feed.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    """
+    Times the home feed against the author's follower count:
+    the cost of one post fanning out, and reading the first feed page
+    for one follower via the old join filter and via the timeline.
+    Everything is seeded inside a transaction that is rolled back,
+    so it is safe to point at a dev database.
+    """
+    help = 'Benchmark the materialised feed against follower count'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers', type=int, nargs='+',
+            default=[10, 100, 1000, 10000],
+        )
+        parser.add_argument('--posts', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write('followers  fan-out ms  join read ms  feed read ms')
+        for followers in options['followers']:
+            with transaction.atomic():
+                row = self.run(followers, options['posts'], options['repeat'])
+                self.stdout.write(
+                    f'{followers:>9}  {row[0]:>10.2f}  {row[1]:>12.2f}  '
+                    f'{row[2]:>12.2f}'
+                )
+                transaction.set_rollback(True)
+
+    def run(self, followers, posts, repeat):
+        author = User.objects.create_user(username='benchmark-author')
+        User.objects.bulk_create(
+            User(username=f'benchmark-{i}', password='!')
+            for i in range(followers)
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith='benchmark-')
+            .exclude(pk=author.pk).values_list('id', flat=True)
+        )
+        Profile.objects.bulk_create(
+            Profile(owner_id=user_id) for user_id in user_ids
+        )
+        Follower.objects.bulk_create(
+            Follower(owner_id=user_id, followed=author)
+            for user_id in user_ids
+        )
+        Profile.objects.filter(owner=author).update(followers_count=followers)
+        reader = User.objects.get(pk=user_ids[0])
+
+        # fan out to everyone, whatever the configured limit
+        with override_settings(FEED_FANOUT_LIMIT=followers):
+            start = time.perf_counter()
+            for i in range(posts):
+                Post.objects.create(owner=author, title=f'post {i}')
+            fan_out = (time.perf_counter() - start) / posts
+
+        join_read = Post.objects.filter(
+            owner__followed__owner__profile=reader.profile
+        ).order_by('-created_at')[:10]
+        feed_read = Post.objects.filter(
+            pk__in=TimelineEntry.objects.filter(owner=reader).order_by(
+                '-created_at', '-post_id'
+            ).values('post')[:11]
+        ).order_by('-created_at')[:10]
+        return (
+            fan_out * 1000,
+            self.best_of(join_read, repeat) * 1000,
+            self.best_of(feed_read, repeat) * 1000,
+        )
+
+    def best_of(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from followers.models import Follower
+from posts.models import Post
+from feed.models import TimelineEntry, trim_timelines
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds every materialised timeline from the followers table.
+    Run it once after the feed app is first migrated,
+    and again if FEED_FANOUT_LIMIT or FEED_BACKFILL_SIZE change.
+    """
+    help = 'Rebuild the fan-out-on-write home timelines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        follows = Follower.objects.filter(
+            followed__profile__followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).values_list('owner_id', 'followed_id')
+
+        created = 0
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            for owner_id, followed_id in follows.iterator():
+                posts = Post.objects.filter(
+                    owner=followed_id
+                ).order_by('-created_at').values_list(
+                    'id', 'created_at'
+                )[:settings.FEED_BACKFILL_SIZE]
+                entries = TimelineEntry.objects.bulk_create(
+                    (TimelineEntry(
+                        owner_id=owner_id, post_id=post_id,
+                        created_at=created_at,
+                    ) for post_id, created_at in posts),
+                    batch_size=options['batch_size'],
+                )
+                created += len(entries)
+            created -= trim_timelines()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'created {created} timeline entries')
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from feed.models import trim_timelines
+
+
+class Command(BaseCommand):
+    """
+    Deletes the timeline entries past the newest FEED_TIMELINE_SIZE of
+    each timeline. Fan-out only ever adds entries, schedule this e.g.
+    daily with cron or Heroku Scheduler to keep timelines bounded.
+    """
+    help = 'Trim the home timelines to FEED_TIMELINE_SIZE entries'
+
+    def handle(self, *args, **options):
+        deleted = trim_timelines()
+        self.stdout.write(
+            self.style.SUCCESS(f'deleted {deleted} timeline entries')
+        )
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db import models
+from django.db.models import OuterRef, Subquery, UniqueConstraint
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from followers.models import Follower
+from posts.models import Post
+from profiles.models import Profile
+
+
+class TimelineEntry(models.Model):
+    """
+    TimelineEntry model, one row per post in a user's home feed.
+    'owner' is the User whose feed it is, 'post' a post by someone they follow.
+    Rows are written when the post is created (fan-out-on-write),
+    posts by accounts over FEED_FANOUT_LIMIT followers are read
+    straight from the posts table instead (fan-out-on-read).
+    'created_at' is the post's, copied so a page of the feed is a range
+    read of the (owner, -created_at, -post) index. Timelines are trimmed
+    to FEED_TIMELINE_SIZE entries, see trim_timelines.
+    """
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name='timeline_entries'
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['owner', '-created_at', '-post'],
+                name='timeline_owner_created_at_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} {self.post}"
+
+
+def fans_out_on_write(user_id):
+    """
+    small accounts push posts into their followers' timelines,
+    large ones are merged in at read time
+    """
+    followers_count = Profile.objects.filter(owner=user_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    return (followers_count or 0) <= settings.FEED_FANOUT_LIMIT
+
+
+def fan_out_post(sender, instance, created, **kwargs):
+    if created and fans_out_on_write(instance.owner_id):
+        follower_ids = Follower.objects.filter(
+            followed=instance.owner_id
+        ).values_list('owner_id', flat=True)
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(
+                owner_id=follower_id, post=instance,
+                created_at=instance.created_at,
+            ) for follower_id in follower_ids),
+            ignore_conflicts=True,
+        )
+
+
+def backfill_timeline(sender, instance, created, **kwargs):
+    """
+    copies the followed user's recent posts into the new follower's
+    timeline so the feed isn't empty until they post again
+    """
+    if created and fans_out_on_write(instance.followed_id):
+        posts = list(Post.objects.filter(
+            owner=instance.followed_id
+        ).order_by('-created_at').values_list(
+            'id', 'created_at'
+        )[:settings.FEED_BACKFILL_SIZE])
+        if posts:
+            TimelineEntry.objects.bulk_create(
+                (TimelineEntry(
+                    owner_id=instance.owner_id, post_id=post_id,
+                    created_at=created_at,
+                ) for post_id, created_at in posts),
+                ignore_conflicts=True,
+            )
+            trim_timelines([instance.owner_id])
+
+
+def trim_timelines(owner_ids=None):
+    """
+    deletes the entries past the newest FEED_TIMELINE_SIZE of every
+    timeline, or of the owner_ids' timelines. Fan-out doesn't trim,
+    the trim_timelines command does that on a schedule
+    """
+    # the oldest entry kept
+    oldest = TimelineEntry.objects.filter(
+        owner=OuterRef('owner')
+    ).order_by('-created_at', '-post_id').values('created_at')[
+        settings.FEED_TIMELINE_SIZE - 1:settings.FEED_TIMELINE_SIZE
+    ]
+    entries = TimelineEntry.objects.filter(created_at__lt=Subquery(oldest))
+    if owner_ids is not None:
+        entries = entries.filter(owner__in=owner_ids)
+    return entries.delete()[0]
+
+
+def prune_timeline(sender, instance, **kwargs):
+    TimelineEntry.objects.filter(
+        owner=instance.owner_id, post__owner=instance.followed_id
+    ).delete()
+
+
+post_save.connect(fan_out_post, sender=Post)
+post_save.connect(backfill_timeline, sender=Follower)
+post_delete.connect(prune_timeline, sender=Follower)
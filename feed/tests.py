@@ -0,0 +1,94 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from followers.models import Follower
+from posts.models import Post
+from .models import TimelineEntry, trim_timelines
+
+
+class FeedViewTests(APITestCase):
+    def setUp(self):
+        adam = User.objects.create_user(username='adam', password='pass')
+        anna = User.objects.create_user(username='anna', password='pass')
+        Follower.objects.create(owner=adam, followed=anna)
+
+    def test_user_not_logged_in_cant_see_feed(self):
+        response = self.client.get('/feed/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_new_post_fans_out_to_followers(self):
+        anna = User.objects.get(username='anna')
+        Post.objects.create(owner=anna, title='hello followers')
+        self.client.login(username='adam', password='pass')
+        response = self.client.get('/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['results'][0]['title'], 'hello followers'
+        )
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        adam = User.objects.get(username='adam')
+        bob = User.objects.create_user(username='bob')
+        Post.objects.create(owner=bob, title='older post')
+        follow = Follower.objects.create(owner=adam, followed=bob)
+        self.assertTrue(
+            TimelineEntry.objects.filter(owner=adam, post__owner=bob).exists()
+        )
+        follow.delete()
+        self.assertFalse(
+            TimelineEntry.objects.filter(owner=adam, post__owner=bob).exists()
+        )
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_large_accounts_are_merged_on_read(self):
+        anna = User.objects.get(username='anna')
+        Post.objects.create(owner=anna, title='too popular to fan out')
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.client.login(username='adam', password='pass')
+        response = self.client.get('/feed/')
+        self.assertEqual(
+            response.data['results'][0]['title'], 'too popular to fan out'
+        )
+
+    def test_pages_merge_timeline_and_large_accounts(self):
+        adam = User.objects.get(username='adam')
+        anna = User.objects.get(username='anna')
+        star = User.objects.create_user(username='star')
+        Follower.objects.create(owner=adam, followed=star)
+        for i in range(12):
+            Post.objects.create(owner=anna, title=f'anna {i}')
+            with override_settings(FEED_FANOUT_LIMIT=0):
+                Post.objects.create(owner=star, title=f'star {i}')
+        expected = list(Post.objects.order_by(
+            '-created_at', '-id'
+        ).values_list('title', flat=True))
+        self.client.login(username='adam', password='pass')
+        with override_settings(FEED_FANOUT_LIMIT=0):
+            titles, url = [], '/feed/'
+            while url:
+                response = self.client.get(url)
+                titles += [post['title'] for post in response.data['results']]
+                url = response.data['next']
+            self.assertEqual(titles, expected)
+            response = self.client.get(response.data['previous'])
+        self.assertEqual(
+            [post['title'] for post in response.data['results']],
+            expected[10:20]
+        )
+
+    @override_settings(FEED_TIMELINE_SIZE=3)
+    def test_timelines_are_trimmed_to_the_newest_entries(self):
+        adam = User.objects.get(username='adam')
+        anna = User.objects.get(username='anna')
+        posts = [
+            Post.objects.create(owner=anna, title=f'post {i}')
+            for i in range(5)
+        ]
+        self.assertEqual(trim_timelines(), 2)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(owner=adam).order_by(
+                '-created_at'
+            ).values_list('post', flat=True)),
+            [post.id for post in reversed(posts[2:])]
+        )
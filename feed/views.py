@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db.models import Q
+from rest_framework import generics, permissions
+from drf_api.eager import EagerLoadingMixin
+from drf_api.pagination import CreatedAtCursorPagination
+from drf_api.sparse import SparseFieldsMixin
+from drf_api.timing import ServerTimingMixin
+from followers.models import Follower
+from posts.models import Post
+from posts.serializers import PostSerializer
+from .models import TimelineEntry
+
+
+class Feed(
+    ServerTimingMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.ListAPIView,
+):
+    """
+    List posts by the users the logged in user follows, newest first.
+    Small accounts' posts come from the materialised timeline,
+    accounts over FEED_FANOUT_LIMIT followers are merged in on read.
+    Both are read from the cursor's position and no further than
+    the page can reach, so deep pages cost the same as the first.
+    """
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    queryset = Post.objects.all()
+
+    def filter_queryset(self, queryset):
+        # here rather than in get_queryset, which EagerLoadingMixin
+        # and SparseFieldsMixin wrap
+        user = self.request.user
+        descending, bound, rows = self.paginator.window(
+            self.request, queryset, self
+        )
+        order = '-' if descending else ''
+        timeline = TimelineEntry.objects.filter(owner=user, **bound).order_by(
+            f'{order}created_at', f'{order}post_id'
+        ).values('post')[:rows]
+        large_accounts = Follower.objects.filter(
+            owner=user,
+            followed__profile__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values('followed')
+        merged = Post.objects.filter(
+            owner__in=large_accounts, **bound
+        ).order_by(f'{order}created_at', f'{order}id').values('pk')[:rows]
+        return queryset.filter(
+            Q(pk__in=timeline) | Q(pk__in=merged)
+        ).order_by('-created_at')
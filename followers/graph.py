@@ -0,0 +1,401 @@
+import heapq
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import accumulate
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from profiles.models import Profile
+from .models import Follower, FollowerChange
+
+logger = logging.getLogger(__name__)
+
+# user ids as 4-byte ints, Follower ids and offsets as 8-byte ints
+USER_IDS = 'i'
+FOLLOW_IDS = 'q'
+OFFSETS = 'q'
+NOWHERE = (array(USER_IDS), array(FOLLOW_IDS), 0, 0)
+
+
+def find(ids, user_id, lo, hi):
+    """
+    the position of user_id in sorted ids[lo:hi], or None
+    """
+    position = bisect_left(ids, user_id, lo, hi)
+    if position < hi and ids[position] == user_id:
+        return position
+    return None
+
+
+class FollowerGraph:
+    """
+    Who follows whom, held in memory as compressed sparse rows: the
+    sorted ids of the users each user follows and of their followers,
+    in one array per direction, plus the Follower ids of the follows,
+    so is-following, mutual follows and friends of friends are binary
+    searches and merges instead of joins.
+    The rows are never written to once loaded. A user whose follows
+    change gets new arrays of their own, copied out of the rows with
+    the change made, that replace the old ones in one assignment, so
+    readers never see an array halfway through a change.
+    """
+    def __init__(self):
+        # the users user u follows are
+        #     following[following_at[u]:following_at[u + 1]]
+        # with the Follower ids at the same positions in follow_ids,
+        # and their followers likewise in followers
+        self.following_at = array(OFFSETS, [0])
+        self.following = array(USER_IDS)
+        self.follow_ids = array(FOLLOW_IDS)
+        self.followers_at = array(OFFSETS, [0])
+        self.followers = array(USER_IDS)
+        # user id -> (following, follow_ids) and user id -> followers
+        # of the users changed since the build
+        self.changed_following = {}
+        self.changed_followers = {}
+        self.edges = 0
+        self.built_at = None
+        # (id, created_at) of the last FollowerChange applied
+        self.last_change = None
+
+    def load(self, rows):
+        """
+        fills the graph with (owner, followed, Follower id) rows,
+        sorted by owner then followed
+        """
+        following_at = array(OFFSETS, [0])
+        following = array(USER_IDS)
+        follow_ids = array(FOLLOW_IDS)
+        for owner, followed, follow_id in rows:
+            while len(following_at) <= owner:
+                following_at.append(len(following))
+            following.append(followed)
+            follow_ids.append(follow_id)
+        following_at.append(len(following))
+
+        # the other direction by counting sort, owners are visited in
+        # order so each user's followers come out sorted
+        users = max(len(following_at) - 1, max(following, default=0) + 1)
+        counts = array(OFFSETS, bytes(8 * (users + 1)))
+        for followed in following:
+            counts[followed + 1] += 1
+        followers_at = array(OFFSETS, accumulate(counts))
+        followers = array(USER_IDS, bytes(4 * len(following)))
+        cursor = array(OFFSETS, followers_at)
+        for owner in range(len(following_at) - 1):
+            for position in range(following_at[owner], following_at[owner + 1]):
+                followed = following[position]
+                followers[cursor[followed]] = owner
+                cursor[followed] += 1
+
+        self.following_at = following_at
+        self.following = following
+        self.follow_ids = follow_ids
+        self.followers_at = followers_at
+        self.followers = followers
+        self.edges = len(following)
+        self.built_at = time.monotonic()
+
+    def build(self):
+        """
+        loads the graph from the followers table
+        """
+        last_change = FollowerChange.objects.order_by('-id').values_list(
+            'id', 'created_at'
+        ).first()
+        # follows made while this runs are replayed after it
+        self.load(Follower.objects.order_by('owner', 'followed').values_list(
+            'owner', 'followed', 'id'
+        ).iterator(chunk_size=10000))
+        self.last_change = last_change
+        # processes further behind than this rebuild on their own,
+        # the newest change stays for them to check against
+        stale = FollowerChange.objects.filter(
+            created_at__lt=timezone.now() - timedelta(
+                seconds=2 * settings.FOLLOWER_GRAPH_TTL
+            )
+        )
+        if last_change is not None:
+            stale.filter(id__lt=last_change[0]).delete()
+        return self
+
+    def replay(self):
+        """
+        applies the FollowerChange log from where the graph left off,
+        one indexed query that also checks the last change it applied
+        is still there. Returns False if the graph needs a rebuild:
+        that change was rolled back, the log was pruned past it, or
+        the followers table was reset
+        """
+        changes = FollowerChange.objects.order_by('id').values_list(
+            'id', 'created_at', 'op', 'owner', 'followed', 'follower'
+        )
+        current = True
+        if self.last_change is None:
+            changes = list(changes)
+        else:
+            changes = list(changes.filter(id__gte=self.last_change[0]))
+            if changes and changes[0][:2] == self.last_change:
+                changes = changes[1:]
+            else:
+                current = False
+        # the later changes are applied all the same, so a follow made
+        # in this request shows while the rebuild runs
+        for change_id, created_at, op, owner, followed, follow_id in changes:
+            if op == FollowerChange.RESET:
+                current = False
+            elif op == FollowerChange.FOLLOW:
+                self.add(owner, followed, follow_id)
+            else:
+                self.remove(owner, followed)
+            self.last_change = (change_id, created_at)
+        return current
+
+    def out_range(self, user_id):
+        """
+        (user ids, Follower ids, start, end) of the users user_id follows
+        """
+        changed = self.changed_following.get(user_id)
+        if changed is not None:
+            return (*changed, 0, len(changed[0]))
+        if 0 <= user_id < len(self.following_at) - 1:
+            return (self.following, self.follow_ids,
+                    self.following_at[user_id],
+                    self.following_at[user_id + 1])
+        return NOWHERE
+
+    def in_range(self, user_id):
+        """
+        (user ids, start, end) of user_id's followers
+        """
+        changed = self.changed_followers.get(user_id)
+        if changed is not None:
+            return changed, 0, len(changed)
+        if 0 <= user_id < len(self.followers_at) - 1:
+            return (self.followers, self.followers_at[user_id],
+                    self.followers_at[user_id + 1])
+        return NOWHERE[0], 0, 0
+
+    def add(self, owner, followed, follow_id):
+        users, ids, start, end = self.out_range(owner)
+        position = bisect_left(users, followed, start, end)
+        found = position < end and users[position] == followed
+        if found and ids[position] == follow_id:
+            return
+        users, ids = users[start:end], ids[start:end]
+        position -= start
+        if found:
+            ids[position] = follow_id
+            self.changed_following[owner] = (users, ids)
+            return
+        users.insert(position, followed)
+        ids.insert(position, follow_id)
+        incoming = self.followers_of(followed)
+        incoming.insert(bisect_left(incoming, owner), owner)
+        self.changed_following[owner] = (users, ids)
+        self.changed_followers[followed] = incoming
+        self.edges += 1
+
+    def remove(self, owner, followed):
+        users, ids, start, end = self.out_range(owner)
+        position = find(users, followed, start, end)
+        if position is None:
+            return
+        users, ids = users[start:end], ids[start:end]
+        del users[position - start]
+        del ids[position - start]
+        incoming = self.followers_of(followed)
+        del incoming[find(incoming, owner, 0, len(incoming))]
+        self.changed_following[owner] = (users, ids)
+        self.changed_followers[followed] = incoming
+        self.edges -= 1
+
+    def follow_id(self, owner, followed):
+        """
+        the id of owner's Follower row for followed, or None
+        """
+        users, ids, start, end = self.out_range(owner)
+        position = find(users, followed, start, end)
+        return None if position is None else ids[position]
+
+    def follow_ids_of(self, owner, user_ids):
+        """
+        {followed user id: Follower id} for those of user_ids owner follows
+        """
+        users, ids, start, end = self.out_range(owner)
+        found = {}
+        for user_id in user_ids:
+            position = find(users, user_id, start, end)
+            if position is not None:
+                found[user_id] = ids[position]
+        return found
+
+    def following_of(self, user_id):
+        users, _, start, end = self.out_range(user_id)
+        return users[start:end]
+
+    def followers_of(self, user_id):
+        users, start, end = self.in_range(user_id)
+        return users[start:end]
+
+    def mutuals(self, user_id):
+        """
+        the users who user_id follows and who follow them back, a merge
+        of the two sorted arrays
+        """
+        out, incoming = self.following_of(user_id), self.followers_of(user_id)
+        found = []
+        i = j = 0
+        while i < len(out) and j < len(incoming):
+            if out[i] == incoming[j]:
+                found.append(out[i])
+                i += 1
+                j += 1
+            elif out[i] < incoming[j]:
+                i += 1
+            else:
+                j += 1
+        return found
+
+    def suggestions(self, user_id, size, fanout):
+        """
+        [(user id, follows in common)] of the users followed most by
+        the ones user_id follows, that user_id doesn't follow yet.
+        Only the fanout most recent follows are counted from, so big
+        accounts cost the same as any other.
+        """
+        users, ids, start, end = self.out_range(user_id)
+        recent = heapq.nlargest(
+            fanout, zip(ids[start:end], users[start:end])
+        )
+        counts = Counter()
+        for _, followed in recent:
+            counts.update(self.following_of(followed))
+        counts.pop(user_id, None)
+        for followed in users[start:end]:
+            counts.pop(followed, None)
+        return heapq.nsmallest(
+            size, counts.items(), key=lambda item: (-item[1], item[0])
+        )
+
+
+class CurrentFollowerGraph:
+    """
+    This process's FollowerGraph, built from the followers table on
+    first use and kept up to date by replaying the FollowerChange log
+    on every sync(), so a rolled back follow or a reset asks for a
+    rebuild. It is rebuilt anyway every FOLLOWER_GRAPH_TTL seconds, as
+    a backstop for log rows that committed out of id order.
+    Rebuilds run in a background thread, or inline with
+    FOLLOWER_GRAPH_BACKGROUND = False. The new graph is caught up with
+    the log and swapped in under the lock, requests keep reading the
+    old one until then. Only the first build, with no graph to read
+    yet, is waited on.
+    With gunicorn --preload, build it before the workers fork so they
+    share the arrays' memory.
+    """
+    def __init__(self):
+        # held to replay the log and to swap graphs, never to build one
+        self.lock = threading.Lock()
+        # one build at a time
+        self.build_lock = threading.Lock()
+        self.builder = None
+        self.graph = None
+
+    def sync(self):
+        graph = self.graph
+        if graph is None:
+            self.rebuild(wait=True)
+        elif time.monotonic() - graph.built_at > settings.FOLLOWER_GRAPH_TTL:
+            self.rebuild()
+        with self.lock:
+            current = self.graph.replay()
+        if not current:
+            self.rebuild()
+        return self.graph
+
+    def rebuild(self, wait=False):
+        with self.build_lock:
+            if self.builder is not None and self.builder.is_alive():
+                builder = self.builder
+            elif wait or not settings.FOLLOWER_GRAPH_BACKGROUND:
+                self.swap_in_new_graph()
+                return
+            else:
+                builder = self.builder = threading.Thread(
+                    target=self.build_in_background,
+                    name='follower-graph',
+                    daemon=True,
+                )
+                builder.start()
+        if wait:
+            builder.join()
+
+    def swap_in_new_graph(self):
+        graph = FollowerGraph().build()
+        with self.lock:
+            graph.replay()
+            self.graph = graph
+
+    def build_in_background(self):
+        try:
+            self.swap_in_new_graph()
+        except Exception:
+            logger.exception('rebuilding the follower graph failed')
+        finally:
+            connection.close()
+
+
+current = CurrentFollowerGraph()
+
+
+def follower_graph():
+    """
+    this process's FollowerGraph, brought up to date
+    """
+    return current.sync()
+
+
+def reset_follower_graph():
+    """
+    for writes to the followers table that skipped the signal
+    handlers, makes every process rebuild its graph
+    """
+    FollowerChange.objects.create(op=FollowerChange.RESET)
+
+
+class MutualFollowFilter(filters.BaseFilterBackend):
+    """
+    ?mutual_follows_of=<profile id> keeps the profiles whose owners
+    follow that profile's owner and are followed back, from the
+    follower graph instead of a self join of the followers table.
+    Past MUTUAL_FOLLOWS_IN_LIMIT mutual follows the ids would make an
+    IN list too long to send and plan, those users get the join
+    """
+    query_param = 'mutual_follows_of'
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.query_param)
+        if not value:
+            return queryset
+        owner_id = Profile.objects.filter(
+            pk=int(value) if value.isdigit() else None
+        ).values_list('owner_id', flat=True).first()
+        if owner_id is None:
+            raise ValidationError({
+                self.query_param: ['Select a valid profile.']
+            })
+        mutuals = follower_graph().mutuals(owner_id)
+        if len(mutuals) > settings.MUTUAL_FOLLOWS_IN_LIMIT:
+            return queryset.filter(
+                owner__following__followed=owner_id,
+                owner__followed__owner=owner_id,
+            )
+        return queryset.filter(owner__in=mutuals)
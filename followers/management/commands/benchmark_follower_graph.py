@@ -0,0 +1,92 @@
+import random
+import sys
+import time
+from django.core.management.base import BaseCommand
+from followers.graph import FollowerGraph
+
+
+def percentile(timings, share):
+    return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+
+class Command(BaseCommand):
+    """
+    Builds a FollowerGraph from generated follows, without touching
+    the database, and reports its memory per edge and the latency of
+    its lookups. Followed users are skewed towards low ids, so a few
+    accounts have most of the followers, as on a real network.
+    The memory is what the arrays hold, counted with sys.getsizeof,
+    the generated rows aren't included.
+    """
+    help = 'Benchmark the in-memory follower graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--edges', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--lookups', type=int, default=100_000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        users, edges = options['users'], options['edges']
+        graph = FollowerGraph()
+        start = time.perf_counter()
+        graph.load(self.generate(rng, users, edges))
+        self.stdout.write(
+            f'{graph.edges} edges between {users} users, generated and '
+            f'loaded in {time.perf_counter() - start:.1f}s'
+        )
+        size = self.size(graph)
+        self.stdout.write(
+            f'{size / 2 ** 20:.1f} MiB, {size / graph.edges:.1f} bytes per edge'
+        )
+
+        lookups = options['lookups']
+        pairs = [
+            (rng.randrange(1, users + 1), int(users * rng.random() ** 3) + 1)
+            for _ in range(lookups)
+        ]
+        owners = [owner for owner, _ in pairs]
+        page = list(range(1, 11))
+        self.stdout.write('lookup                  mean us    p99 us')
+        for label, func, args in [
+            ('follow_id', graph.follow_id, pairs),
+            ('follow_ids_of (10)', graph.follow_ids_of,
+             [(owner, page) for owner in owners]),
+            ('mutuals', graph.mutuals, [(owner,) for owner in owners]),
+            ('suggestions', graph.suggestions,
+             [(owner, 20, 500) for owner in owners[:lookups // 10 or 1]]),
+        ]:
+            timings = []
+            for call_args in args:
+                began = time.perf_counter_ns()
+                func(*call_args)
+                timings.append(time.perf_counter_ns() - began)
+            timings.sort()
+            self.stdout.write(
+                f'{label:<22}  {sum(timings) / len(timings) / 1000:>7.2f}  '
+                f'{percentile(timings, 0.99) / 1000:>8.2f}'
+            )
+
+    def generate(self, rng, users, edges):
+        """
+        (owner, followed, id) rows in owner, followed order,
+        edges // users follows each give or take the remainder
+        """
+        follow_id = 0
+        for owner in range(1, users + 1):
+            degree = edges // users + (owner <= edges % users)
+            followed = set()
+            while len(followed) < min(degree, users - 1):
+                user_id = int(users * rng.random() ** 3) + 1
+                if user_id != owner:
+                    followed.add(user_id)
+            for user_id in sorted(followed):
+                follow_id += 1
+                yield owner, user_id, follow_id
+
+    def size(self, graph):
+        return sum(sys.getsizeof(ids) for ids in (
+            graph.following_at, graph.following, graph.follow_ids,
+            graph.followers_at, graph.followers,
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.20 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('followers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follower',
+            index=models.Index(fields=['created_at', 'id'], name='follower_created_at_id_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('followers', '0002_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowerChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('op', models.CharField(choices=[('follow', 'follow'), ('unfollow', 'unfollow'), ('reset', 'reset')], max_length=8)),
+                ('owner', models.BigIntegerField(null=True)),
+                ('followed', models.BigIntegerField(null=True)),
+                ('follower', models.BigIntegerField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import F, UniqueConstraint
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
+from django.utils import timezone
+from drf_api.cache import invalidate
 from profiles.models import Profile
 
 # Create your models here.
@@ -12,7 +15,105 @@ class Follower(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['created_at', 'id'], name='follower_created_at_id_idx'
+            ),
+        ]
         constraints = [UniqueConstraint(fields=['owner', 'followed'], name='unique_follow')]
 
     def __str__(self):
-        return f"{self.owner} {self.followed}"
\ No newline at end of file
+        return f"{self.owner} {self.followed}"
+
+
+class FollowerChange(models.Model):
+    """
+    Log of follows and unfollows, which every process's in-memory
+    follower graph (followers/graph.py) replays to catch up with the
+    others. 'reset' makes them reload, for writes that skip the
+    signal handlers such as bulk_load.
+    Plain ids rather than foreign keys, so the log outlives the rows.
+    """
+    FOLLOW = 'follow'
+    UNFOLLOW = 'unfollow'
+    RESET = 'reset'
+    op = models.CharField(max_length=8, choices=[
+        (FOLLOW, 'follow'), (UNFOLLOW, 'unfollow'), (RESET, 'reset'),
+    ])
+    owner = models.BigIntegerField(null=True)
+    followed = models.BigIntegerField(null=True)
+    follower = models.BigIntegerField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.op} {self.owner} {self.followed}"
+
+
+def increment_follow_counts(sender, instance, created, **kwargs):
+    """
+    bumps following_count on the follower's profile
+    and followers_count on the followed user's profile
+    """
+    if created:
+        Profile.objects.filter(owner=instance.owner_id).update(
+            following_count=F('following_count') + 1,
+            last_activity_at=timezone.now(),
+        )
+        Profile.objects.filter(owner=instance.followed_id).update(
+            followers_count=F('followers_count') + 1,
+            last_activity_at=timezone.now(),
+        )
+
+
+def decrement_follow_counts(sender, instance, **kwargs):
+    Profile.objects.filter(
+        owner=instance.owner_id, following_count__gt=0
+    ).update(
+        following_count=F('following_count') - 1,
+        last_activity_at=timezone.now(),
+    )
+    Profile.objects.filter(
+        owner=instance.followed_id, followers_count__gt=0
+    ).update(
+        followers_count=F('followers_count') - 1,
+        last_activity_at=timezone.now(),
+    )
+
+
+post_save.connect(increment_follow_counts, sender=Follower)
+post_delete.connect(decrement_follow_counts, sender=Follower)
+
+
+def invalidate_cached_profiles(sender, instance, **kwargs):
+    """
+    a follow changes both users' counts, and the posts list
+    can be filtered on who follows whom
+    """
+    profile_ids = Profile.objects.filter(
+        owner__in=[instance.owner_id, instance.followed_id]
+    ).values_list('id', flat=True)
+    invalidate('posts', 'profiles',
+               *[f'profile:{profile_id}' for profile_id in profile_ids])
+
+
+post_save.connect(invalidate_cached_profiles, sender=Follower)
+post_delete.connect(invalidate_cached_profiles, sender=Follower)
+
+
+def log_follow(sender, instance, created, **kwargs):
+    if created:
+        FollowerChange.objects.create(
+            op=FollowerChange.FOLLOW, owner=instance.owner_id,
+            followed=instance.followed_id, follower=instance.id,
+        )
+
+
+def log_unfollow(sender, instance, **kwargs):
+    FollowerChange.objects.create(
+        op=FollowerChange.UNFOLLOW, owner=instance.owner_id,
+        followed=instance.followed_id, follower=instance.id,
+    )
+
+
+post_save.connect(log_follow, sender=Follower)
+post_delete.connect(log_unfollow, sender=Follower)
@@ -1,3 +1,177 @@
-from django.test import TestCase
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
+from profiles.models import Profile
+from .graph import FollowerGraph, follower_graph
+from .models import Follower
+from rest_framework import status
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+
+class ProfileFollowViewTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username='adam', password='pass')
+        User.objects.create_user(username='anna', password='pass')
+
+    def test_put_follow_is_idempotent(self):
+        anna = Profile.objects.get(owner__username='anna')
+        self.client.login(username='adam', password='pass')
+        first = self.client.put(f'/profiles/{anna.id}/follow/')
+        second = self.client.put(f'/profiles/{anna.id}/follow/')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(Follower.objects.count(), 1)
+        anna.refresh_from_db()
+        self.assertEqual(anna.followers_count, 1)
+
+    def test_delete_follow_is_idempotent(self):
+        anna = Profile.objects.get(owner__username='anna')
+        self.client.login(username='adam', password='pass')
+        self.client.put(f'/profiles/{anna.id}/follow/')
+        for _ in range(2):
+            response = self.client.delete(f'/profiles/{anna.id}/follow/')
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        anna.refresh_from_db()
+        self.assertEqual(anna.followers_count, 0)
+
+
+class FollowerGraphTests(APITestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username=name, password='pass')
+            for name in ('adam', 'anna', 'bob', 'cara', 'dan')
+        ]
+        self.adam, self.anna, self.bob, self.cara, self.dan = self.users
+
+    def follow(self, owner, followed):
+        return Follower.objects.create(owner=owner, followed=followed)
+
+    def test_following_id_follows_follows_and_unfollows(self):
+        anna = self.anna.profile
+        self.client.login(username='adam', password='pass')
+        self.client.put(f'/profiles/{anna.id}/follow/')
+        follow_id = Follower.objects.get().id
+        response = self.client.get(f'/profiles/{anna.id}/')
+        self.assertEqual(response.data['following_id'], follow_id)
+        self.client.delete(f'/profiles/{anna.id}/follow/')
+        response = self.client.get('/profiles/')
+        self.assertEqual(
+            [profile['following_id'] for profile in response.data['results']],
+            [None] * len(self.users)
+        )
+
+    def test_rolled_back_follow_is_dropped(self):
+        with transaction.atomic():
+            self.follow(self.adam, self.anna)
+            self.assertTrue(follower_graph().follow_id(
+                self.adam.id, self.anna.id
+            ))
+            transaction.set_rollback(True)
+        self.assertIsNone(follower_graph().follow_id(
+            self.adam.id, self.anna.id
+        ))
+
+    def test_mutual_follows_filter(self):
+        self.follow(self.adam, self.anna)
+        self.follow(self.anna, self.adam)
+        self.follow(self.adam, self.bob)
+        self.follow(self.cara, self.adam)
+        response = self.client.get(
+            f'/profiles/?mutual_follows_of={self.adam.profile.id}'
+        )
+        self.assertEqual(
+            [profile['owner'] for profile in response.data['results']],
+            ['anna']
+        )
+        with self.settings(MUTUAL_FOLLOWS_IN_LIMIT=0):
+            response = self.client.get(
+                f'/profiles/?mutual_follows_of={self.adam.profile.id}'
+                '&ordering=posts_count'
+            )
+        self.assertEqual(
+            [profile['owner'] for profile in response.data['results']],
+            ['anna']
+        )
+        response = self.client.get('/profiles/?mutual_follows_of=x')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_suggestions_rank_friends_of_friends(self):
+        self.follow(self.adam, self.anna)
+        self.follow(self.adam, self.bob)
+        for user in (self.anna, self.bob):
+            self.follow(user, self.cara)
+            self.follow(user, self.adam)
+        self.follow(self.anna, self.dan)
+        self.client.login(username='adam', password='pass')
+        response = self.client.get('/profiles/suggestions/')
+        self.assertEqual(
+            [profile['owner'] for profile in response.data], ['cara', 'dan']
+        )
+
+    def test_updates_match_a_rebuild(self):
+        graph = FollowerGraph()
+        graph.load([])
+        follows = [
+            self.follow(owner, followed)
+            for owner in self.users for followed in self.users
+            if owner != followed
+        ]
+        for follow in follows:
+            graph.add(follow.owner_id, follow.followed_id, follow.id)
+        for follow in follows[::3]:
+            graph.remove(follow.owner_id, follow.followed_id)
+            follow.delete()
+        rebuilt = FollowerGraph()
+        rebuilt.build()
+        self.assertEqual(graph.edges, rebuilt.edges)
+        for user in self.users:
+            for built in (graph, rebuilt):
+                self.assertEqual(
+                    list(built.following_of(user.id)),
+                    sorted(Follower.objects.filter(
+                        owner=user
+                    ).values_list('followed', flat=True))
+                )
+                self.assertEqual(
+                    list(built.followers_of(user.id)),
+                    sorted(Follower.objects.filter(
+                        followed=user
+                    ).values_list('owner', flat=True))
+                )
+                for follow in Follower.objects.filter(owner=user):
+                    self.assertEqual(
+                        built.follow_id(user.id, follow.followed_id),
+                        follow.id
+                    )
+
+    def test_changes_leave_the_arrays_readers_hold_alone(self):
+        graph = FollowerGraph()
+        graph.load([(1, 2, 10), (1, 3, 11), (2, 3, 12)])
+        following, follow_ids, start, end = graph.out_range(1)
+        followers, first, last = graph.in_range(3)
+        graph.add(1, 4, 13)
+        graph.remove(1, 3)
+        graph.add(2, 3, 14)
+        self.assertEqual(list(following[start:end]), [2, 3])
+        self.assertEqual(list(follow_ids[start:end]), [10, 11])
+        self.assertEqual(list(followers[first:last]), [1, 2])
+        self.assertEqual(list(graph.following_of(1)), [2, 4])
+        self.assertEqual(list(graph.followers_of(3)), [2])
+        self.assertEqual(graph.follow_id(2, 3), 14)
+
+    def test_bulk_load_resets_the_graph(self):
+        follower_graph()
+        call_command(
+            'bulk_load', users=4, posts=0, comments=0, likes=0, follows=6,
+            prefix='load', stdout=StringIO(),
+        )
+        self.assertEqual(follower_graph().edges, 6)
+
+    def test_benchmark_reports_memory_and_latency(self):
+        out = StringIO()
+        call_command(
+            'benchmark_follower_graph', edges=2000, users=200, lookups=100,
+            stdout=out,
+        )
+        self.assertIn('bytes per edge', out.getvalue())
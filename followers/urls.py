@@ -4,4 +4,6 @@ from followers import views
 urlpatterns = [
     path('followers/', views.FollowerList.as_view()),
     path('followers/<int:pk>/', views.FollowerDetail.as_view()),
+    path('profiles/<int:pk>/follow/', views.ProfileFollow.as_view()),
+    path('profiles/suggestions/', views.FollowSuggestions.as_view()),
 ]
\ No newline at end of file
@@ -1,12 +1,33 @@
+from django.conf import settings
+from django.db.models import Case, When
 from django.shortcuts import render
-from rest_framework import generics, permissions
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_api.eager import EagerLoadingMixin
+from drf_api.fast import FastListMixin
+from drf_api.pagination import CursorOrPageNumberPagination
 from drf_api.permissions import IsOwnerOrReadOnly
+from drf_api.sparse import SparseFieldsMixin
+from drf_api.timing import ServerTimingMixin
+from drf_api.toggles import follow, unfollow
+from profiles.models import Profile
+from profiles.serializers import ProfileSerializer
+from .graph import follower_graph
 from .models import Follower
 from .serializers import FollowerSerializer
 
 
-class FollowerList(generics.ListCreateAPIView):
+class FollowerList(
+    ServerTimingMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    FastListMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = FollowerSerializer
+    pagination_class = CursorOrPageNumberPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = Follower.objects.all()
 
@@ -14,7 +35,67 @@ class FollowerList(generics.ListCreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class FollowerDetail(generics.RetrieveDestroyAPIView):
+class FollowerDetail(
+    ServerTimingMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.RetrieveDestroyAPIView,
+):
     serializer_class = FollowerSerializer
     permission_classes = [IsOwnerOrReadOnly]
     queryset = Follower.objects.all()
+
+
+class ProfileFollow(ServerTimingMixin, APIView):
+    """
+    PUT follows the profile's owner and DELETE unfollows them,
+    repeating either is a no-op
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, pk):
+        profile = get_object_or_404(Profile, pk=pk)
+        instance, created = follow(request.user, profile)
+        serializer = FollowerSerializer(
+            instance, context={'request': request}
+        )
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def delete(self, request, pk):
+        profile = get_object_or_404(Profile, pk=pk)
+        unfollow(request.user, profile)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class FollowSuggestions(
+    ServerTimingMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.ListAPIView,
+):
+    """
+    Who to follow: the profiles followed most by the users the logged
+    in user follows, from the follower graph, most in common first
+    """
+    serializer_class = ProfileSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+    queryset = Profile.objects.all()
+
+    def filter_queryset(self, queryset):
+        # here rather than in get_queryset, which EagerLoadingMixin wraps
+        suggested = [
+            user_id for user_id, _ in follower_graph().suggestions(
+                self.request.user.id, settings.FOLLOW_SUGGESTIONS,
+                settings.FOLLOW_SUGGESTIONS_FANOUT,
+            )
+        ]
+        if not suggested:
+            return queryset.none()
+        return queryset.filter(owner__in=suggested).order_by(Case(*[
+            When(owner=user_id, then=position)
+            for position, user_id in enumerate(suggested)
+        ]))
@@ -1,6 +1,9 @@
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import F, UniqueConstraint
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.models import User
+from django.utils import timezone
+from drf_api.cache import invalidate
 from posts.models import Post
 from comments.models import Comment
 
@@ -17,7 +20,42 @@ class Like(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['created_at', 'id'], name='like_created_at_id_idx'
+            ),
+        ]
         constraints = [UniqueConstraint(fields=['owner', 'post'], name='unique_like')]
 
     def __str__(self):
-        return f"{self.owner} {self.post}"
\ No newline at end of file
+        return f"{self.owner} {self.post}"
+
+def increment_likes_count(sender, instance, created, **kwargs):
+    """
+    bumps the stored likes_count on the liked post,
+    F() lets the database do the +1 so concurrent likes don't clash
+    """
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            likes_count=F('likes_count') + 1,
+            last_activity_at=timezone.now(),
+        )
+
+
+def decrement_likes_count(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id, likes_count__gt=0).update(
+        likes_count=F('likes_count') - 1,
+        last_activity_at=timezone.now(),
+    )
+
+
+post_save.connect(increment_likes_count, sender=Like)
+post_delete.connect(decrement_likes_count, sender=Like)
+
+
+def invalidate_cached_post(sender, instance, **kwargs):
+    invalidate('posts', f'post:{instance.post_id}')
+
+
+post_save.connect(invalidate_cached_post, sender=Like)
+post_delete.connect(invalidate_cached_post, sender=Like)
@@ -1,3 +1,84 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from drf_api.toggles import MAX_TOGGLES
+from posts.models import Post
+from profiles.models import Profile
+from .models import Like
+from rest_framework import status
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+
+class PostLikeViewTests(APITestCase):
+    def setUp(self):
+        adam = User.objects.create_user(username='adam', password='pass')
+        Post.objects.create(owner=adam, title='a title')
+
+    def test_user_not_logged_in_cant_like(self):
+        response = self.client.put('/posts/1/like/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_put_like_is_idempotent(self):
+        self.client.login(username='adam', password='pass')
+        first = self.client.put('/posts/1/like/')
+        second = self.client.put('/posts/1/like/')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(Like.objects.count(), 1)
+        self.assertEqual(Post.objects.get(pk=1).likes_count, 1)
+
+    def test_delete_like_is_idempotent(self):
+        self.client.login(username='adam', password='pass')
+        self.client.put('/posts/1/like/')
+        for _ in range(2):
+            response = self.client.delete('/posts/1/like/')
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(Like.objects.count(), 0)
+        self.assertEqual(Post.objects.get(pk=1).likes_count, 0)
+
+    def test_cant_like_missing_post(self):
+        self.client.login(username='adam', password='pass')
+        response = self.client.put('/posts/99/like/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ToggleViewTests(APITestCase):
+    def setUp(self):
+        adam = User.objects.create_user(username='adam', password='pass')
+        User.objects.create_user(username='anna', password='pass')
+        Post.objects.create(owner=adam, title='a title')
+
+    def test_applies_toggles_in_order(self):
+        anna = Profile.objects.get(owner__username='anna')
+        self.client.login(username='adam', password='pass')
+        response = self.client.post('/toggles/', [
+            {'op': 'like', 'post': 1},
+            {'op': 'like', 'post': 1},
+            {'op': 'follow', 'profile': anna.id},
+            {'op': 'unfollow', 'profile': anna.id},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['changed'] for result in response.data],
+            [True, False, True, True]
+        )
+        self.assertEqual(Post.objects.get(pk=1).likes_count, 1)
+        anna.refresh_from_db()
+        self.assertEqual(anna.followers_count, 0)
+
+    def test_invalid_toggle_applies_nothing(self):
+        self.client.login(username='adam', password='pass')
+        response = self.client.post('/toggles/', [
+            {'op': 'like', 'post': 1},
+            {'op': 'follow'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Like.objects.count(), 0)
+
+    def test_too_many_toggles_are_refused_before_validating(self):
+        self.client.login(username='adam', password='pass')
+        # the session and the user, none for the operations
+        with self.assertNumQueries(2):
+            response = self.client.post('/toggles/', [
+                {'op': 'like', 'post': 1}
+            ] * (MAX_TOGGLES + 1), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,12 +1,29 @@
 from django.shortcuts import render
-from rest_framework import generics, permissions
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_api.eager import EagerLoadingMixin
+from drf_api.fast import FastListMixin
+from drf_api.pagination import CursorOrPageNumberPagination
 from drf_api.permissions import IsOwnerOrReadOnly
+from drf_api.sparse import SparseFieldsMixin
+from drf_api.timing import ServerTimingMixin
+from drf_api.toggles import like, unlike
+from posts.models import Post
 from .models import Like
 from .serializers import LikeSerializer
 
 
-class LikeList(generics.ListCreateAPIView):
+class LikeList(
+    ServerTimingMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    FastListMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = LikeSerializer
+    pagination_class = CursorOrPageNumberPagination
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = Like.objects.all()
 
@@ -14,7 +31,33 @@ class LikeList(generics.ListCreateAPIView):
             serializer.save(owner=self.request.user)
 
 
-class LikeDetail(generics.RetrieveDestroyAPIView):  # step 13
+class LikeDetail(
+    ServerTimingMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.RetrieveDestroyAPIView,
+):  # step 13
     permission_classes = [IsOwnerOrReadOnly]  # step 14
     serializer_class = LikeSerializer  # step 15
-    queryset = Like.objects.all()  # step 16
\ No newline at end of file
+    queryset = Like.objects.all()  # step 16
+
+
+class PostLike(ServerTimingMixin, APIView):
+    """
+    PUT likes the post and DELETE unlikes it, repeating either is a no-op
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def put(self, request, pk):
+        post = get_object_or_404(Post, pk=pk)
+        instance, created = like(request.user, post)
+        serializer = LikeSerializer(instance, context={'request': request})
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    def delete(self, request, pk):
+        post = get_object_or_404(Post, pk=pk)
+        unlike(request.user, post)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,243 @@
+import os
+import re
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, migrations, models, transaction
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.urls import URLPattern, get_resolver
+
+PAGE_SIZE = 10
+
+# what a plan line looks like when a table is read in full, or the
+# rows are sorted after reading rather than read in index order
+SCAN = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?(\w+)\b(?! USING)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+}
+
+
+def views():
+    """
+    the class based views routed anywhere in the project that
+    declare filter, ordering or search fields
+    """
+    found = {}
+
+    def walk(patterns):
+        for pattern in patterns:
+            if not isinstance(pattern, URLPattern):
+                walk(pattern.url_patterns)
+                continue
+            view_class = getattr(pattern.callback, 'view_class', None)
+            if view_class is not None and any(
+                getattr(view_class, attr, None)
+                for attr in ('filterset_fields', 'ordering_fields',
+                             'search_fields')
+            ):
+                found[view_class.__name__] = view_class
+    walk(get_resolver().url_patterns)
+    return [found[name] for name in sorted(found)]
+
+
+def resolve(model, path):
+    """
+    the fields a lookup path goes through, e.g. Post,
+    'owner__followed__created_at' -> [owner, followed, created_at]
+    """
+    fields = []
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        fields.append(field)
+        if field.is_relation:
+            model = field.related_model
+    return fields
+
+
+def problems(plan, vendor):
+    found = [f'full scan of {table}' for table in SCAN[vendor].findall(plan)]
+    if SORT[vendor].search(plan):
+        found.append('sort')
+    return found
+
+
+def existing_indexes(model):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    return [
+        constraint['columns'] for constraint in constraints.values()
+        if constraint['index'] or constraint['unique']
+        or constraint['primary_key']
+    ]
+
+
+def index_name(model, fields):
+    # Index names may be 30 characters at most
+    stem = '_'.join([model._meta.model_name, *[
+        field.lstrip('-') for field in fields
+    ]])
+    return f'{stem[:26].rstrip("_")}_idx'
+
+
+class Command(BaseCommand):
+    """
+    Runs EXPLAIN on the query behind every filterset_fields,
+    ordering_fields and search_fields entry of the routed views, as
+    the first page of the view's list would run it, and flags plans
+    that read a table in full or sort the rows.
+    Where a composite index on the view's table would let the page be
+    read in index order (the filtered column, or the ordering column,
+    followed by the default ordering) it recommends one, unless an
+    existing index already starts with those columns, and writes the
+    recommendations as AddIndex migrations with --write.
+    Orderings on to-many relations and substring searches are flagged
+    without a recommendation: no b-tree index can serve them.
+    With --seed the queries run against a data set loaded by
+    bulk_load inside a transaction that is rolled back.
+    """
+    help = 'EXPLAIN the filter, ordering and search paths of the views'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true')
+        parser.add_argument('--write', action='store_true',
+                            help='write the recommended migrations')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            with transaction.atomic():
+                call_command(
+                    'bulk_load', prefix='advise-', users=500, posts=5000,
+                    comments=10000, likes=20000, follows=5000,
+                    stdout=self.stderr,
+                )
+                recommended = self.advise()
+                transaction.set_rollback(True)
+        else:
+            recommended = self.advise()
+        if recommended:
+            self.emit(recommended, options['write'])
+
+    def advise(self):
+        with connection.cursor() as cursor:
+            # fresh statistics, so the planner sees the seeded sizes
+            cursor.execute('ANALYZE')
+        recommended = {}
+        for view in views():
+            queryset = getattr(view, 'queryset', None)
+            if queryset is None:
+                self.stdout.write(
+                    f'{view.__name__}: skipped, builds its queryset '
+                    'per request'
+                )
+                continue
+            model = queryset.model
+            default = list(queryset.query.order_by or model._meta.ordering)
+            for kind, path, page, advice in self.cases(view, queryset, default):
+                plan = page.explain()
+                flagged = problems(plan, connection.vendor)
+                if not flagged:
+                    continue
+                line = f'{view.__name__} {kind} {path}: {", ".join(flagged)}'
+                if advice is None or advice[1] is None:
+                    note = advice[0] if advice else 'no index recommended'
+                    self.stdout.write(f'{line}, {note}')
+                    continue
+                target, fields = advice
+                columns = [
+                    target._meta.get_field(field.lstrip('-')).column
+                    for field in fields
+                ]
+                if any(
+                    index[:len(columns)] == columns
+                    for index in existing_indexes(target)
+                ) or (target, fields) in recommended.values():
+                    self.stdout.write(f'{line}, already indexed')
+                    continue
+                name = index_name(target, fields)
+                recommended[name] = (target, fields)
+                self.stdout.write(
+                    f'{line}, recommend {target.__name__} {fields}'
+                )
+        return recommended
+
+    def cases(self, view, queryset, default):
+        """
+        (kind, path, first page queryset, (model, fields) or
+        (note, None)) for each declared path
+        """
+        model = queryset.model
+        for path in getattr(view, 'filterset_fields', None) or []:
+            fields = resolve(model, path)
+            value = model.objects.exclude(
+                **{f'{path}__isnull': True}
+            ).values_list(path, flat=True).first() or 1
+            page = queryset.filter(**{path: value}).order_by(*default)
+            first = fields[0]
+            if first.concrete and not first.unique:
+                # read the filtered column's rows in the default order
+                advice = (model, [first.name, *default])
+            else:
+                advice = ('filter goes through a unique or reverse '
+                          'relation, the joined tables drive the query',
+                          None)
+            yield 'filter', path, page[:PAGE_SIZE], advice
+
+        for path in getattr(view, 'ordering_fields', None) or []:
+            fields = resolve(model, path)
+            page = queryset.order_by(f'-{path}')
+            if len(fields) == 1:
+                advice = (model, [f'-{path}'])
+            elif any(field.one_to_many or field.many_to_many
+                     for field in fields):
+                advice = ('ordering on a to-many relation, consider a '
+                          'stored column', None)
+            else:
+                advice = None
+            yield 'ordering', path, page[:PAGE_SIZE], advice
+
+        for path in getattr(view, 'search_fields', None) or []:
+            page = queryset.filter(**{f'{path}__icontains': 'a'})
+            yield 'search', path, page[:PAGE_SIZE], (
+                'substring search, see posts/search.py for full text', None
+            )
+
+    def emit(self, recommended, write):
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        by_app = {}
+        for name, (model, fields) in recommended.items():
+            by_app.setdefault(model._meta.app_label, []).append(
+                migrations.AddIndex(
+                    model_name=model._meta.model_name,
+                    index=models.Index(fields=fields, name=name),
+                )
+            )
+        for app_label, operations in sorted(by_app.items()):
+            leaf = max(loader.graph.leaf_nodes(app_label))[1]
+            number = int(leaf.split('_')[0]) + 1
+            migration = type('Migration', (migrations.Migration,), {
+                'dependencies': [(app_label, leaf)],
+                'operations': operations,
+            })(f'{number:04d}_advised_indexes', app_label)
+            writer = MigrationWriter(migration)
+            if write:
+                with open(writer.path, 'w') as file:
+                    file.write(writer.as_string())
+                self.stdout.write(f'wrote {os.path.relpath(writer.path)}')
+            else:
+                self.stdout.write(f'# {writer.path}\n{writer.as_string()}')
+            self.stdout.write(
+                'add to the Meta.indexes of the model, or makemigrations '
+                'will drop them again:'
+            )
+            for operation in operations:
+                index = operation.index
+                self.stdout.write(
+                    f'    models.Index(fields={index.fields!r}, '
+                    f'name={index.name!r}),'
+                )
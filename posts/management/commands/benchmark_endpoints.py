@@ -0,0 +1,380 @@
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from comments.models import Comment
+from drf_api.cache import invalidate
+from followers.models import Follower
+from likes.models import Like
+from posts.models import Post
+
+PREFIX = 'benchmark-'
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(timings, fraction):
+    """
+    nearest rank, timings sorted
+    """
+    if not timings:
+        return None
+    return timings[max(1, math.ceil(fraction * len(timings))) - 1]
+
+
+def summarise(route, timings, elapsed, errors, queries):
+    timings = sorted(timings)
+    return {
+        **route,
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': percentile(timings, 0.50),
+        'p95_ms': percentile(timings, 0.95),
+        'p99_ms': percentile(timings, 0.99),
+        'mean_ms': sum(timings) / len(timings) if timings else None,
+        'throughput_rps': len(timings) / elapsed if elapsed else None,
+        'queries_per_request': (
+            queries / len(timings) if queries is not None and timings
+            else None
+        ),
+    }
+
+
+class QueryCounter:
+    """
+    connection.execute_wrapper that only counts, so the timings
+    don't include the debug cursor's bookkeeping
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    """
+    Drives every API route, anonymously and logged in, against a data
+    set seeded with bulk_load and reports p50 / p95 / p99 latency,
+    throughput and queries per request as JSON, one entry per route
+    and caller, so runs can be diffed or compared with --baseline.
+    Anonymous reads are mostly cache hits after the warmup, --cold
+    times them uncached.
+    Requests go through the in-process test client, inside a
+    transaction that is rolled back, or with --gunicorn through
+    a local gunicorn over HTTP. gunicorn can't see uncommitted rows,
+    so that mode commits the seeded data and reuses it on later runs:
+    point it at a throwaway database. Its query counts come from the
+    Server-Timing headers.
+    """
+    help = 'Benchmark latency percentiles and queries of every API route'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--comments', type=int, default=5000)
+        parser.add_argument('--likes', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=4000)
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--routes', nargs='+',
+                            help='only the routes with these names')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help="don't cache anonymous responses (in-process only)",
+        )
+        parser.add_argument('--gunicorn', action='store_true')
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--output', help='write the JSON here')
+        parser.add_argument('--baseline',
+                            help='JSON of an earlier run to compare with')
+
+    def handle(self, *args, **options):
+        self.options = options
+        if options['gunicorn']:
+            self.seed(commit=True)
+            results = self.run_gunicorn()
+        else:
+            with transaction.atomic():
+                self.seed(commit=False)
+                results = self.run_in_process()
+                transaction.set_rollback(True)
+            # drop anonymous responses cached from the rolled back rows
+            invalidate('posts', 'profiles')
+
+        report = {
+            'mode': 'gunicorn' if options['gunicorn'] else 'in-process',
+            'anonymous_cache': not options['cold'],
+            'database': connection.vendor,
+            'scale': {
+                key: options[key]
+                for key in ('users', 'posts', 'comments', 'likes', 'follows')
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        if options['baseline']:
+            self.compare(options['baseline'], results)
+
+    def seed(self, commit):
+        if commit and User.objects.filter(
+            username__startswith=PREFIX
+        ).exists():
+            self.stderr.write(f'reusing the {PREFIX}* users already loaded')
+            return
+        call_command(
+            'bulk_load', prefix=PREFIX, stdout=self.stderr,
+            **{
+                key: self.options[key]
+                for key in ('users', 'posts', 'comments', 'likes', 'follows')
+            }
+        )
+
+    def routes(self):
+        """
+        (name, method, path, callers) for every route, with ids picked
+        from the seeded rows so the filters and feeds return something
+        """
+        seeded = User.objects.filter(username__startswith=PREFIX)
+        self.user = seeded.annotate(
+            following_total=Count('following')
+        ).order_by('-following_total', 'pk').first()
+        if self.user is None:
+            raise CommandError('nothing seeded to benchmark against')
+        profile = self.user.profile.pk
+        popular = Post.objects.filter(
+            owner__in=seeded
+        ).order_by('-likes_count', 'pk').first()
+        followed = Follower.objects.filter(owner=self.user).first()
+        other = seeded.exclude(pk=self.user.pk).exclude(
+            followed__owner=self.user
+        ).first()
+        comment = Comment.objects.filter(post=popular).first()
+        like = Like.objects.filter(owner=self.user).exclude(
+            post=popular
+        ).first()
+
+        both = ('anonymous', 'authenticated')
+        routes = [
+            ('root', 'GET', '/', both),
+            ('post list', 'GET', '/posts/', both),
+            ('post list by likes', 'GET', '/posts/?ordering=-likes_count',
+             both),
+            ('post list by comments', 'GET',
+             '/posts/?ordering=-comments_count', both),
+            ('post list by like date', 'GET',
+             '/posts/?ordering=-likes__created_at', both),
+            ('post search', 'GET', '/posts/?search=sunset', both),
+            ('post list cursor', 'GET', '/posts/?pagination=cursor', both),
+            ('post list sparse', 'GET', '/posts/?fields=id,title', both),
+            ('post list by owner', 'GET',
+             f'/posts/?owner__profile={profile}', both),
+            ('post list followed', 'GET',
+             f'/posts/?owner__followed__owner__profile={profile}', both),
+            ('post list liked', 'GET',
+             f'/posts/?likes__owner__profile={profile}', both),
+            ('post detail', 'GET', f'/posts/{popular.pk}/', both),
+            ('post image', 'GET', f'/posts/{popular.pk}/image/', both),
+            ('profile list', 'GET', '/profiles/', both),
+            ('profile list by followers', 'GET',
+             '/profiles/?ordering=-followers_count', both),
+            ('profile list by follow date', 'GET',
+             '/profiles/?ordering=-owner__following__created_at', both),
+            ('profile list following', 'GET',
+             f'/profiles/?owner__following__followed__profile={profile}',
+             both),
+            ('profile list followers', 'GET',
+             f'/profiles/?owner__followed__owner__profile={profile}', both),
+            ('profile detail', 'GET', f'/profiles/{profile}/', both),
+            ('comment list', 'GET', '/comments/', both),
+            ('comment list by post', 'GET',
+             f'/comments/?post={popular.pk}', both),
+            ('like list', 'GET', '/likes/', both),
+            ('follower list', 'GET', '/followers/', both),
+            ('feed', 'GET', '/feed/', ('authenticated',)),
+        ]
+        if comment is not None:
+            routes.append(('comment detail', 'GET',
+                           f'/comments/{comment.pk}/', both))
+        if like is not None:
+            routes.append(('like detail', 'GET', f'/likes/{like.pk}/', both))
+        if followed is not None:
+            routes.append(('follower detail', 'GET',
+                           f'/followers/{followed.pk}/', both))
+        # the writes last, so they don't change what the reads see
+        routes += [
+            ('like put', 'PUT', f'/posts/{popular.pk}/like/',
+             ('authenticated',)),
+            ('like delete', 'DELETE', f'/posts/{popular.pk}/like/',
+             ('authenticated',)),
+        ]
+        if other is not None:
+            routes += [
+                ('follow put', 'PUT', f'/profiles/{other.profile.pk}/follow/',
+                 ('authenticated',)),
+                ('follow delete', 'DELETE',
+                 f'/profiles/{other.profile.pk}/follow/', ('authenticated',)),
+            ]
+        if self.options['routes']:
+            routes = [
+                route for route in routes if route[0] in self.options['routes']
+            ]
+        return [
+            {'route': name, 'method': method, 'path': path, 'caller': caller}
+            for name, method, path, callers in routes for caller in callers
+        ]
+
+    def run_in_process(self):
+        routes = self.routes()
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_login(self.user)
+        # whichever of session and JWT cookie auth is configured
+        authenticated.cookies[settings.JWT_AUTH_COOKIE] = str(
+            RefreshToken.for_user(self.user).access_token
+        )
+        counter = QueryCounter()
+        results = []
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if self.options['cold']:
+            overrides['ANONYMOUS_CACHE_TIMEOUT'] = 0
+        with override_settings(**overrides), \
+                connection.execute_wrapper(counter):
+            for route in routes:
+                client = (
+                    authenticated if route['caller'] == 'authenticated'
+                    else anonymous
+                )
+                request = getattr(client, route['method'].lower())
+                for _ in range(self.options['warmup']):
+                    request(route['path'])
+                timings, errors = [], 0
+                counter.count = 0
+                started = time.perf_counter()
+                for _ in range(self.options['requests']):
+                    start = time.perf_counter()
+                    response = request(route['path'])
+                    timings.append((time.perf_counter() - start) * 1000)
+                    errors += response.status_code >= 400
+                elapsed = time.perf_counter() - started
+                results.append(
+                    summarise(route, timings, elapsed, errors, counter.count)
+                )
+        return results
+
+    def run_gunicorn(self):
+        routes = self.routes()
+        port = self.options['port']
+        # a session row for SessionAuthentication, a token for JWT
+        client = APIClient()
+        client.force_login(self.user)
+        cookie = '; '.join([
+            f'{settings.SESSION_COOKIE_NAME}='
+            f'{client.cookies[settings.SESSION_COOKIE_NAME].value}',
+            f'{settings.JWT_AUTH_COOKIE}='
+            f'{RefreshToken.for_user(self.user).access_token}',
+        ])
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'drf_api.wsgi',
+             '--bind', f'127.0.0.1:{port}',
+             '--workers', str(self.options['workers'])],
+            env={
+                **os.environ, 'ALLOWED_HOST': '127.0.0.1',
+                # every response reports its query count in Server-Timing
+                'REQUEST_TIMING_SAMPLE_RATE': '1',
+                'REQUEST_TIMING_LOG_LEVEL': 'WARNING',
+            },
+        )
+        try:
+            self.wait_for(port, server)
+            return [self.drive(route, port, cookie) for route in routes]
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError('gunicorn exited before it was ready')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f'gunicorn not listening on {port}')
+
+    def drive(self, route, port, cookie):
+        headers = {'Host': '127.0.0.1', 'Accept': 'application/json'}
+        if route['caller'] == 'authenticated':
+            headers['Cookie'] = cookie
+
+        def request(_):
+            # one connection per request, gunicorn's sync workers
+            # close it after the response anyway
+            http = HTTPConnection('127.0.0.1', port, timeout=60)
+            start = time.perf_counter()
+            http.request(route['method'], route['path'], headers=headers)
+            response = http.getresponse()
+            response.read()
+            http.close()
+            elapsed = (time.perf_counter() - start) * 1000
+            queries = QUERIES.search(response.getheader('Server-Timing', ''))
+            return (
+                elapsed, response.status,
+                int(queries.group(1)) if queries else None,
+            )
+
+        with ThreadPoolExecutor(self.options['concurrency']) as pool:
+            list(pool.map(request, range(self.options['warmup'])))
+            started = time.perf_counter()
+            responses = list(pool.map(request, range(self.options['requests'])))
+            elapsed = time.perf_counter() - started
+        queries = [count for _, _, count in responses]
+        return summarise(
+            route, [timing for timing, _, _ in responses], elapsed,
+            sum(status >= 400 for _, status, _ in responses),
+            None if None in queries else sum(queries),
+        )
+
+    def compare(self, path, results):
+        with open(path) as file:
+            baseline = {
+                (row['route'], row['caller']): row
+                for row in json.load(file)['results']
+            }
+        self.stderr.write(
+            f'{"route":<32}{"caller":<15}{"p95 ms":>9}{"was":>9}{"change":>9}'
+        )
+        for row in results:
+            before = baseline.get((row['route'], row['caller']))
+            if not before or not before['p95_ms'] or row['p95_ms'] is None:
+                continue
+            change = row['p95_ms'] / before['p95_ms'] - 1
+            self.stderr.write(
+                f'{row["route"]:<32}{row["caller"]:<15}'
+                f'{row["p95_ms"]:>9.2f}{before["p95_ms"]:>9.2f}'
+                f'{change:>+9.0%}'
+            )
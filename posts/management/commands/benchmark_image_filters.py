@@ -0,0 +1,81 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+from drf_api.image_filters import FILTERS, render_filtered
+
+
+def sample_image(size):
+    """
+    noise over a gradient, JPEG encoded like a typical upload
+    """
+    noise = Image.effect_noise((size, size), 40).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((size, size))
+    image = Image.merge('RGB', (
+        noise.getchannel(0), gradient, Image.eval(gradient, lambda v: 255 - v)
+    ))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def render_all(data, repeat, max_size, quality):
+    for _ in range(repeat):
+        for name in FILTERS:
+            render_filtered(data, name, max_size, quality)
+
+
+class Command(BaseCommand):
+    """
+    Measures how many images per second one core renders through each
+    image_filter (decode, resize, filter and JPEG encode, as in the
+    workers), then the throughput of a pool of --processes.
+    Needs no database.
+    """
+    help = 'Benchmark server side image_filter rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=2048)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--processes', type=int, default=os.cpu_count())
+
+    def handle(self, *args, **options):
+        data = sample_image(options['size'])
+        max_size, quality = (
+            settings.IMAGE_FILTER_MAX_SIZE, settings.IMAGE_QUALITY
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{options["size"]}px source, rendered at {max_size}px, one core'
+        ))
+        for name in FILTERS:
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                render_filtered(data, name, max_size, quality)
+            elapsed = (time.perf_counter() - start) / options['repeat']
+            self.stdout.write(
+                f'{name:>10}: {elapsed * 1000:7.1f}ms  '
+                f'{1 / elapsed:6.1f} images/s'
+            )
+
+        processes = options['processes']
+        total = processes * options['repeat'] * len(FILTERS)
+        with ProcessPoolExecutor(processes) as pool:
+            start = time.perf_counter()
+            list(pool.map(
+                render_all,
+                [data] * processes,
+                [options['repeat']] * processes,
+                [max_size] * processes,
+                [quality] * processes,
+            ))
+            elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{processes} processes'
+        ))
+        self.stdout.write(
+            f'{total / elapsed:.1f} images/s, '
+            f'{total / elapsed / processes:.1f} images/s per core'
+        )
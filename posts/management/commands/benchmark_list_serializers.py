@@ -0,0 +1,101 @@
+import time
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from comments.models import Comment
+from comments.serializers import CommentSerializer
+from drf_api.eager import eager_paths
+from drf_api.fast import compile_serializer
+from followers.models import Follower
+from followers.serializers import FollowerSerializer
+from likes.models import Like
+from likes.serializers import LikeSerializer
+from posts.models import Post
+from posts.serializers import PostSerializer
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    """
+    Rows per second for the list serializers, rendering the same rows
+    through DRF model serializers and through the compiled values()
+    path in drf_api/fast.py, query time included in both.
+    Everything is seeded inside a transaction that is rolled back,
+    so it is safe to point at a dev database.
+    """
+    help = 'Benchmark model serializers against compiled row rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['rows'])
+            request = Request(APIRequestFactory().get('/'))
+            request.user = AnonymousUser()
+            context = {'request': request}
+
+            self.stdout.write('serializer          model rows/s  fast rows/s')
+            for serializer_class in (PostSerializer, CommentSerializer,
+                                     LikeSerializer, FollowerSerializer):
+                model = serializer_class.Meta.model
+                select, _ = eager_paths(serializer_class, model)
+                plan = compile_serializer(serializer_class)
+                queryset = model.objects.select_related(*select)
+
+                def model_path():
+                    return serializer_class(
+                        queryset.all(), many=True, context=context
+                    ).data
+
+                def fast_path():
+                    return plan.render(queryset.values(*plan.keys), context)
+
+                rows = queryset.count()
+                self.stdout.write(
+                    f'{serializer_class.__name__:<18}'
+                    f'{rows / self.best_of(model_path, options["repeat"]):>13.0f}'
+                    f'{rows / self.best_of(fast_path, options["repeat"]):>13.0f}'
+                )
+
+            transaction.set_rollback(True)
+
+    def best_of(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def seed(self, rows):
+        User.objects.bulk_create(
+            User(username=f'benchmark-{i}', password='!') for i in range(100)
+        )
+        users = list(
+            User.objects.filter(username__startswith='benchmark-')
+            .values_list('id', flat=True)
+        )
+        Profile.objects.bulk_create(
+            Profile(owner_id=user_id) for user_id in users
+        )
+        Post.objects.bulk_create(
+            Post(owner_id=users[i % 100], title=f'post {i}', content='words')
+            for i in range(rows)
+        )
+        posts = list(Post.objects.values_list('id', flat=True)[:rows])
+        Comment.objects.bulk_create(
+            Comment(owner_id=users[i % 100], post_id=post_id, content='hi')
+            for i, post_id in enumerate(posts)
+        )
+        Like.objects.bulk_create(
+            Like(owner_id=users[i % 100], post_id=post_id)
+            for i, post_id in enumerate(posts)
+        )
+        Follower.objects.bulk_create(
+            Follower(owner_id=owner, followed_id=followed)
+            for owner in users for followed in users if owner != followed
+        )
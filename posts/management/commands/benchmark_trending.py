@@ -0,0 +1,95 @@
+import time
+from itertools import islice
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from likes.models import Like
+from posts.models import Post
+from posts.trending import ORDERING, update_scores
+
+
+class Command(BaseCommand):
+    """
+    Times a page of posts ordered by the old likes__created_at join
+    against the same page ordered by the stored trending score, and
+    the update_trending job: an incremental run after --new-likes
+    likes, and a full rebuild.
+    The data set is loaded by bulk_load inside a transaction that is
+    rolled back, so it is safe to point at a dev database.
+    """
+    help = 'Benchmark ?ordering=trending against -likes__created_at'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--likes', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--new-likes', type=int, default=1000)
+        parser.add_argument('--pages', type=int, nargs='+', default=[1, 50])
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            call_command(
+                'bulk_load', prefix='benchmark-', users=options['users'],
+                posts=options['posts'], comments=options['comments'],
+                likes=options['likes'], follows=0, stdout=StringIO(),
+            )
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        size, repeat = options['page_size'], options['repeat']
+        self.stdout.write('page  join ms  trending ms  join distinct posts')
+        for page in options['pages']:
+            offset = (page - 1) * size
+            join = Post.objects.order_by('-likes__created_at')[
+                offset:offset + size
+            ]
+            trending = Post.objects.order_by(*ORDERING)[offset:offset + size]
+            distinct = len({post.id for post in join})
+            self.stdout.write(
+                f'{page:>4}  {self.best_of(join, repeat) * 1000:>7.2f}  '
+                f'{self.best_of(trending, repeat) * 1000:>11.2f}  '
+                f'{distinct:>19}'
+            )
+
+        # likes from the first users on the posts they haven't liked
+        users = list(User.objects.filter(
+            username__startswith='benchmark-'
+        ).values_list('id', flat=True)[:100])
+        post_ids = list(Post.objects.order_by('-id').values_list(
+            'id', flat=True
+        )[:options['new_likes']])
+        liked = set(Like.objects.filter(
+            owner__in=users, post__in=post_ids
+        ).values_list('owner', 'post'))
+        Like.objects.bulk_create(islice(
+            (Like(owner_id=owner, post_id=post)
+             for owner in users for post in post_ids
+             if (owner, post) not in liked),
+            options['new_likes'],
+        ))
+        start = time.perf_counter()
+        updated = update_scores()
+        self.stdout.write(
+            f'incremental update: {updated} posts in '
+            f'{(time.perf_counter() - start) * 1000:.1f}ms'
+        )
+        start = time.perf_counter()
+        updated = update_scores(rebuild=True)
+        self.stdout.write(
+            f'rebuild: {updated} posts in '
+            f'{(time.perf_counter() - start) * 1000:.1f}ms'
+        )
+
+    def best_of(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - start)
+        return min(timings)
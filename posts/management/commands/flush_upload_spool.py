@@ -0,0 +1,30 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    """
+    Uploads whatever is left in the upload spool, e.g. files whose
+    retries all failed or that were queued when a worker was killed.
+    Runs inline, one file at a time.
+    """
+    help = 'Push spooled post and profile images to the remote storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the spooled files.',
+        )
+
+    def handle(self, *args, **options):
+        pending = default_storage.pending()
+        for name in pending:
+            self.stdout.write(name)
+            if not options['dry_run']:
+                default_storage.upload(name)
+
+        left = len(default_storage.pending())
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(pending)} spooled file(s), {left} left'
+        ))
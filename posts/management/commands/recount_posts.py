@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from comments.models import Comment
+from likes.models import Like
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the stored likes_count and comments_count on every post
+    from the likes and comments tables.
+    The signal handlers keep them current, this is for reconciling
+    after bulk loads, raw SQL or anything else that skipped them.
+    """
+    help = 'Reconcile Post.likes_count and Post.comments_count'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report posts whose counters have drifted.',
+        )
+
+    def handle(self, *args, **options):
+        # one correlated count per counter, as in bulk_load's recount,
+        # joining both would multiply the rows per post
+        def count_of(model):
+            return Coalesce(Subquery(
+                model.objects.filter(post=OuterRef('pk'))
+                .order_by().values('post')
+                .annotate(total=Count('pk')).values('total')
+            ), 0)
+
+        drifted = Post.objects.annotate(
+            actual_comments=count_of(Comment),
+            actual_likes=count_of(Like),
+        ).filter(
+            ~Q(comments_count=F('actual_comments'))
+            | ~Q(likes_count=F('actual_likes'))
+        ).values_list('id', 'actual_likes', 'actual_comments')
+
+        fixed = 0
+        with transaction.atomic():
+            for post_id, likes, comments in drifted:
+                fixed += 1
+                if options['dry_run']:
+                    self.stdout.write(
+                        f'post {post_id}: likes={likes} comments={comments}'
+                    )
+                    continue
+                Post.objects.filter(pk=post_id).update(
+                    likes_count=likes, comments_count=comments
+                )
+
+        verb = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {fixed} post(s)'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from posts.trending import update_scores
+
+
+class Command(BaseCommand):
+    """
+    Adds the posts, likes and comments made since the last run to the
+    stored trending scores behind /posts/?ordering=trending.
+    Schedule it every few minutes, e.g. with cron or Heroku Scheduler;
+    between runs new activity just isn't counted yet.
+    Run it with --rebuild once after the migration that added the
+    scores, and now and then to take out unlikes and deleted comments,
+    which the incremental runs can't subtract.
+    """
+    help = 'Update Post.trending_score from recent likes and comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recompute every score from all activity.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = update_scores(
+            rebuild=options['rebuild'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'updated {updated} post(s)'))
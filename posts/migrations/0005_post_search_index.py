@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE posts_post_fts '
+                'USING fts5(title, content, username)'
+            )
+        except OperationalError:
+            # sqlite built without FTS5, search falls back to icontains
+            return
+        schema_editor.execute(
+            'INSERT INTO posts_post_fts (rowid, title, content, username) '
+            'SELECT p.id, p.title, p.content, u.username '
+            'FROM posts_post p JOIN auth_user u ON u.id = p.owner_id'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE TABLE posts_post_search ('
+            'post_id bigint PRIMARY KEY '
+            'REFERENCES posts_post (id) ON DELETE CASCADE '
+            'DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            'CREATE INDEX posts_post_search_document_idx '
+            'ON posts_post_search USING GIN (document)'
+        )
+        schema_editor.execute(
+            'INSERT INTO posts_post_search (post_id, document) '
+            "SELECT p.id, setweight(to_tsvector('english', p.title), 'A') "
+            "|| setweight(to_tsvector('english', p.content), 'C') "
+            "|| setweight(to_tsvector('simple', u.username), 'B') "
+            'FROM posts_post p JOIN auth_user u ON u.id = p.owner_id'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_fts')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_post_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_created_at_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
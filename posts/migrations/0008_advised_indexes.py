@@ -0,0 +1,17 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['owner', 'created_at'], name='post_owner_created_at_idx'),
+        ),
+    ]
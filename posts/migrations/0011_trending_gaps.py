@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 14:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_counters_not_editable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trendingwatermark',
+            name='gaps',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -1,5 +1,15 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.contrib.auth.models import User
+from django.utils import timezone
+from drf_api.cache import invalidate
+from drf_api.images import (
+    mark_new_image, queue_derivatives, queue_filtered_image,
+)
+from drf_api.storage import claim_uploads
+from profiles.models import Profile
+from .search import index_post, unindex_post
 
 
 class Post(models.Model):
@@ -31,9 +41,142 @@ class Post(models.Model):
         choices=image_filter_choices,
         default='normal'
         )
+    # derivatives of image, rendered in the background by
+    # drf_api/images.py after an upload. Blank until then
+    image_thumbnail = models.ImageField(
+        upload_to='derivatives/', blank=True, editable=False
+    )
+    image_thumbnail_webp = models.ImageField(
+        upload_to='derivatives/', blank=True, editable=False
+    )
+    image_webp = models.ImageField(
+        upload_to='derivatives/', blank=True, editable=False
+    )
+    # denormalised counters, kept current by the Like and Comment
+    # signal handlers so lists don't have to Count() the joins
+    likes_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False
+    )
+    # bumped with the counters, so conditional GETs see likes and comments
+    last_activity_at = models.DateTimeField(null=True, editable=False)
+    # log2 of the post's time-decayed activity, see posts/trending.py.
+    # Kept current by the update_trending command, not on save
+    trending_score = models.FloatField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['created_at', 'id'], name='post_created_at_id_idx'
+            ),
+            models.Index(
+                fields=['owner', 'created_at'],
+                name='post_owner_created_at_idx',
+            ),
+            models.Index(
+                fields=['trending_score', 'id'],
+                name='post_trending_score_id_idx',
+            ),
+        ]
+
+    # only ever written with update(), save() leaves them out so an
+    # edit of a post read before a like doesn't put the old count back
+    counter_fields = [
+        'likes_count', 'comments_count', 'last_activity_at', 'trending_score',
+    ]
 
     def __str__(self):
-        return f'{self.id} {self.title}'
\ No newline at end of file
+        return f'{self.id} {self.title}'
+
+    def save(self, *args, **kwargs):
+        if not (self._state.adding or kwargs.get('force_insert')
+                or kwargs.get('update_fields') is not None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class TrendingWatermark(models.Model):
+    """
+    A single row, the last post, like and comment ids already added
+    to the trending scores by posts/trending.py, and the ids below
+    them that weren't there yet, which a transaction committing late
+    may still fill in
+    """
+    last_post = models.IntegerField(default=0)
+    last_like = models.IntegerField(default=0)
+    last_comment = models.IntegerField(default=0)
+    # watermark field -> ids skipped, within TRENDING_LATE_ROWS of it
+    gaps = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(null=True)
+
+
+def increment_posts_count(sender, instance, created, **kwargs):
+    """
+    bumps the stored posts_count on the owner's profile
+    """
+    if created:
+        Profile.objects.filter(owner=instance.owner_id).update(
+            posts_count=F('posts_count') + 1,
+            last_activity_at=timezone.now(),
+        )
+
+
+def decrement_posts_count(sender, instance, **kwargs):
+    Profile.objects.filter(owner=instance.owner_id, posts_count__gt=0).update(
+        posts_count=F('posts_count') - 1,
+        last_activity_at=timezone.now(),
+    )
+
+
+post_save.connect(increment_posts_count, sender=Post)
+post_delete.connect(decrement_posts_count, sender=Post)
+
+
+def update_search_index(sender, instance, **kwargs):
+    index_post(instance)
+
+
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_post(instance)
+
+
+def reindex_user_posts(sender, instance, created, update_fields, **kwargs):
+    """
+    keeps the indexed username current,
+    skips saves that can't have changed it such as last_login on login
+    """
+    if created or (update_fields and 'username' not in update_fields):
+        return
+    for post in Post.objects.filter(owner=instance).select_related('owner'):
+        index_post(post)
+
+
+post_save.connect(update_search_index, sender=Post)
+post_delete.connect(remove_from_search_index, sender=Post)
+post_save.connect(reindex_user_posts, sender=User)
+
+
+def invalidate_cached_post(sender, instance, **kwargs):
+    profile_id = Profile.objects.filter(owner=instance.owner_id).values_list(
+        'id', flat=True
+    ).first()
+    invalidate('posts', f'post:{instance.id}', 'profiles',
+               f'profile:{profile_id}')
+
+
+post_save.connect(invalidate_cached_post, sender=Post)
+post_delete.connect(invalidate_cached_post, sender=Post)
+
+
+pre_save.connect(mark_new_image, sender=Post)
+# first, the other handlers may save the row again before returning
+post_save.connect(claim_uploads, sender=Post)
+post_save.connect(queue_derivatives, sender=Post)
+post_save.connect(queue_filtered_image, sender=Post)
@@ -0,0 +1,165 @@
+import re
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# shadow tables holding the indexed text of every post,
+# created by migrations/0005_post_search_index.py
+SQLITE_TABLE = 'posts_post_fts'
+POSTGRES_TABLE = 'posts_post_search'
+
+SQLITE_UPSERT = f"""
+    INSERT INTO {SQLITE_TABLE} (rowid, title, content, username)
+    VALUES (%s, %s, %s, %s)
+"""
+POSTGRES_UPSERT = f"""
+    INSERT INTO {POSTGRES_TABLE} (post_id, document)
+    VALUES (%s,
+        setweight(to_tsvector('english', %s), 'A')
+        || setweight(to_tsvector('english', %s), 'C')
+        || setweight(to_tsvector('simple', %s), 'B'))
+    ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document
+"""
+
+_available = {}
+
+
+def search_index_available():
+    """
+    postgres always gets the shadow table,
+    sqlite only if it was built with FTS5
+    """
+    key = (connection.vendor, str(connection.settings_dict['NAME']))
+    if key not in _available:
+        if connection.vendor == 'postgresql':
+            _available[key] = True
+        elif connection.vendor == 'sqlite':
+            _available[key] = (
+                SQLITE_TABLE in connection.introspection.table_names()
+            )
+        else:
+            _available[key] = False
+    return _available[key]
+
+
+def index_post(post):
+    if not search_index_available():
+        return
+    row = [post.id, post.title, post.content, post.owner.username]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [post.id]
+            )
+            cursor.execute(SQLITE_UPSERT, row)
+        else:
+            cursor.execute(POSTGRES_UPSERT, row)
+
+
+def index_posts(first_id):
+    """
+    indexes every post from first_id up in one statement,
+    for bulk loads that skipped the signal handlers
+    """
+    if not search_index_available():
+        return
+    select = (
+        'FROM posts_post p JOIN auth_user u ON u.id = p.owner_id '
+        'WHERE p.id >= %s'
+    )
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid >= %s', [first_id]
+            )
+            cursor.execute(
+                f'INSERT INTO {SQLITE_TABLE} (rowid, title, content, username) '
+                f'SELECT p.id, p.title, p.content, u.username {select}',
+                [first_id]
+            )
+        else:
+            cursor.execute(
+                f'INSERT INTO {POSTGRES_TABLE} (post_id, document) '
+                "SELECT p.id, setweight(to_tsvector('english', p.title), 'A') "
+                "|| setweight(to_tsvector('english', p.content), 'C') "
+                "|| setweight(to_tsvector('simple', u.username), 'B') "
+                f'{select} '
+                'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+                [first_id]
+            )
+
+
+def unindex_post(post):
+    if search_index_available() and connection.vendor == 'sqlite':
+        # the postgres table cascades with posts_post
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s', [post.id]
+            )
+
+
+def postgres_query(terms):
+    """
+    tsquery SQL and params matching every term as a prefix, of the
+    stemmed title and content ('english') or of the username, which
+    is indexed unstemmed ('simple') with weight B. A stopword's
+    english half is empty, it can still match a username
+    """
+    query = ' && '.join(
+        "(to_tsquery('english', %s) || to_tsquery('simple', %s))"
+        for _ in terms
+    )
+    params = []
+    for term in terms:
+        params += [f'{term}:*', f'{term}:*B']
+    return query, params
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on PostList.
+    Matches ?search= terms as prefixes against the indexed title,
+    content and owner username, ranked by relevance unless the client
+    asked for an ?ordering=.
+    Falls back to SearchFilter's icontains lookups on other databases.
+    """
+    def filter_queryset(self, request, queryset, view):
+        terms = re.findall(
+            r'\w+', ' '.join(self.get_search_terms(request))
+        )
+        if not terms or not search_index_available():
+            return super().filter_queryset(request, queryset, view)
+
+        post_id = f'"{queryset.model._meta.db_table}"."id"'
+        if connection.vendor == 'sqlite':
+            match = ' '.join(f'"{term}"*' for term in terms)
+            matches = RawSQL(
+                f'SELECT rowid FROM {SQLITE_TABLE} '
+                f'WHERE {SQLITE_TABLE} MATCH %s',
+                [match]
+            )
+            # bm25 is lower for better matches, columns weighted
+            # title, content, username
+            rank = RawSQL(
+                f'SELECT -bm25({SQLITE_TABLE}, 10.0, 1.0, 5.0) '
+                f'FROM {SQLITE_TABLE} '
+                f'WHERE {SQLITE_TABLE} MATCH %s AND rowid = {post_id}',
+                [match]
+            )
+        else:
+            query, params = postgres_query(terms)
+            matches = RawSQL(
+                f'SELECT post_id FROM {POSTGRES_TABLE} '
+                f'WHERE document @@ ({query})',
+                params
+            )
+            rank = RawSQL(
+                f'SELECT ts_rank(document, {query}) '
+                f'FROM {POSTGRES_TABLE} WHERE post_id = {post_id}',
+                params
+            )
+
+        queryset = queryset.filter(pk__in=matches).annotate(search_rank=rank)
+        if request.query_params.get('ordering'):
+            return queryset
+        return queryset.order_by('-search_rank', '-created_at')
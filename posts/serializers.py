@@ -1,8 +1,25 @@
+from django.db import models
 from rest_framework import serializers
+from drf_api.image_filters import filter_key
+from drf_api.images import ProbedImageField
 from .models import Post
 from likes.models import Like
 
 
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Looks up the requesting user's likes for every post on the page
+    in one query and hands them to the child serializer,
+    so get_like_id doesn't hit the database once per post.
+    """
+    def to_representation(self, data):
+        posts = data.all() if isinstance(data, models.Manager) else data
+        posts = list(posts)
+        if 'like_id' in self.child.fields:
+            self.child.load_likes([post.id for post in posts])
+        return super().to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
     profile_id = serializers.ReadOnlyField(source='owner.id')
@@ -13,8 +30,14 @@ class PostSerializer(serializers.ModelSerializer):
         # as a function below by prefixing the variable's 
         # name with 'get_'
     like_id = serializers.SerializerMethodField()
+    image_filtered = serializers.SerializerMethodField()
     comments_count = serializers.ReadOnlyField()
     likes_count = serializers.ReadOnlyField()
+    # uploads are validated from their header, see drf_api/images.py
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: ProbedImageField,
+    }
     
     def get_is_owner(self, obj):
         """
@@ -25,31 +48,90 @@ class PostSerializer(serializers.ModelSerializer):
         request = self.context['request']
         return request.user == obj.owner
 
+    def get_is_owner_from_row(self, row):
+        user = self.context['request'].user
+        return user.is_authenticated and row['owner_id'] == user.id
+
+    def load_likes(self, post_ids):
+        """
+        fetches the requesting user's likes for a page of posts
+        in one query, for get_like_id to read from
+        """
+        user = self.context['request'].user
+        if user.is_authenticated:
+            self.liked_posts = dict(
+                Like.objects.filter(
+                    owner=user, post__in=post_ids
+                ).values_list('post_id', 'id')
+            )
+
+    def prepare_rows(self, rows):
+        if 'like_id' in self.fields:
+            self.load_likes([row['id'] for row in rows])
+
     def get_like_id(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
+            liked_posts = getattr(self, 'liked_posts', None)
+            if liked_posts is not None:
+                return liked_posts.get(obj.id)
             liked = Like.objects.filter(owner=user, post=obj).first()
-            print(liked)
             return liked.id if liked else None
         return None
+
+    def get_like_id_from_row(self, row):
+        if self.context['request'].user.is_authenticated:
+            return self.liked_posts.get(row['id'])
+        return None
     
+    def get_image_filtered(self, obj):
+        return self.filtered_image_url(
+            obj.id, obj.image.name, obj.image_filter
+        )
+
+    def get_image_filtered_from_row(self, row):
+        return self.filtered_image_url(
+            row['id'], row['image'], row['image_filter']
+        )
+
+    def filtered_image_url(self, post_id, image, image_filter):
+        """
+        the server side render of image_filter, None for 'normal'.
+        Versioned, so a new image or filter is a new url
+        """
+        if image_filter == 'normal':
+            return None
+        url = f'/posts/{post_id}/image/?v={filter_key(image, image_filter)[:16]}'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def validate_image(self, value):
         if value.size > 1024 * 1024 * 2:
             raise serializers.ValidationError(
                 'Image size larger than 2MB!'
             )
-        if value.image.width > 4096:
+        width, height = value.image_size
+        if width > 4096:
             raise serializers.ValidationError(
                 'Image wider than 4096 pixels!'
             )
-        if value.image.height > 4096:
+        if height > 4096:
             raise serializers.ValidationError(
                 'Image taller than 4096 pixels!'
             )
         return value
 
+    # the columns the method fields read, for drf_api/fast.py
+    # and drf_api/sparse.py
+    row_keys = {
+        'is_owner': ['owner_id'],
+        'like_id': ['id'],
+        'image_filtered': ['id', 'image', 'image_filter'],
+    }
+
     class Meta:
         model = Post
+        list_serializer_class = PostListSerializer
         fields = [
             'id',
             'owner',
@@ -60,7 +142,11 @@ class PostSerializer(serializers.ModelSerializer):
             'title',
             'content',
             'image',
+            'image_thumbnail',
+            'image_thumbnail_webp',
+            'image_webp',
             'image_filter',
+            'image_filtered',
             'is_owner',
             'like_id',
             'likes_count',
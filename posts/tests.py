@@ -1,8 +1,22 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.utils import timezone
 from .models import Post
+from .search import PostSearchFilter, postgres_query
+from .trending import update_scores
+from comments.models import Comment
+from likes.models import Like
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 
 
 class PostListViewTests(APITestCase):
@@ -31,6 +45,7 @@ class PostListViewTests(APITestCase):
 
 class PostDetailViewTests(APITestCase):
     def setUp(self):
+        cache.clear()
         adam = User.objects.create_user(username='adam', password='pass1')
         anna = User.objects.create_user(username='anna', password='pass2')
         Post.objects.create(owner=adam, title='ADAM!', content="Adam's post")
@@ -55,4 +70,346 @@ class PostDetailViewTests(APITestCase):
     def test_user_cant_update_others_post(self):
         self.client.login(username='adam', password='pass1')
         response = self.client.put('/posts/2/', {'title': 'ADAAAAAM!'})
-        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class PostCounterTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        Post.objects.create(owner=adam, title='a title')
+
+    def test_like_and_comment_update_stored_counts(self):
+        adam = User.objects.get(username='adam')
+        post = Post.objects.get(pk=1)
+        like = Like.objects.create(owner=adam, post=post)
+        Comment.objects.create(owner=adam, post=post, content='hi')
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+        like.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 0)
+
+    def test_counts_are_returned_by_the_api(self):
+        adam = User.objects.get(username='adam')
+        Like.objects.create(owner=adam, post_id=1)
+        response = self.client.get('/posts/1/')
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertEqual(response.data['comments_count'], 0)
+
+    def test_saving_a_stale_post_keeps_the_counts(self):
+        adam = User.objects.get(username='adam')
+        post = Post.objects.get(pk=1)
+        Like.objects.create(owner=adam, post_id=1)
+        Comment.objects.create(owner=adam, post_id=1, content='hi')
+        post.title = 'a new title'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.title, 'a new title')
+        self.assertEqual((post.likes_count, post.comments_count), (1, 1))
+
+    def test_recount_posts_fixes_drifted_counts(self):
+        adam = User.objects.get(username='adam')
+        anna = User.objects.create_user(username='anna')
+        Like.objects.create(owner=adam, post_id=1)
+        Like.objects.create(owner=anna, post_id=1)
+        Comment.objects.create(owner=adam, post_id=1, content='hi')
+        Post.objects.filter(pk=1).update(likes_count=7, comments_count=3)
+        with CaptureQueriesContext(connection) as queries:
+            call_command('recount_posts', stdout=StringIO())
+        post = Post.objects.get(pk=1)
+        self.assertEqual(post.likes_count, 2)
+        self.assertEqual(post.comments_count, 1)
+        # counted per post, not over the likes x comments join
+        select = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+        )
+        self.assertNotIn('JOIN', select)
+
+
+class PostLikeIdQueryTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username='adam', password='pass')
+
+    def count_list_queries(self, posts):
+        adam = User.objects.get(username='adam')
+        Post.objects.all().delete()
+        for i in range(posts):
+            post = Post.objects.create(owner=adam, title=f'post {i}')
+            Like.objects.create(owner=adam, post=post)
+        self.client.login(username='adam', password='pass')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/posts/')
+        self.assertEqual(len(response.data['results']), posts)
+        self.assertTrue(
+            all(post['like_id'] for post in response.data['results'])
+        )
+        return len(queries)
+
+    def test_like_id_query_count_does_not_grow_with_page_size(self):
+        self.assertEqual(
+            self.count_list_queries(2), self.count_list_queries(10)
+        )
+
+
+class PostCursorPaginationTests(APITestCase):
+    def setUp(self):
+        adam = User.objects.create_user(username='adam', password='pass')
+        for i in range(15):
+            Post.objects.create(owner=adam, title=f'post {i}')
+
+    def test_cursor_mode_pages_through_every_post_without_count(self):
+        response = self.client.get('/posts/?pagination=cursor')
+        self.assertNotIn('count', response.data)
+        titles = [post['title'] for post in response.data['results']]
+        response = self.client.get(response.data['next'])
+        titles += [post['title'] for post in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(titles, [f'post {i}' for i in range(15)])
+
+    def test_cursor_mode_falls_back_for_other_orderings(self):
+        response = self.client.get(
+            '/posts/?pagination=cursor&ordering=-likes_count'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 15)
+
+
+class PostSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        anna = User.objects.create_user(username='anna', password='pass')
+        Post.objects.create(owner=adam, title='sunset', content='a beach')
+        Post.objects.create(owner=anna, title='beach day', content='sunny')
+        Post.objects.create(owner=anna, title='city lights')
+
+    def search(self, term):
+        response = self.client.get(f'/posts/?search={term}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']]
+
+    def test_search_ranks_title_matches_first(self):
+        self.assertEqual(self.search('beach'), ['beach day', 'sunset'])
+
+    def test_search_matches_owner_username_and_prefixes(self):
+        self.assertEqual(
+            sorted(self.search('ann')), ['beach day', 'city lights']
+        )
+
+    def test_search_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(title='city lights')
+        post.title = 'city beach'
+        post.save()
+        self.assertIn('city beach', self.search('beach'))
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertNotIn('city beach', self.search('beach'))
+
+    def test_search_ignores_query_syntax(self):
+        self.assertEqual(self.search('"beach* OR'), [])
+
+    def test_postgres_matches_usernames_without_stemming(self):
+        query, params = postgres_query(['happy', 'the'])
+        self.assertEqual(query, (
+            "(to_tsquery('english', %s) || to_tsquery('simple', %s)) && "
+            "(to_tsquery('english', %s) || to_tsquery('simple', %s))"
+        ))
+        self.assertEqual(params, ['happy:*', 'happy:*B', 'the:*', 'the:*B'])
+
+        request = Request(APIRequestFactory().get('/posts/?search=happy'))
+        with mock.patch('posts.search.connection') as postgres, mock.patch(
+            'posts.search.search_index_available', return_value=True
+        ):
+            postgres.vendor = 'postgresql'
+            queryset = PostSearchFilter().filter_queryset(
+                request, Post.objects.all(), None
+            )
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn(
+            "WHERE document @@ ((to_tsquery('english', %s) "
+            "|| to_tsquery('simple', %s)))", sql
+        )
+        self.assertIn('happy:*B', params)
+
+
+class PostConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        Post.objects.create(owner=adam, title='a title')
+
+    def test_matching_etag_gets_not_modified(self):
+        self.client.login(username='adam', password='pass')
+        etag = self.client.get('/posts/1/')['ETag']
+        # session, user, then only the validator query
+        with self.assertNumQueries(3):
+            response = self.client.get('/posts/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_cached_anonymous_response_still_answers_304(self):
+        etag = self.client.get('/posts/1/')['ETag']
+        self.client.get('/posts/1/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/posts/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_like_changes_the_etag(self):
+        self.client.login(username='adam', password='pass')
+        etag = self.client.get('/posts/1/')['ETag']
+        Like.objects.create(owner_id=1, post_id=1)
+        response = self.client.get('/posts/1/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['like_id'], 1)
+
+
+class PostSparseFieldsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        adam = User.objects.create_user(username='adam', password='pass')
+        Post.objects.create(owner=adam, title='a title', content='words')
+
+    def test_fields_limits_list_output_and_skips_like_lookup(self):
+        self.client.login(username='adam', password='pass')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                '/posts/?fields=id,title,image,likes_count'
+            )
+        self.assertEqual(
+            list(response.data['results'][0]),
+            ['id', 'title', 'image', 'likes_count'],
+        )
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('likes_like', sql)
+        self.assertNotIn('"content"', sql)
+
+    def test_omit_drops_fields_from_detail_and_defers_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/posts/1/?omit=content,like_id')
+        self.assertNotIn('content', response.data)
+        self.assertNotIn('like_id', response.data)
+        self.assertIn('title', response.data)
+        self.assertNotIn('"posts_post"."content"', queries[-1]['sql'])
+
+
+class EndpointBenchmarkTests(APITestCase):
+    def test_reports_every_route_for_both_callers(self):
+        out = StringIO()
+        call_command(
+            'benchmark_endpoints', users=4, posts=8, comments=8, likes=12,
+            follows=6, requests=3, warmup=1, cold=True,
+            stdout=out, stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        results = report['results']
+        self.assertEqual(
+            {row['route'] for row in results if row['caller'] == 'anonymous'},
+            {row['route'] for row in results
+             if row['caller'] == 'authenticated'} - {
+                'feed', 'like put', 'like delete', 'follow put',
+                'follow delete',
+            }
+        )
+        for row in results:
+            self.assertEqual(row['errors'], 0, row['route'])
+            self.assertEqual(row['requests'], 3)
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+            self.assertIsNotNone(row['queries_per_request'])
+        post_list = next(row for row in results if row['route'] == 'post list')
+        self.assertGreater(post_list['queries_per_request'], 0)
+        self.assertFalse(User.objects.filter(
+            username__startswith='benchmark-'
+        ).exists())
+
+
+class PostTrendingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='pass')
+            for i in range(3)
+        ]
+        self.quiet, self.liked, self.old = [
+            Post.objects.create(owner=self.users[0], title=title)
+            for title in ('quiet', 'liked', 'old')
+        ]
+        for user in self.users:
+            Like.objects.create(owner=user, post=self.liked)
+            Like.objects.create(owner=user, post=self.old)
+        # the old post and its likes are two days old, so barely count
+        two_days_ago = timezone.now() - timedelta(days=2)
+        Post.objects.filter(pk=self.old.pk).update(created_at=two_days_ago)
+        Like.objects.filter(post=self.old).update(created_at=two_days_ago)
+
+    def trending(self):
+        response = self.client.get('/posts/?ordering=trending')
+        return [post['title'] for post in response.data['results']]
+
+    def test_recent_activity_ranks_first(self):
+        update_scores()
+        self.assertEqual(self.trending(), ['liked', 'quiet', 'old'])
+
+    def test_incremental_updates_match_a_rebuild(self):
+        update_scores()
+        Comment.objects.create(
+            owner=self.users[1], post=self.quiet, content='hi'
+        )
+        Comment.objects.create(
+            owner=self.users[2], post=self.quiet, content='hi'
+        )
+        self.assertEqual(update_scores(), 1)
+        self.assertEqual(update_scores(), 0)
+        incremental = dict(Post.objects.values_list('id', 'trending_score'))
+        update_scores(rebuild=True)
+        for post_id, score in Post.objects.values_list(
+            'id', 'trending_score'
+        ):
+            self.assertAlmostEqual(score, incremental[post_id])
+        self.assertEqual(self.trending(), ['quiet', 'liked', 'old'])
+
+    def test_rows_committed_behind_the_watermark_are_added(self):
+        update_scores()
+        # a comment whose transaction commits after a later one's
+        early, later = [
+            Comment.objects.create(
+                owner=self.users[1], post=post, content='hi'
+            ) for post in (self.quiet, self.old)
+        ]
+        early_id = early.id
+        early.delete()
+        self.assertEqual(update_scores(), 1)
+        early.id = early_id
+        early.save(force_insert=True)
+        self.assertEqual(update_scores(), 1)
+        self.assertEqual(update_scores(), 0)
+        incremental = dict(Post.objects.values_list('id', 'trending_score'))
+        update_scores(rebuild=True)
+        for post_id, score in Post.objects.values_list(
+            'id', 'trending_score'
+        ):
+            self.assertAlmostEqual(score, incremental[post_id])
+
+    def test_benchmark_runs_and_rolls_back(self):
+        out = StringIO()
+        call_command(
+            'benchmark_trending', users=4, posts=8, likes=12, comments=4,
+            new_likes=2, pages=[1], repeat=1, stdout=out,
+        )
+        self.assertIn('rebuild:', out.getvalue())
+        self.assertFalse(User.objects.filter(
+            username__startswith='benchmark-'
+        ).exists())
+
+
+class AdviseIndexesTests(APITestCase):
+    def test_applied_recommendations_leave_nothing_to_add(self):
+        out = StringIO()
+        call_command('advise_indexes', seed=True, stdout=out, stderr=StringIO())
+        report = out.getvalue()
+        self.assertIn('PostList ordering likes__created_at', report)
+        self.assertNotIn('recommend', report)
+        self.assertFalse(User.objects.filter(
+            username__startswith='advise-'
+        ).exists())
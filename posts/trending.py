@@ -0,0 +1,143 @@
+import math
+from itertools import chain
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import filters
+from comments.models import Comment
+from drf_api.cache import invalidate
+from likes.models import Like
+from .models import Post, TrendingWatermark
+
+# a post's trending score is the sum over its activity of
+#     weight * 2 ** -(age / TRENDING_HALF_LIFE)
+# stored as log2 of that sum decayed to EPOCH rather than to now.
+# As time passes every score shrinks by the same factor, so the
+# stored ones keep their order and only new activity has to be added
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+WEIGHTS = {
+    # the post itself, so new posts rank before any likes come in
+    'last_post': 1,
+    'last_like': 1,
+    'last_comment': 2,
+}
+ORDERING = ['-trending_score', '-id']
+
+
+def activity():
+    """
+    (watermark field, (id, post id, created_at) rows) of everything
+    that adds to a post's score
+    """
+    return [
+        ('last_post', Post.objects.values_list('id', 'id', 'created_at')),
+        ('last_like', Like.objects.values_list('id', 'post_id', 'created_at')),
+        ('last_comment',
+         Comment.objects.values_list('id', 'post_id', 'created_at')),
+    ]
+
+
+def contribution(weight, created_at):
+    return math.log2(weight) + (
+        (created_at - EPOCH).total_seconds() / settings.TRENDING_HALF_LIFE
+    )
+
+
+def combine(score, other):
+    """
+    log2(2 ** score + 2 ** other) without leaving log space,
+    0 standing for no activity
+    """
+    if not score:
+        return other
+    if not other:
+        return score
+    high, low = max(score, other), min(score, other)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def update_scores(rebuild=False, batch_size=1000):
+    """
+    adds the posts, likes and comments made since the last run to the
+    trending scores, or with rebuild recomputes every score, which also
+    takes out unlikes and deleted comments.
+    Ids are handed out before the rows commit, so a row can appear
+    behind the watermark after a run has passed it. The ids a run
+    skips are kept and looked up again by the runs after it, until
+    they fall TRENDING_LATE_ROWS behind the watermark.
+    Returns the number of posts whose score changed.
+    """
+    with transaction.atomic():
+        watermark, _ = TrendingWatermark.objects.select_for_update(
+        ).get_or_create(pk=1)
+        if rebuild:
+            Post.objects.exclude(trending_score=0).update(trending_score=0)
+            for field in WEIGHTS:
+                setattr(watermark, field, 0)
+            watermark.gaps = {}
+
+        added = {}
+        for field, rows in activity():
+            weight = WEIGHTS[field]
+            last = getattr(watermark, field)
+            gaps = set(watermark.gaps.get(field, []))
+            late = rows.filter(id__in=gaps) if gaps else rows.none()
+            new = rows.filter(id__gt=last).order_by('id')
+            for row_id, post_id, created_at in chain(
+                late.iterator(), new.iterator()
+            ):
+                if row_id > last:
+                    gaps.update(range(
+                        max(last + 1, row_id - settings.TRENDING_LATE_ROWS),
+                        row_id
+                    ))
+                    last = row_id
+                    if len(gaps) > 2 * settings.TRENDING_LATE_ROWS:
+                        # a rebuild walking past deleted rows
+                        gaps = {
+                            gap for gap in gaps
+                            if gap > last - settings.TRENDING_LATE_ROWS
+                        }
+                else:
+                    gaps.discard(row_id)
+                added[post_id] = combine(
+                    added.get(post_id, 0), contribution(weight, created_at)
+                )
+            setattr(watermark, field, last)
+            watermark.gaps[field] = sorted(
+                gap for gap in gaps if gap > last - settings.TRENDING_LATE_ROWS
+            )
+
+        post_ids = list(added)
+        for start in range(0, len(post_ids), batch_size):
+            scores = Post.objects.filter(
+                pk__in=post_ids[start:start + batch_size]
+            ).values_list('id', 'trending_score')
+            # one prepared UPDATE, bulk_update's CASE per row is far slower
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'UPDATE {Post._meta.db_table} '
+                    'SET trending_score = %s WHERE id = %s',
+                    [(combine(score, added[post_id]), post_id)
+                     for post_id, score in scores]
+                )
+        watermark.updated_at = timezone.now()
+        watermark.save()
+    if added:
+        invalidate('posts')
+    return len(added)
+
+
+class TrendingOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that also takes ?ordering=trending, the most
+    trending posts first, read in trending_score index order
+    """
+    trending_term = 'trending'
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param, '')
+        if params.split(',')[0].strip() == self.trending_term:
+            return ORDERING
+        return super().get_ordering(request, queryset, view)
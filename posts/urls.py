@@ -4,4 +4,5 @@ from posts import views
 urlpatterns = [
     path('posts/', views.PostList.as_view()),
     path('posts/<int:pk>/', views.PostDetail.as_view()),
+    path('posts/<int:pk>/image/', views.post_filtered_image),
 ]
\ No newline at end of file
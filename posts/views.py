@@ -1,31 +1,51 @@
-from django.db.models import Count
-from django.shortcuts import render
-from django.http import Http404
+from django.shortcuts import get_object_or_404, render
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, quote_etag
+from django.views.decorators.http import require_safe
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, permissions, generics, filters
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import Post
+from .search import PostSearchFilter
+from .trending import TrendingOrderingFilter
 from .serializers import PostSerializer
+from drf_api.cache import AnonymousCacheMixin
+from drf_api.conditional import ConditionalGetMixin
+from drf_api.eager import EagerLoadingMixin
+from drf_api.fast import FastListMixin
+from drf_api.image_filters import filter_key
+from drf_api.images import filter_cache, queue_render
+from drf_api.pagination import CursorOrPageNumberPagination
 from drf_api.permissions import IsOwnerOrReadOnly
+from drf_api.sparse import SparseFieldsMixin
+from drf_api.timing import ServerTimingMixin
 
-class PostList(generics.ListCreateAPIView):
+class PostList(
+    ServerTimingMixin,
+    AnonymousCacheMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    FastListMixin,
+    generics.ListCreateAPIView,
+):
     """
     List posts or create a post if logged in
     The perform_create method associates the post with the logged in user.
     """
     serializer_class = PostSerializer
+    pagination_class = CursorOrPageNumberPagination
+    cache_groups = ['posts']
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly
     ]
-    queryset = Post.objects.annotate(
-        comments_count=Count('comment', distinct=True),
-        likes_count=Count('likes', distinct=True)
-
-    ).order_by('created_at')
+    # comments_count and likes_count are stored columns on Post,
+    # see the signal handlers in likes/models.py and comments/models.py
+    queryset = Post.objects.order_by('created_at')
+    # ?ordering=trending as well, see posts/trending.py
     filter_backends = [
-        filters.OrderingFilter,
-        filters.SearchFilter,
+        TrendingOrderingFilter,
+        PostSearchFilter,
         DjangoFilterBackend,
     ]
     ordering_fields = [
@@ -70,17 +90,29 @@ class PostList(generics.ListCreateAPIView):
 #             return Response(serializer.data, status=status.HTTP_201_CREATED)
 #         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class PostDetail(generics.RetrieveUpdateDestroyAPIView):
+class PostDetail(
+    ServerTimingMixin,
+    AnonymousCacheMixin,
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     """
     Retrieve a post and edit or delete it if you own it.
     """
     serializer_class = PostSerializer
     permission_classes = [IsOwnerOrReadOnly]
-    queryset = Post.objects.annotate(
-        comments_count=Count('comment', distinct=True),
-        likes_count=Count('likes', distinct=True)
-
-    ).order_by('created_at')
+    cache_groups = ['post:{pk}']
+    validator_fields = [
+        'updated_at',
+        'last_activity_at',
+        'likes_count',
+        'comments_count',
+    ]
+    # comments_count and likes_count are stored columns on Post,
+    # see the signal handlers in likes/models.py and comments/models.py
+    queryset = Post.objects.order_by('created_at')
     filter_backends = [
         filters.OrderingFilter
     ]
@@ -91,6 +123,40 @@ class PostDetail(generics.RetrieveUpdateDestroyAPIView):
     ]
 
 
+@require_safe
+def post_filtered_image(request, pk):
+    """
+    The post's image with its image_filter applied, from the disk cache.
+    Redirects to the unfiltered image until that's been rendered,
+    which the client can filter with CSS as before.
+    A plain django view, DRF's content negotiation would turn
+    image requests away.
+    """
+    post = get_object_or_404(
+        Post.objects.only('image', 'image_filter'), pk=pk
+    )
+    if post.image_filter != 'normal':
+        key = filter_key(post.image.name, post.image_filter)
+        etag = quote_etag(key)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        path = filter_cache().get(key)
+        if path:
+            response = FileResponse(open(path, 'rb'), content_type='image/jpeg')
+            response['ETag'] = etag
+            # versioned urls from PostSerializer never change content
+            versioned = request.GET.get('v') == key[:16]
+            response['Cache-Control'] = (
+                'public, max-age=31536000, immutable' if versioned
+                else 'public, max-age=3600'
+            )
+            return response
+        # evicted, or the render queued on save hasn't finished
+        queue_render(Post, post.pk, key)
+    return HttpResponseRedirect(post.image.url)
+
+
 # class PostDetail(APIView):
 #     permission_classes = [
 #         IsOwnerOrReadOnly
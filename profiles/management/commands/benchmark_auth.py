@@ -0,0 +1,64 @@
+import time
+from dj_rest_auth.jwt_auth import JWTCookieAuthentication
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from drf_api.authentication import CachedJWTCookieAuthentication, user_cache
+from drf_api.serializers import CurrentUserSerializer
+
+
+class Command(BaseCommand):
+    """
+    Times authenticating a request from the JWT cookie and rendering
+    CurrentUserSerializer for it, with the stock dj-rest-auth class
+    and the cached one. The user is created inside a transaction
+    that is rolled back.
+    """
+    help = 'Benchmark per request authentication overhead'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = User.objects.create_user(username='benchmark-auth')
+            token = str(RefreshToken.for_user(user).access_token)
+            request = APIRequestFactory().get('/')
+            request.COOKIES[settings.JWT_AUTH_COOKIE] = token
+            user_cache.clear()
+
+            for label, auth in (
+                ('JWTCookieAuthentication', JWTCookieAuthentication()),
+                ('CachedJWTCookieAuthentication',
+                 CachedJWTCookieAuthentication()),
+            ):
+                self.run(label, auth, request, options['requests'])
+
+            transaction.set_rollback(True)
+
+    def run(self, label, auth, request, requests):
+        def authenticate():
+            return auth.authenticate(request)[0]
+
+        def current_user():
+            return CurrentUserSerializer(authenticate()).data
+
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        for step, func in (('authenticate', authenticate),
+                           ('+ CurrentUserSerializer', current_user)):
+            func()
+            with CaptureQueriesContext(connection) as queries:
+                func()
+            reset_queries()
+            start = time.perf_counter()
+            for _ in range(requests):
+                func()
+            elapsed = (time.perf_counter() - start) / requests
+            self.stdout.write(
+                f'{step:>24}: {elapsed * 1e6:7.1f}us per request, '
+                f'{len(queries)} queries'
+            )
@@ -0,0 +1,74 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from followers.models import Follower
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    """
+    Compares the old Count() annotated profile query against the
+    stored counter columns, on one account with a large follower count.
+    Everything is seeded inside a transaction that is rolled back,
+    so it is safe to point at a dev database.
+    """
+    help = 'Benchmark annotated vs stored profile stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['followers'], options['batch_size'])
+
+            annotated = Profile.objects.annotate(
+                old_posts_count=Count('owner__post', distinct=True),
+                old_followers_count=Count('owner__followed', distinct=True),
+                old_following_count=Count('owner__following', distinct=True),
+            ).order_by('-old_followers_count')[:10]
+            stored = Profile.objects.order_by('-followers_count')[:10]
+
+            for label, queryset in (('annotated', annotated),
+                                    ('stored', stored)):
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(queryset.explain())
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    list(queryset.all())
+                    timings.append(time.perf_counter() - start)
+                self.stdout.write(
+                    f'best of {options["repeat"]}: '
+                    f'{min(timings) * 1000:.2f}ms'
+                )
+
+            transaction.set_rollback(True)
+
+    def seed(self, followers, batch_size):
+        star = User.objects.create_user(username='benchmark-star')
+        User.objects.bulk_create(
+            (User(username=f'benchmark-{i}', password='!')
+             for i in range(followers)),
+            batch_size=batch_size,
+        )
+        # not every backend hands back pks from bulk_create
+        user_ids = list(
+            User.objects.filter(username__startswith='benchmark-')
+            .exclude(pk=star.pk).values_list('id', flat=True)
+        )
+        # bulk_create skips the post_save hook that makes profiles
+        Profile.objects.bulk_create(
+            (Profile(owner_id=user_id, following_count=1)
+             for user_id in user_ids),
+            batch_size=batch_size,
+        )
+        Follower.objects.bulk_create(
+            (Follower(owner_id=user_id, followed=star)
+             for user_id in user_ids),
+            batch_size=batch_size,
+        )
+        Profile.objects.filter(owner=star).update(followers_count=followers)
@@ -0,0 +1,300 @@
+import csv
+import math
+import os
+import random
+import time
+from itertools import islice
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save
+from comments.models import Comment
+from drf_api.cache import invalidate
+from drf_api.signals import suspended
+from feed.models import TimelineEntry, trim_timelines
+from followers.graph import reset_follower_graph
+from followers.models import Follower
+from likes.models import Like
+from posts.models import Post
+from posts.search import index_posts
+from posts.trending import update_scores
+from profiles.models import Profile, create_profile
+
+WORDS = (
+    'beach day city lights sunset mountain coffee morning forest river '
+    'street food night market garden winter summer road trip friends '
+    'concert museum harbour rain snow desert island bridge'
+).split()
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+class Command(BaseCommand):
+    """
+    Loads users (with their profiles), posts, comments, likes and
+    follows with bulk_create, either generated at the given scale or
+    read from CSV files in --import-dir:
+        users.csv     id, username
+        posts.csv     id, owner, title, content
+        comments.csv  owner, post, content
+        likes.csv     owner, post
+        follows.csv   owner, followed
+    where owner, post and followed refer to the id columns.
+    bulk_create skips the per-row signal handlers, so the profiles,
+    stored counters, search index, timelines and trending scores of the
+    loaded rows are filled in afterwards, the follower graphs are told
+    to reload, and create_profile is suspended in case anything saves
+    a user row by row.
+    Users get --password, hashed once.
+    """
+    help = 'Bulk generate or import users, posts, comments, likes, follows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--likes', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument('--import-dir')
+        parser.add_argument('--prefix', default='user')
+        parser.add_argument('--password', default='pass')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        if options['import_dir']:
+            rows = self.read(options['import_dir'])
+        else:
+            rows = self.generate(options)
+
+        password = make_password(options['password'])
+        with transaction.atomic(), \
+                suspended(post_save, create_profile, User):
+            first_user = self.next_id(User)
+            first_post = self.next_id(Post)
+            first_follow = self.next_id(Follower)
+            users = self.load_users(rows['users'], first_user, password)
+            posts = self.load_posts(rows['posts'], first_post, users)
+            self.load(
+                'comments', Comment, rows['comments'],
+                lambda owner, post, content: Comment(
+                    owner_id=users[owner], post_id=posts[post],
+                    content=content,
+                ),
+            )
+            self.load(
+                'likes', Like, rows['likes'],
+                lambda owner, post: Like(
+                    owner_id=users[owner], post_id=posts[post]
+                ),
+                # generated likes and follows are unique,
+                # repeats in imported ones are skipped
+                ignore_conflicts=True,
+            )
+            self.load(
+                'follows', Follower, rows['follows'],
+                lambda owner, followed: Follower(
+                    owner_id=users[owner], followed_id=users[followed]
+                ),
+                ignore_conflicts=True,
+            )
+            self.reset_sequences()
+            self.step('counters', lambda: self.recount(first_user, first_post))
+            self.step('search index', lambda: index_posts(first_post))
+            self.step('timelines', lambda: self.fan_out(first_follow))
+            self.step('trending', update_scores)
+            reset_follower_graph()
+        invalidate('posts', 'profiles')
+
+    def step(self, label, func):
+        start = time.perf_counter()
+        func()
+        self.stdout.write(f'{label}: {time.perf_counter() - start:.1f}s')
+
+    def next_id(self, model):
+        """
+        ids are assigned here rather than by the database, so the
+        loaded rows can refer to each other without reading them back
+        """
+        return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+    def load(self, label, model, rows, build, ignore_conflicts=False):
+        start = time.perf_counter()
+        total = 0
+        for batch in batched(rows, self.batch_size):
+            model.objects.bulk_create(
+                [build(*row) for row in batch],
+                ignore_conflicts=ignore_conflicts,
+            )
+            total += len(batch)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{label}: {total} in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f}/s)'
+        )
+
+    def load_users(self, rows, first_id, password):
+        ids = {}
+
+        def build(key, username):
+            ids[key] = first_id + len(ids)
+            return User(id=ids[key], username=username, password=password)
+
+        self.load('users', User, rows, build)
+        # what create_profile would have done, one INSERT per batch
+        self.load(
+            'profiles', Profile, ((user_id,) for user_id in ids.values()),
+            lambda user_id: Profile(owner_id=user_id),
+        )
+        return ids
+
+    def load_posts(self, rows, first_id, users):
+        ids = {}
+
+        def build(key, owner, title, content):
+            ids[key] = first_id + len(ids)
+            return Post(
+                id=ids[key], owner_id=users[owner],
+                title=title, content=content,
+            )
+
+        self.load('posts', Post, rows, build)
+        return ids
+
+    def reset_sequences(self):
+        # postgres hands out ids from a sequence the explicit ids skipped
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Post]
+            ):
+                cursor.execute(sql)
+
+    def recount(self, first_user, first_post):
+        """
+        the stored counters, set-wise for the loaded rows,
+        as in the migrations that added them
+        """
+        def count_of(model, field, outer):
+            return Coalesce(Subquery(
+                model.objects.filter(**{field: OuterRef(outer)})
+                .order_by().values(field)
+                .annotate(total=Count('pk')).values('total')
+            ), 0)
+
+        Post.objects.filter(pk__gte=first_post).update(
+            likes_count=count_of(Like, 'post', 'pk'),
+            comments_count=count_of(Comment, 'post', 'pk'),
+        )
+        Profile.objects.filter(owner__gte=first_user).update(
+            posts_count=count_of(Post, 'owner', 'owner'),
+            followers_count=count_of(Follower, 'followed', 'owner'),
+            following_count=count_of(Follower, 'owner', 'owner'),
+        )
+
+    def fan_out(self, first_follow):
+        """
+        the timeline rows fan_out_post and backfill_timeline would have
+        written for the loaded follows, in one INSERT ... SELECT
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TimelineEntry._meta.db_table} '
+                '(owner_id, post_id, created_at) '
+                'SELECT f.owner_id, p.id, p.created_at '
+                f'FROM {Follower._meta.db_table} f '
+                f'JOIN {Profile._meta.db_table} pr '
+                'ON pr.owner_id = f.followed_id '
+                'AND pr.followers_count <= %s '
+                'JOIN (SELECT id, owner_id, created_at, ROW_NUMBER() OVER ('
+                'PARTITION BY owner_id ORDER BY created_at DESC, id DESC'
+                f') AS position FROM {Post._meta.db_table}) p '
+                'ON p.owner_id = f.followed_id AND p.position <= %s '
+                'WHERE f.id >= %s',
+                [settings.FEED_FANOUT_LIMIT, settings.FEED_BACKFILL_SIZE,
+                 first_follow]
+            )
+        trim_timelines(
+            Follower.objects.filter(pk__gte=first_follow).values('owner')
+        )
+
+    def generate(self, options):
+        users, posts = options['users'], options['posts']
+        if User.objects.filter(
+            username__startswith=options['prefix']
+        ).exists():
+            raise CommandError(
+                f"usernames starting '{options['prefix']}' exist, "
+                'pick another --prefix'
+            )
+        if options['posts'] and not users:
+            raise CommandError('--posts need --users')
+        if options['comments'] and not posts:
+            raise CommandError('--comments need --posts')
+        if options['likes'] > users * posts:
+            raise CommandError('more --likes than user/post pairs')
+        if options['follows'] > users * (users - 1):
+            raise CommandError('more --follows than user pairs')
+        rng = random.Random(options['seed'])
+        # a stride coprime to the post count spreads each user's likes
+        stride = posts // 3 + 1
+        while math.gcd(stride, posts) != 1:
+            stride += 1
+
+        return {
+            'users': (
+                (i, f"{options['prefix']}{i}") for i in range(users)
+            ),
+            'posts': (
+                (i, rng.randrange(users), sentence(rng, 3), sentence(rng, 12))
+                for i in range(posts)
+            ),
+            'comments': (
+                (rng.randrange(users), rng.randrange(posts), sentence(rng, 8))
+                for _ in range(options['comments'])
+            ),
+            # the i-th like is user i % users liking their
+            # (i // users)-th post of a walk that never repeats a post
+            'likes': (
+                (i % users, (i // users * stride + i % users) % posts)
+                for i in range(options['likes'])
+            ),
+            # and user i % users follows the next (i // users) + 1-th user
+            'follows': (
+                (i % users, (i % users + i // users + 1) % users)
+                for i in range(options['follows'])
+            ),
+        }
+
+    def read(self, directory):
+        def rows(filename, columns):
+            path = os.path.join(directory, filename)
+            if not os.path.exists(path):
+                return
+            with open(path, newline='') as file:
+                for row in csv.DictReader(file):
+                    yield tuple(row[column] for column in columns)
+
+        return {
+            'users': rows('users.csv', ['id', 'username']),
+            'posts': rows('posts.csv', ['id', 'owner', 'title', 'content']),
+            'comments': rows('comments.csv', ['owner', 'post', 'content']),
+            'likes': rows('likes.csv', ['owner', 'post']),
+            'follows': rows('follows.csv', ['owner', 'followed']),
+        }
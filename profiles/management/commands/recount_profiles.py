@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from followers.models import Follower
+from posts.models import Post
+from profiles.models import Profile
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the stored posts_count, followers_count and following_count
+    on every profile from the posts and followers tables.
+    The signal handlers keep them current, this is for reconciling
+    after bulk loads, raw SQL or anything else that skipped them.
+    """
+    help = 'Reconcile the stored counters on Profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report profiles whose counters have drifted.',
+        )
+
+    def handle(self, *args, **options):
+        # one correlated count per counter, as in bulk_load's recount,
+        # joining all three would multiply the rows per profile
+        def count_of(model, field):
+            return Coalesce(Subquery(
+                model.objects.filter(**{field: OuterRef('owner')})
+                .order_by().values(field)
+                .annotate(total=Count('pk')).values('total')
+            ), 0)
+
+        drifted = Profile.objects.annotate(
+            actual_posts=count_of(Post, 'owner'),
+            actual_followers=count_of(Follower, 'followed'),
+            actual_following=count_of(Follower, 'owner'),
+        ).filter(
+            ~Q(posts_count=F('actual_posts'))
+            | ~Q(followers_count=F('actual_followers'))
+            | ~Q(following_count=F('actual_following'))
+        ).values_list(
+            'id', 'actual_posts', 'actual_followers', 'actual_following'
+        )
+
+        fixed = 0
+        with transaction.atomic():
+            for profile_id, posts, followers, following in drifted:
+                fixed += 1
+                if options['dry_run']:
+                    self.stdout.write(
+                        f'profile {profile_id}: posts={posts} '
+                        f'followers={followers} following={following}'
+                    )
+                    continue
+                Profile.objects.filter(pk=profile_id).update(
+                    posts_count=posts,
+                    followers_count=followers,
+                    following_count=following,
+                )
+
+        verb = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {fixed} profile(s)'))
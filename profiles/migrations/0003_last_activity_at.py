@@ -0,0 +1,18 @@
+# Generated by Django 3.2.20 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0002_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='last_activity_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.20 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0003_last_activity_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to='derivatives/'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='image_thumbnail_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='derivatives/'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='image_webp',
+            field=models.ImageField(blank=True, editable=False, upload_to='derivatives/'),
+        ),
+    ]
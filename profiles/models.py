@@ -1,6 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_save
+from drf_api.authentication import forget_cached_user
+from drf_api.cache import invalidate
+from drf_api.images import mark_new_image, queue_derivatives
+from drf_api.storage import claim_uploads
 
 class Profile(models.Model):
     owner = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -11,6 +15,37 @@ class Profile(models.Model):
     image = models.ImageField(
         upload_to='images/', default='../samples/landscapes/girl-urban-view'
     )
+    # derivatives of image, rendered in the background by
+    # drf_api/images.py after an upload. Blank until then
+    image_thumbnail = models.ImageField(
+        upload_to='derivatives/', blank=True, editable=False
+    )
+    image_thumbnail_webp = models.ImageField(
+        upload_to='derivatives/', blank=True, editable=False
+    )
+    image_webp = models.ImageField(
+        upload_to='derivatives/', blank=True, editable=False
+    )
+    # denormalised stats, kept current by the Post and Follower
+    # signal handlers so lists don't have to Count() the joins
+    posts_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, db_index=True, editable=False
+    )
+    # bumped with the counters, so conditional GETs see posts and follows
+    last_activity_at = models.DateTimeField(null=True, editable=False)
+
+    # only ever written with update(), save() leaves them out so an
+    # edit of a profile read before a follow doesn't put the old count back
+    counter_fields = [
+        'posts_count', 'followers_count', 'following_count',
+        'last_activity_at',
+    ]
 
     class Meta:
         ordering = ['-created_at']
@@ -18,6 +53,16 @@ class Profile(models.Model):
     def __str__(self):
         return f"{self.owner}'s profile"
 
+    def save(self, *args, **kwargs):
+        if not (self._state.adding or kwargs.get('force_insert')
+                or kwargs.get('update_fields') is not None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
 def create_profile(sender, instance, created, **kwargs):
             # Because we are passing this function 
             # to the post_save.connect method
@@ -34,4 +79,24 @@ def create_profile(sender, instance, created, **kwargs):
         
 # not part of the function, but this would be sitting
 # directly under it
-post_save.connect(create_profile, sender=User)
\ No newline at end of file
+post_save.connect(create_profile, sender=User)
+
+
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate('profiles', f'profile:{instance.id}')
+
+
+post_save.connect(invalidate_cached_profile, sender=Profile)
+post_delete.connect(invalidate_cached_profile, sender=Profile)
+
+
+pre_save.connect(mark_new_image, sender=Profile)
+# first, queue_derivatives may save the row again before returning
+post_save.connect(claim_uploads, sender=Profile)
+post_save.connect(queue_derivatives, sender=Profile)
+
+
+post_save.connect(forget_cached_user, sender=User)
+post_delete.connect(forget_cached_user, sender=User)
+post_save.connect(forget_cached_user, sender=Profile)
+post_delete.connect(forget_cached_user, sender=Profile)
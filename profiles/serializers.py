@@ -1,6 +1,25 @@
+from django.db import models
 from rest_framework import serializers
+from drf_api.images import ProbedImageField
 from .models import Profile
-from followers.models import Follower
+from followers.graph import follower_graph
+
+class ProfileListSerializer(serializers.ListSerializer):
+    """
+    Looks up who the requesting user follows among every profile
+    on the page in the follower graph and hands it to the child
+    serializer, so get_following_id doesn't sync it once per profile.
+    """
+    def to_representation(self, data):
+        profiles = data.all() if isinstance(data, models.Manager) else data
+        profiles = list(profiles)
+        user = self.context['request'].user
+        if user.is_authenticated and 'following_id' in self.child.fields:
+            self.child.followed_users = follower_graph().follow_ids_of(
+                user.id, [profile.owner_id for profile in profiles]
+            )
+        return super().to_representation(profiles)
+
 
 class ProfileSerializer(serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
@@ -13,6 +32,11 @@ class ProfileSerializer(serializers.ModelSerializer):
     posts_count = serializers.ReadOnlyField()
     followers_count = serializers.ReadOnlyField()
     following_count = serializers.ReadOnlyField()
+    # uploads are validated from their header, see drf_api/images.py
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: ProbedImageField,
+    }
 
     def get_is_owner(self, obj):
         """
@@ -26,15 +50,21 @@ class ProfileSerializer(serializers.ModelSerializer):
     def get_following_id(self, obj):
         user = self.context['request'].user
         if user.is_authenticated:
-            following = Follower.objects.filter(
-                owner=user, followed=obj.owner
-            ).first()
-            print(following)
-            return following.id if following else None
+            followed_users = getattr(self, 'followed_users', None)
+            if followed_users is not None:
+                return followed_users.get(obj.owner_id)
+            return follower_graph().follow_id(user.id, obj.owner_id)
         return None
 
+    # the columns the method fields read, for drf_api/sparse.py
+    row_keys = {
+        'is_owner': ['owner_id'],
+        'following_id': ['owner_id'],
+    }
+
     class Meta:
         model = Profile
+        list_serializer_class = ProfileListSerializer
         fields = [
             'id',
             'owner',
@@ -43,6 +73,9 @@ class ProfileSerializer(serializers.ModelSerializer):
             'name',
             'content',
             'image',
+            'image_thumbnail',
+            'image_thumbnail_webp',
+            'image_webp',
             'is_owner',
             'following_id',
             'posts_count',
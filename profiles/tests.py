@@ -1,3 +1,156 @@
-from django.test import TestCase
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from rest_framework import status
+from rest_framework.test import APITestCase
+from .models import Profile, create_profile
+from comments.models import Comment
+from drf_api.signals import suspended
+from feed.models import TimelineEntry
+from followers.graph import follower_graph
+from followers.models import Follower
+from likes.models import Like
+from posts.models import Post
 
-# Create your tests here.
+
+class ProfileCounterTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username='adam', password='pass')
+        User.objects.create_user(username='anna', password='pass')
+
+    def test_posts_and_follows_update_stored_counts(self):
+        adam = User.objects.get(username='adam')
+        anna = User.objects.get(username='anna')
+        Post.objects.create(owner=adam, title='a title')
+        follow = Follower.objects.create(owner=adam, followed=anna)
+        self.assertEqual(Profile.objects.get(owner=adam).posts_count, 1)
+        self.assertEqual(Profile.objects.get(owner=adam).following_count, 1)
+        self.assertEqual(Profile.objects.get(owner=anna).followers_count, 1)
+
+        follow.delete()
+        self.assertEqual(Profile.objects.get(owner=adam).following_count, 0)
+        self.assertEqual(Profile.objects.get(owner=anna).followers_count, 0)
+
+    def test_saving_a_stale_profile_keeps_the_counts(self):
+        adam = User.objects.get(username='adam')
+        anna = User.objects.get(username='anna')
+        profile = Profile.objects.get(owner=anna)
+        Post.objects.create(owner=anna, title='a title')
+        Follower.objects.create(owner=adam, followed=anna)
+        profile.name = 'Anna'
+        profile.save()
+        profile.refresh_from_db()
+        self.assertEqual(profile.name, 'Anna')
+        self.assertEqual(
+            (profile.posts_count, profile.followers_count), (1, 1)
+        )
+
+    def test_can_order_profiles_by_followers_count(self):
+        adam = User.objects.get(username='adam')
+        anna = User.objects.get(username='anna')
+        Follower.objects.create(owner=adam, followed=anna)
+        response = self.client.get('/profiles/?ordering=-followers_count')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['owner'], 'anna')
+        self.assertEqual(response.data['results'][0]['followers_count'], 1)
+
+    def test_recount_profiles_fixes_drifted_counts(self):
+        adam = User.objects.get(username='adam')
+        anna = User.objects.get(username='anna')
+        bob = User.objects.create_user(username='bob')
+        Post.objects.create(owner=adam, title='a title')
+        Post.objects.create(owner=adam, title='another')
+        Follower.objects.create(owner=anna, followed=adam)
+        Follower.objects.create(owner=bob, followed=adam)
+        Follower.objects.create(owner=adam, followed=anna)
+        Profile.objects.filter(owner=adam).update(
+            posts_count=5, followers_count=0
+        )
+        with CaptureQueriesContext(connection) as queries:
+            call_command('recount_profiles', stdout=StringIO())
+        profile = Profile.objects.get(owner=adam)
+        self.assertEqual(
+            (profile.posts_count, profile.followers_count,
+             profile.following_count),
+            (2, 2, 1)
+        )
+        # counted per profile, not over the posts x followers join
+        select = next(
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+        )
+        self.assertNotIn('JOIN', select)
+
+
+class ProfileListQueryTests(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username='adam', password='pass')
+
+    def count_list_queries(self, profiles):
+        adam = User.objects.get(username='adam')
+        User.objects.exclude(pk=adam.pk).delete()
+        for i in range(profiles):
+            user = User.objects.create_user(username=f'user{i}')
+            Follower.objects.create(owner=adam, followed=user)
+        self.client.login(username='adam', password='pass')
+        follower_graph()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/profiles/')
+        following = [
+            profile['following_id'] for profile in response.data['results']
+            if profile['owner'] != 'adam'
+        ]
+        self.assertEqual(len(following), profiles)
+        self.assertTrue(all(following))
+        return len(queries)
+
+    def test_authenticated_list_stays_within_query_budget(self):
+        small_page = self.count_list_queries(2)
+        self.assertEqual(small_page, self.count_list_queries(9))
+        # session, user, count, page, follower graph sync
+        self.assertLessEqual(small_page, 5)
+
+
+class BulkLoadTests(APITestCase):
+    def test_bulk_load_fills_profiles_counters_and_timelines(self):
+        User.objects.create_user(username='adam', password='pass')
+        call_command(
+            'bulk_load', users=5, posts=10, comments=20, likes=30,
+            follows=8, prefix='load', stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 6)
+        self.assertEqual(Profile.objects.count(), 6)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertEqual(Like.objects.count(), 30)
+        self.assertEqual(Follower.objects.count(), 8)
+        totals = Post.objects.aggregate(
+            likes=Sum('likes_count'), comments=Sum('comments_count')
+        )
+        self.assertEqual(totals, {'likes': 30, 'comments': 20})
+        totals = Profile.objects.aggregate(
+            posts=Sum('posts_count'), followers=Sum('followers_count'),
+            following=Sum('following_count'),
+        )
+        self.assertEqual(totals, {'posts': 10, 'followers': 8, 'following': 8})
+        expected = sum(
+            Post.objects.filter(owner=follow.followed).count()
+            for follow in Follower.objects.all()
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+        self.assertTrue(self.client.login(username='load0', password='pass'))
+
+    def test_bulk_load_refuses_taken_prefix(self):
+        User.objects.create_user(username='load0')
+        with self.assertRaises(CommandError):
+            call_command('bulk_load', users=1, prefix='load', stdout=StringIO())
+
+    def test_suspended_disconnects_receiver_for_the_block(self):
+        with suspended(post_save, create_profile, User):
+            User.objects.create_user(username='adam')
+        User.objects.create_user(username='anna')
+        self.assertFalse(Profile.objects.filter(owner__username='adam').exists())
+        self.assertTrue(Profile.objects.filter(owner__username='anna').exists())
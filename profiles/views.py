@@ -1,4 +1,3 @@
-from django.db.models import Count
 from django.http import Http404
 from django.shortcuts import render
 from django_filters.rest_framework import DjangoFilterBackend
@@ -7,27 +6,41 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from .models import Profile
 from .serializers import ProfileSerializer
+from drf_api.cache import AnonymousCacheMixin
+from drf_api.conditional import ConditionalGetMixin
+from drf_api.eager import EagerLoadingMixin
 from drf_api.permissions import IsOwnerOrReadOnly
+from drf_api.sparse import SparseFieldsMixin
+from drf_api.timing import ServerTimingMixin
+from followers.graph import MutualFollowFilter
 
 
-class ProfileList(generics.ListAPIView):
+class ProfileList(
+    ServerTimingMixin,
+    AnonymousCacheMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.ListAPIView,
+):
     """
     List all profiles.
     No create view as profile creation is handled by django signals.
     """
     serializer_class = ProfileSerializer
-    queryset = Profile.objects.annotate(
-        posts_count=Count('owner__post', distinct=True),
-        followers_count=Count('owner__followed', distinct=True),
-        following_count=Count('owner__following', distinct=True),
-    ).order_by('-created_at')
+    cache_groups = ['profiles']
+    # posts_count, followers_count and following_count are stored
+    # columns on Profile, see the signal handlers in posts/models.py
+    # and followers/models.py
+    queryset = Profile.objects.order_by('-created_at')
+    # ?mutual_follows_of= as well, see followers/graph.py
     filter_backends = [
         filters.OrderingFilter,
         DjangoFilterBackend,
+        MutualFollowFilter,
     ]
     ordering_fields = [
-        'post_count',
-        'followed_count',
+        'posts_count',
+        'followers_count',
         'following_count',
         'owner__followed__created_at',
         'owner__following__created_at',
@@ -52,25 +65,39 @@ class ProfileList(generics.ListAPIView):
         # dataset into JSON data
         # return Response(serializer.data)
 
-class ProfileDetail(generics.RetrieveUpdateAPIView):
+class ProfileDetail(
+    ServerTimingMixin,
+    AnonymousCacheMixin,
+    ConditionalGetMixin,
+    SparseFieldsMixin,
+    EagerLoadingMixin,
+    generics.RetrieveUpdateAPIView,
+):
     """
     Retrieve or update a profile if you're the owner.
     """
     permission_classes = [IsOwnerOrReadOnly]
+    cache_groups = ['profile:{pk}']
+    validator_fields = [
+        'updated_at',
+        'last_activity_at',
+        'posts_count',
+        'followers_count',
+        'following_count',
+    ]
     # queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
-    queryset = Profile.objects.annotate(
-        posts_count=Count('owner__post', distinct=True),
-        followers_count=Count('owner__followed', distinct=True),
-        following_count=Count('owner__following', distinct=True),
-    ).order_by('-created_at')
+    # posts_count, followers_count and following_count are stored
+    # columns on Profile, see the signal handlers in posts/models.py
+    # and followers/models.py
+    queryset = Profile.objects.order_by('-created_at')
     filter_backends = [
         filters.OrderingFilter,
         DjangoFilterBackend,
     ]
     ordering_fields = [
-        'post_count',
-        'followed_count',
+        'posts_count',
+        'followers_count',
         'following_count',
         'owner__followed__created_at',
         'owner__following__created_at',